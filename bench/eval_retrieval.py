@@ -0,0 +1,440 @@
+"""
+Retrieval quality vs. latency across retrieval configurations.
+
+Runs a labeled query set against a local snapshot of the index and reports
+recall@k, MRR and per-stage latency (embed, query, hydrate, rerank) for every
+combination of:
+
+- embedding model (--models). The snapshot's own model uses the stored
+  vectors; other models re-embed the snapshot's texts once and cache them
+  next to it.
+- reranker (--rerankers: none, context, and cross when RERANK_MODEL is
+  set). cross keeps min(top_k, RERANK_KEEP) chunks, as in production.
+- overfetch factor (--overfetch). search_k = top_k * factor, as in
+  search_legal_docs: only for queries with context, except with cross,
+  which reranks every query. "none" always fetches top_k.
+- index backend (--backends: filter, namespaces). With --live, "pinecone"
+  runs the same queries against the configured index for the snapshot's
+  model.
+
+Labeled queries are JSONL: {id, lang, query, state?, context?, expected}.
+Each expected entry is a chunk id, or {"url": ..., "article": ...} matching
+chunks whose url contains `url` and whose text cites that article
+("Art. 1.238"). Results go to bench/results/retrieval-<commit>.json; with
+--baseline, configurations whose recall or MRR dropped by more than
+--tolerance are listed and the exit status is 1.
+
+Usage:
+    python -m bench.eval_retrieval snapshot --out data/eval-index
+    python -m bench.eval_retrieval run bench/data/retrieval.sample.jsonl --snapshot data/eval-index
+    python -m bench.eval_retrieval run queries.jsonl --snapshot data/eval-index --overfetch 1,2,4 --top-k 4,8
+    python -m bench.eval_retrieval run queries.jsonl --snapshot data/eval-index --baseline bench/results/retrieval-abc1234.json
+"""
+import argparse
+import itertools
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from bench.run import RESULTS_DIR, git_revision, percentiles
+
+RECALL_AT = (1, 3, 5)
+ALWAYS_RERANK = {"cross"}  # Rerankers applied with or without conversation context
+STAGES = ("embed", "query", "hydrate", "rerank", "total")
+
+
+def _csv(cast=str):
+    return lambda s: [cast(x) for x in s.split(",") if x]
+
+
+def _slug(name):
+    return re.sub(r"[^A-Za-z0-9]+", "-", name).strip("-").lower()
+
+
+# --- snapshot ---
+
+class SnapshotIndex:
+    """
+    In-memory stand-in for the Pinecone index over snapshot vectors.
+
+    Answers `query()` like the Pinecone client (exact search, `$or` state
+    filters and jurisdiction namespaces), so utils.pinecode.query_index runs
+    unchanged against it with either layout.
+    """
+
+    def __init__(self, ids, vectors, states):
+        from utils.jurisdiction import namespace_for
+
+        self.ids = ids
+        self.vectors = vectors
+        self.states = states
+        namespaces = np.array([namespace_for(s) for s in states])
+        self.partitions = {ns: np.flatnonzero(namespaces == ns) for ns in set(namespaces)}
+
+    def _filter_mask(self, flt):
+        mask = np.ones(len(self.ids), dtype=bool)
+        for key, cond in flt.items():
+            if key == "$or":
+                any_mask = np.zeros(len(self.ids), dtype=bool)
+                for sub in cond:
+                    any_mask |= self._filter_mask(sub)
+                mask &= any_mask
+            elif key == "state":
+                mask &= self.states == (cond.get("$eq") if isinstance(cond, dict) else cond)
+        return mask
+
+    def query(self, vector=None, top_k=10, filter=None, namespace="", include_metadata=False):
+        if namespace:
+            rows = self.partitions.get(namespace, np.array([], dtype=int))
+            if filter:
+                rows = rows[self._filter_mask(filter)[rows]]
+        else:
+            rows = np.flatnonzero(self._filter_mask(filter)) if filter else np.arange(len(self.ids))
+        scores = self.vectors[rows] @ np.asarray(vector, dtype=np.float32)
+        order = np.argpartition(-scores, min(top_k, len(rows)) - 1)[:top_k] if len(rows) > top_k else np.arange(len(rows))
+        order = order[np.argsort(-scores[order])]
+        return {"matches": [{"id": self.ids[rows[i]], "score": float(scores[i])} for i in order]}
+
+
+class Snapshot:
+    """
+    A snapshot written by `snapshot`: <prefix>.npz (ids, vectors, states),
+    <prefix>.vds (chunk store) and <prefix>.json (model, count).
+    """
+
+    def __init__(self, prefix):
+        from utils.doc_store import DocStore
+
+        self.prefix = prefix
+        self.meta = json.loads(Path(f"{prefix}.json").read_text(encoding="utf-8"))
+        arrays = np.load(f"{prefix}.npz", allow_pickle=False)
+        self.ids = [str(i) for i in arrays["ids"]]
+        self.states = arrays["states"]
+        self.vectors = arrays["vectors"]
+        self.store = DocStore(f"{prefix}.vds")
+        self._indexes = {}
+
+    def index_for(self, model_name, encoder):
+        """Index over this snapshot embedded with `model_name` (re-embedding texts on first use)."""
+        if model_name not in self._indexes:
+            if model_name == self.meta["model"]:
+                vectors = self.vectors
+            else:
+                cache = Path(f"{self.prefix}.{_slug(model_name)}.npy")
+                if cache.exists():
+                    vectors = np.load(cache)
+                else:
+                    print(f"re-embedding {len(self.ids)} snapshot chunks with {model_name} ...", file=sys.stderr)
+                    texts = [(self.store.get(i) or {}).get("text") or "" for i in self.ids]
+                    vectors = np.asarray(encoder.encode(texts, batch_size=64, normalize_embeddings=True), dtype=np.float32)
+                    np.save(cache, vectors)
+            self._indexes[model_name] = SnapshotIndex(self.ids, vectors, self.states)
+        return self._indexes[model_name]
+
+
+def build_snapshot(idx, prefix, batch_size=100, ids_file=None, limit=None):
+    """Copy every vector, its state and its normalized chunk fields out of `idx`."""
+    from config import EMBEDDING_MODEL
+    from scripts.partition_index import iter_id_batches
+    from utils.chunk_processing import normalize_chunk
+    from utils.doc_store import STORE_FIELDS, write_store
+
+    ids, vectors, states, records = [], [], [], []
+    for batch in iter_id_batches(idx, batch_size, ids_file):
+        for vector_id, vector in idx.fetch(ids=batch).vectors.items():
+            metadata = vector.metadata or {}
+            record = normalize_chunk({"id": vector_id, "metadata": metadata})
+            ids.append(vector_id)
+            vectors.append(vector.values)
+            states.append(str(metadata.get("state") or ""))
+            records.append((vector_id, {field: getattr(record, field) for field in STORE_FIELDS}))
+        print(f"fetched {len(ids)} vectors", file=sys.stderr)
+        if limit and len(ids) >= limit:
+            break
+
+    Path(prefix).parent.mkdir(parents=True, exist_ok=True)
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    np.savez(f"{prefix}.npz", ids=np.array(ids), vectors=matrix, states=np.array(states))
+    write_store(f"{prefix}.vds", records)
+    meta = {"model": EMBEDDING_MODEL, "count": len(ids), "dim": int(matrix.shape[1]) if len(ids) else 0,
+            "built": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    Path(f"{prefix}.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    return meta
+
+
+# --- relevance ---
+
+def _article_pattern(article):
+    return re.compile(r"\bArt(?:igo)?\.?\s*" + re.escape(str(article)) + r"(?!\d|\.\d)", re.IGNORECASE)
+
+
+def compile_expected(expected):
+    """Predicates, one per expected entry, each taking a ChunkRecord."""
+    predicates = []
+    for entry in expected:
+        if isinstance(entry, dict):
+            url, pattern = entry.get("url", "").lower(), _article_pattern(entry["article"])
+            predicates.append(lambda r, url=url, pattern=pattern:
+                              url in (r.url or r.source or "").lower() and bool(pattern.search(r.text[:300])))
+        else:
+            predicates.append(lambda r, chunk_id=str(entry): str(r.id) == chunk_id)
+    return predicates
+
+
+def score_ranking(records, predicates, top_k):
+    """recall@k for RECALL_AT and top_k, plus reciprocal rank of the first relevant chunk."""
+    first_hit = {}
+    for rank, record in enumerate(records, 1):
+        for n, predicate in enumerate(predicates):
+            if n not in first_hit and predicate(record):
+                first_hit[n] = rank
+    scores = {f"recall@{k}": sum(r <= k for r in first_hit.values()) / len(predicates)
+              for k in sorted(set(RECALL_AT) | {top_k})}
+    scores["rr"] = 1 / min(first_hit.values()) if first_hit else 0.0
+    return scores
+
+
+# --- pipeline ---
+
+def rerankers():
+    from config import RERANK_KEEP
+    from utils import reranker
+    from utils.pinecode import context_rerank
+
+    available = {
+        "none": lambda matches, item, top_k: matches[:top_k],
+        "context": lambda matches, item, top_k: context_rerank(matches, item["query"], item.get("context"), top_k),
+    }
+    if reranker.enabled():
+        available["cross"] = lambda matches, item, top_k: reranker.rerank(item["query"], matches, min(top_k, RERANK_KEEP))
+    return available
+
+
+def embed(encoder, item):
+    """Fused search vector for a labeled query, encoded without the production caches; (vector, ms)."""
+    from utils.encoder import context_text, fuse
+
+    start = time.perf_counter()
+    query_vector = np.asarray(encoder.encode([item["query"]], normalize_embeddings=True)[0], dtype=np.float32)
+    text = context_text(item.get("context"))
+    context_vector = None
+    if text.strip():
+        context_vector = np.asarray(encoder.encode([text], normalize_embeddings=True)[0], dtype=np.float32)
+    vector = fuse(query_vector, context_vector)
+    return vector.tolist(), (time.perf_counter() - start) * 1000
+
+
+def run_query(item, vector, top_k, overfetch, rerank, always_rerank, backend, idx, store):
+    """One retrieval through the search_legal_docs stages; (records, {stage: ms})."""
+    from utils.pinecode import query_index, hydrate_matches
+
+    timings = {}
+    reranks = always_rerank or bool(item.get("context"))
+    search_k = top_k * overfetch if reranks else top_k
+
+    start = time.perf_counter()
+    if backend == "pinecone":
+        from utils.pinecode import doc_store
+        results = query_index(vector, search_k, state=item.get("state"), include_metadata=doc_store is None)
+    else:
+        results = query_index(vector, search_k, state=item.get("state"), layout=backend, idx=idx, include_metadata=False)
+    timings["query"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    records = hydrate_matches(results, store=store)
+    timings["hydrate"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    if reranks and len(records) > top_k:
+        records = rerank(records, item, top_k)
+    timings["rerank"] = (time.perf_counter() - start) * 1000
+    return records[:top_k], timings
+
+
+def configurations(args):
+    seen = set()
+    for model, reranker, overfetch, backend, top_k in itertools.product(
+        args.models, args.rerankers, args.overfetch, args.backends, args.top_k
+    ):
+        # Overfetching only matters when something reranks the extra candidates
+        config = (model, reranker, 1 if reranker == "none" else overfetch, backend, top_k)
+        if config not in seen:
+            seen.add(config)
+            yield dict(zip(("model", "reranker", "overfetch", "backend", "top_k"), config))
+
+
+def evaluate(items, snapshot, args):
+    from sentence_transformers import SentenceTransformer
+    from utils import encoder as production
+
+    available = rerankers()
+    encoders, vectors, rows = {}, {}, []
+    for config in configurations(args):
+        model = config["model"]
+        if model not in encoders:
+            encoders[model] = production.model if model == production.EMBEDDING_MODEL else SentenceTransformer(model)
+            # Embedding cost doesn't depend on the rest of the configuration: measure it once per model
+            vectors[model] = [embed(encoders[model], item) for item in items]
+        if config["backend"] == "pinecone":
+            if model != snapshot.meta["model"]:
+                continue
+            idx, store = None, None
+        else:
+            idx, store = snapshot.index_for(model, encoders[model]), snapshot.store
+
+        scores, stage_ms, by_lang = [], {stage: [] for stage in STAGES}, {}
+        for item, (vector, embed_ms) in zip(items, vectors[model]):
+            records, timings = run_query(item, vector, config["top_k"], config["overfetch"],
+                                         available[config["reranker"]], config["reranker"] in ALWAYS_RERANK,
+                                         config["backend"], idx, store)
+            timings["embed"] = embed_ms
+            timings["total"] = sum(timings.values())
+            for stage in STAGES:
+                stage_ms[stage].append(timings[stage])
+            result = score_ranking(records, item["predicates"], config["top_k"])
+            scores.append(result)
+            by_lang.setdefault(item.get("lang", "?"), []).append(result)
+
+        mean = lambda results, key: round(statistics.fmean(r[key] for r in results), 3)
+        keys = [k for k in scores[0] if k.startswith("recall@")]
+        rows.append({
+            **config,
+            "queries": len(items),
+            **{key: mean(scores, key) for key in keys},
+            "mrr": mean(scores, "rr"),
+            "by_lang": {lang: {"mrr": mean(rs, "rr"), f"recall@{config['top_k']}": mean(rs, f"recall@{config['top_k']}")}
+                        for lang, rs in sorted(by_lang.items())},
+            "latency_ms": {stage: percentiles(stage_ms[stage]) for stage in STAGES},
+        })
+    return rows
+
+
+# --- reporting ---
+
+def config_key(row):
+    return f"{row['model']}|{row['reranker']}|x{row['overfetch']}|{row['backend']}|k{row['top_k']}"
+
+
+def print_table(rows):
+    print(f"{'model':<22}{'reranker':>9}{'over':>5}{'backend':>12}{'k':>3}{'R@1':>7}{'R@3':>7}{'R@5':>7}{'R@k':>7}{'MRR':>7}"
+          f"{'embed':>8}{'query':>8}{'hydrate':>8}{'rerank':>8}{'total p50':>10}{'p95':>8}")
+    for r in rows:
+        lat = r["latency_ms"]
+        print(f"{r['model'][-21:]:<22}{r['reranker']:>9}{r['overfetch']:>5}{r['backend']:>12}{r['top_k']:>3}"
+              f"{r.get('recall@1', '-'):>7}{r.get('recall@3', '-'):>7}{r.get('recall@5', '-'):>7}"
+              f"{r['recall@' + str(r['top_k'])]:>7}{r['mrr']:>7}"
+              f"{lat['embed']['p50']:>8}{lat['query']['p50']:>8}{lat['hydrate']['p50']:>8}{lat['rerank']['p50']:>8}"
+              f"{lat['total']['p50']:>10}{lat['total']['p95']:>8}")
+    print("latency columns are p50 ms per stage unless noted")
+
+
+def regressions(rows, baseline_rows, tolerance):
+    """Configurations present in both runs whose recall@k or MRR dropped by more than `tolerance`."""
+    baseline = {config_key(r): r for r in baseline_rows}
+    found = []
+    for row in rows:
+        old = baseline.get(config_key(row))
+        if old is None:
+            continue
+        for metric in (f"recall@{row['top_k']}", "mrr"):
+            if old.get(metric) is not None and row[metric] < old[metric] - tolerance:
+                found.append((config_key(row), metric, old[metric], row[metric]))
+    return found
+
+
+def load_items(path):
+    items = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            item = json.loads(line)
+            item["predicates"] = compile_expected(item.get("expected") or [])
+            if not item["predicates"]:
+                raise ValueError(f"query {item.get('id')!r} has no expected chunks")
+            items.append(item)
+    return items
+
+
+def cmd_snapshot(args):
+    from utils.log import setup_logging
+    from utils.pinecode import index
+
+    setup_logging()
+    meta = build_snapshot(index, args.out, args.batch_size, args.ids_file, args.limit)
+    print(f"wrote {meta['count']} vectors ({meta['model']}) to {args.out}.npz/.vds/.json")
+
+
+def cmd_run(args):
+    if not args.live:
+        # The module-level Pinecone client is never queried offline; keep it from needing credentials
+        os.environ.setdefault("PINECONE_API_KEY", "offline")
+        os.environ.setdefault("PINECONE_INDEX_HOST", "http://localhost:9")
+    from config import EMBEDDING_MODEL
+
+    args.models = args.models or [EMBEDDING_MODEL]
+    if args.live:
+        args.backends = [*args.backends, "pinecone"]
+
+    unknown = set(args.rerankers) - set(rerankers())
+    if unknown:
+        sys.exit(f"unknown reranker(s): {', '.join(sorted(unknown))} (cross needs RERANK_MODEL)")
+
+    items = load_items(args.queries)
+    snapshot = Snapshot(args.snapshot)
+    rows = evaluate(items, snapshot, args)
+    print_table(rows)
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    out = Path(args.out) if args.out else RESULTS_DIR / f"retrieval-{git_revision()}.json"
+    report = {"commit": git_revision(), "queries": args.queries, "snapshot": snapshot.meta, "rows": rows}
+    out.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\n📁 saved {out}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        found = regressions(rows, baseline["rows"], args.tolerance)
+        for key, metric, old, new in found:
+            print(f"❌ {key}: {metric} {old} -> {new}")
+        if found:
+            sys.exit(1)
+        print(f"✅ no recall/MRR regression against {args.baseline} (tolerance {args.tolerance})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality and latency against a local index snapshot")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    snap = commands.add_parser("snapshot", help="Copy the configured index into a local snapshot")
+    snap.add_argument("--out", required=True, help="Path prefix for the .npz/.vds/.json files")
+    snap.add_argument("--batch-size", type=int, default=100)
+    snap.add_argument("--ids-file", help="Newline-separated vector ids (for indexes without list())")
+    snap.add_argument("--limit", type=int, help="Stop after about this many vectors")
+
+    run = commands.add_parser("run", help="Evaluate a labeled query set across configurations")
+    run.add_argument("queries", help="JSONL with {id, lang, query, state?, context?, expected}")
+    run.add_argument("--snapshot", required=True, help="Path prefix given to `snapshot --out`")
+    run.add_argument("--models", type=_csv(), default=None, help="Embedding models (default EMBEDDING_MODEL)")
+    run.add_argument("--rerankers", type=_csv(), default=["none", "context"])
+    run.add_argument("--overfetch", type=_csv(int), default=[1, 2, 3])
+    run.add_argument("--backends", type=_csv(), default=["filter", "namespaces"])
+    run.add_argument("--top-k", type=_csv(int), default=[8])
+    run.add_argument("--live", action="store_true", help="Also query the configured Pinecone index")
+    run.add_argument("--out", help="Report path (default bench/results/retrieval-<commit>.json)")
+    run.add_argument("--baseline", help="Earlier report; exit 1 if any shared configuration regressed")
+    run.add_argument("--tolerance", type=float, default=0.02)
+
+    args = parser.parse_args()
+    if args.command == "snapshot":
+        cmd_snapshot(args)
+    else:
+        cmd_run(args)
+
+
+if __name__ == "__main__":
+    main()
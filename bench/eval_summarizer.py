@@ -0,0 +1,134 @@
+"""
+Compare the local extractive conversation summarizer against the LLM baseline.
+
+For each conversation the script produces both summaries and reports
+ROUGE-1 / ROUGE-L F1 against the LLM summary, embedding cosine similarity,
+summary length and latency. LLM summaries are taken from a
+"reference_summary" field when present, so re-runs need no API spend.
+
+Usage:
+    python -m bench.eval_summarizer bench/data/conversations.sample.jsonl
+    python -m bench.eval_summarizer convs.jsonl --sentences 4 --mmr-lambda 0.6 --out report.json
+"""
+import argparse
+import asyncio
+import json
+import re
+import statistics
+import time
+from pathlib import Path
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokens(text):
+    return _TOKEN.findall((text or "").casefold())
+
+
+def f1(overlap, candidate_len, reference_len):
+    if not overlap or not candidate_len or not reference_len:
+        return 0.0
+    precision, recall = overlap / candidate_len, overlap / reference_len
+    return 2 * precision * recall / (precision + recall)
+
+
+def rouge_1(candidate, reference):
+    cand, ref = tokens(candidate), tokens(reference)
+    ref_counts = {}
+    for t in ref:
+        ref_counts[t] = ref_counts.get(t, 0) + 1
+    overlap = 0
+    for t in cand:
+        if ref_counts.get(t):
+            ref_counts[t] -= 1
+            overlap += 1
+    return f1(overlap, len(cand), len(ref))
+
+
+def rouge_l(candidate, reference):
+    cand, ref = tokens(candidate), tokens(reference)
+    if not cand or not ref:
+        return 0.0
+    previous = [0] * (len(ref) + 1)
+    for c in cand:
+        current = [0]
+        for j, r in enumerate(ref):
+            current.append(previous[j] + 1 if c == r else max(previous[j + 1], current[j]))
+        previous = current
+    return f1(previous[-1], len(cand), len(ref))
+
+
+async def evaluate(conversations, args):
+    from utils.encoder import model
+    from services.extractive_summary import summarize_extractive
+    from services.llm import summarize_text
+
+    rows = []
+    for conv in conversations:
+        lang = conv.get("lang", "en")
+        messages = conv["messages"][-6:]
+
+        start = time.perf_counter()
+        local = summarize_extractive(messages, lang, args.sentences, args.mmr_lambda) or ""
+        local_ms = (time.perf_counter() - start) * 1000
+
+        reference = conv.get("reference_summary")
+        llm_ms = None
+        if not reference:
+            label = "User:" if lang == "en" else "Usuário:"
+            text = "\n".join(f"{label if m['sender'] == 'user' else 'AI:'} {m['message']}" for m in messages)
+            start = time.perf_counter()
+            reference = await summarize_text(text, lang) or ""
+            llm_ms = (time.perf_counter() - start) * 1000
+
+        a, b = model.encode([local, reference], normalize_embeddings=True)
+        rows.append({
+            "id": conv.get("id"),
+            "lang": lang,
+            "rouge1": round(rouge_1(local, reference), 3),
+            "rougeL": round(rouge_l(local, reference), 3),
+            "cosine": round(float(a @ b), 3),
+            "local_chars": len(local),
+            "llm_chars": len(reference),
+            "local_ms": round(local_ms, 1),
+            "llm_ms": round(llm_ms, 1) if llm_ms is not None else None,
+            "local_summary": local,
+            "llm_summary": reference,
+        })
+    return rows
+
+
+def print_table(rows):
+    print(f"{'id':<20}{'lang':>5}{'R-1':>7}{'R-L':>7}{'cos':>7}{'local ms':>10}{'llm ms':>9}")
+    for r in rows:
+        print(f"{str(r['id'])[:19]:<20}{r['lang']:>5}{r['rouge1']:>7}{r['rougeL']:>7}{r['cosine']:>7}"
+              f"{r['local_ms']:>10}{r['llm_ms'] if r['llm_ms'] is not None else '-':>9}")
+    if rows:
+        mean = lambda key: round(statistics.fmean(r[key] for r in rows), 3)
+        llm_times = [r["llm_ms"] for r in rows if r["llm_ms"] is not None]
+        print(f"{'mean':<25}{mean('rouge1'):>7}{mean('rougeL'):>7}{mean('cosine'):>7}{mean('local_ms'):>10}"
+              f"{round(statistics.fmean(llm_times), 1) if llm_times else '-':>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the local extractive summarizer against the LLM baseline")
+    parser.add_argument("conversations", help="JSONL with {id, lang, messages: [{sender, message}], reference_summary?}")
+    parser.add_argument("--sentences", type=int, default=None, help="Override LOCAL_SUMMARY_SENTENCES")
+    parser.add_argument("--mmr-lambda", type=float, default=None, help="Override LOCAL_SUMMARY_MMR_LAMBDA")
+    parser.add_argument("--out", help="Write per-conversation results (with both summaries) to this JSON file")
+    args = parser.parse_args()
+
+    from config import LOCAL_SUMMARY_SENTENCES, LOCAL_SUMMARY_MMR_LAMBDA
+    args.sentences = args.sentences or LOCAL_SUMMARY_SENTENCES
+    args.mmr_lambda = LOCAL_SUMMARY_MMR_LAMBDA if args.mmr_lambda is None else args.mmr_lambda
+
+    lines = Path(args.conversations).read_text(encoding="utf-8").splitlines()
+    conversations = [json.loads(line) for line in lines if line.strip()]
+    rows = asyncio.run(evaluate(conversations, args))
+    print_table(rows)
+    if args.out:
+        Path(args.out).write_text(json.dumps(rows, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+"""
+Local stand-ins for OpenAI, Pinecone and Supabase used by the benchmark suite.
+
+One aiohttp server exposes all three wire protocols, so the real app runs
+unmodified against it through environment variables:
+
+    OPENAI_BASE_URL=http://127.0.0.1:<port>/v1
+    PINECONE_INDEX_HOST=http://127.0.0.1:<port>
+    SUPABASE_URL=http://127.0.0.1:<port>
+
+Run standalone with:
+    python -m bench.fakes --port 8900 --ttft-ms 300 --tokens-per-sec 80
+"""
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import random
+import time
+
+import numpy as np
+from aiohttp import web
+
+from utils.jurisdiction import namespace_for
+
+STATES = ["Federal", "Maranhão", "São Paulo", "Rio de Janeiro", "Minas Gerais"]
+
+
+def state_names(count):
+    """`count` jurisdictions: the real ones above first, then synthetic "Estado N" for roadmap growth."""
+    return (STATES + [f"Estado {n}" for n in range(len(STATES) + 1, count + 1)])[:count]
+
+LOREM = (
+    "o réu será punido com pena de reclusão conforme o disposto neste artigo "
+    "salvo quando a lei dispuser de forma diversa e observado o devido processo legal "
+    "the defendant shall be liable under this article unless otherwise provided by law"
+).split()
+
+
+class FakeOpenAI:
+    """OpenAI-compatible `/v1/chat/completions` streaming with configurable TTFT and token rate."""
+
+    # Prefix caching modeled on OpenAI's: prompts of 1024+ tokens, matched in 128-token blocks
+    CACHE_MIN_TOKENS = 1024
+    CACHE_BLOCK_TOKENS = 128
+
+    def __init__(self, ttft_ms=300, tokens_per_sec=80, max_tokens=400):
+        self.ttft_ms = ttft_ms
+        self.tokens_per_sec = tokens_per_sec
+        self.max_tokens = max_tokens
+        self.requests = 0
+        self._prefixes = set()
+
+    def _cached_tokens(self, messages):
+        """Tokens (~4 chars each) of the longest block-aligned prompt prefix seen in an earlier request."""
+        prompt = "".join(f"<{m.get('role')}>{m.get('content') or ''}" for m in messages)
+        block_chars = self.CACHE_BLOCK_TOKENS * 4
+        digest = hashlib.blake2b(digest_size=8)
+        cached = 0
+        matching = True
+        for end in range(block_chars, len(prompt) + 1, block_chars):
+            digest.update(prompt[end - block_chars:end].encode())
+            key = digest.copy().digest()
+            if matching and key in self._prefixes:
+                cached = end // 4
+            else:
+                matching = False
+            self._prefixes.add(key)
+        if len(self._prefixes) > 1_000_000:
+            self._prefixes.clear()
+        return cached if len(prompt) // 4 >= self.CACHE_MIN_TOKENS else 0
+
+    def _chunk(self, completion_id, content=None, finish_reason=None):
+        return {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": "bench-fake",
+            "choices": [{
+                "index": 0,
+                "delta": {"content": content} if content is not None else {},
+                "finish_reason": finish_reason,
+            }],
+        }
+
+    async def handle(self, request):
+        body = await request.json()
+        self.requests += 1
+        n_tokens = min(body.get("max_tokens") or self.max_tokens, self.max_tokens)
+        prompt_chars = sum(len(m.get("content") or "") for m in body.get("messages", []))
+        prompt_tokens = prompt_chars // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": n_tokens,
+            "total_tokens": prompt_tokens + n_tokens,
+            "prompt_tokens_details": {"cached_tokens": self._cached_tokens(body.get("messages", []))},
+        }
+        completion_id = f"chatcmpl-bench-{self.requests}"
+        words = list(itertools.islice(itertools.cycle(LOREM), n_tokens))
+
+        if not body.get("stream"):
+            await asyncio.sleep(self.ttft_ms / 1000 + n_tokens / self.tokens_per_sec)
+            return web.json_response({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "bench-fake",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        await asyncio.sleep(self.ttft_ms / 1000)
+        interval = 1 / self.tokens_per_sec
+        for word in words:
+            await resp.write(f"data: {json.dumps(self._chunk(completion_id, word + ' '))}\n\n".encode())
+            await asyncio.sleep(interval)
+        await resp.write(f"data: {json.dumps(self._chunk(completion_id, finish_reason='stop'))}\n\n".encode())
+        if (body.get("stream_options") or {}).get("include_usage"):
+            tail = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": "bench-fake", "choices": [], "usage": usage}
+            await resp.write(f"data: {json.dumps(tail)}\n\n".encode())
+        await resp.write(b"data: [DONE]\n\n")
+        await resp.write_eof()
+        return resp
+
+
+class FakeIndex:
+    """
+    Pinecone data-plane stand-in (`POST /query`, fetch, list) over a synthetic corpus.
+
+    Vectors are random unit vectors; scores are real dot products, so cost grows
+    with corpus size the way brute-force search would. Every document is also
+    reachable through its jurisdiction's namespace (see utils/jurisdiction.py),
+    and a namespace query only scans that partition.
+    """
+
+    def __init__(self, docs_per_state=400, dim=1024, latency_ms=20, seed=7, states=None):
+        rng = np.random.default_rng(seed)
+        self.latency_ms = latency_ms
+        self.dim = dim
+        self.ids, self.metadata = [], []
+        for state in states or STATES:
+            slug = namespace_for(state)
+            for n in range(docs_per_state):
+                article = n + 1
+                self.ids.append(f"{slug}-{article}")
+                self.metadata.append({
+                    "state": state,
+                    "country": "Brazil",
+                    "type": "law",
+                    "title": f"Lei {state} Art. {article}",
+                    "source": f"http://www.planalto.gov.br/ccivil_03/bench/{slug}.htm",
+                    "url": f"http://www.planalto.gov.br/ccivil_03/bench/{slug}.htm",
+                    "text": f"Art. {article}. " + " ".join(rng.choice(LOREM, size=120)),
+                })
+        vectors = rng.standard_normal((len(self.ids), dim)).astype(np.float32)
+        self.vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.states = np.array([m["state"] for m in self.metadata])
+        self.partitions = {}
+        for i, state in enumerate(self.states):
+            self.partitions.setdefault(namespace_for(state), []).append(i)
+        self.partitions = {ns: np.array(rows) for ns, rows in self.partitions.items()}
+
+    def _candidates(self, flt, namespace):
+        if namespace:
+            rows = self.partitions.get(namespace, np.array([], dtype=int))
+            return rows[self._filter_mask(flt)[rows]] if flt else rows
+        if flt:
+            return np.flatnonzero(self._filter_mask(flt))
+        return np.arange(len(self.ids))
+
+    def _filter_mask(self, flt):
+        mask = np.ones(len(self.ids), dtype=bool)
+        for key, cond in flt.items():
+            if key == "$or":
+                any_mask = np.zeros(len(self.ids), dtype=bool)
+                for sub in cond:
+                    any_mask |= self._filter_mask(sub)
+                mask &= any_mask
+            elif key == "state":
+                wanted = cond.get("$eq") if isinstance(cond, dict) else cond
+                mask &= self.states == wanted
+        return mask
+
+    def query(self, vector=None, top_k=10, filter=None, namespace="", include_metadata=False):
+        vec = np.asarray(vector or [], dtype=np.float32)
+        if vec.shape[0] != self.dim:
+            vec = np.resize(vec, self.dim)
+        candidates = self._candidates(filter, namespace)
+        scores = self.vectors[candidates] @ vec
+        order = np.argsort(-scores)[:top_k]
+        matches = []
+        for i in order:
+            idx = candidates[i]
+            match = {"id": self.ids[idx], "score": float(scores[i]), "values": []}
+            if include_metadata:
+                match["metadata"] = self.metadata[idx]
+            matches.append(match)
+        return {"matches": matches, "namespace": namespace or "", "usage": {"readUnits": 5}}
+
+    async def handle(self, request):
+        body = await request.json()
+        await asyncio.sleep(self.latency_ms / 1000)
+        result = self.query(
+            vector=body.get("vector"),
+            top_k=body.get("topK", 10),
+            filter=body.get("filter"),
+            namespace=body.get("namespace", ""),
+            include_metadata=body.get("includeMetadata", False),
+        )
+        return web.json_response(result)
+
+    async def handle_fetch(self, request):
+        positions = {vid: i for i, vid in enumerate(self.ids)}
+        namespace = request.query.get("namespace", "")
+        vectors = {}
+        for vid in request.query.getall("ids", []):
+            # Like the real index: a namespaced vector is only found in its namespace
+            if vid in positions and (not namespace or namespace_for(self.states[positions[vid]]) == namespace):
+                i = positions[vid]
+                vectors[vid] = {"id": vid, "values": self.vectors[i].tolist(), "metadata": self.metadata[i]}
+        return web.json_response({"vectors": vectors, "namespace": request.query.get("namespace", "")})
+
+    async def handle_list(self, request):
+        limit = int(request.query.get("limit", 100))
+        start = int(request.query.get("paginationToken") or 0)
+        page = [{"id": vid} for vid in self.ids[start:start + limit]]
+        body = {"vectors": page, "namespace": request.query.get("namespace", ""), "usage": {"readUnits": 1}}
+        if start + limit < len(self.ids):
+            body["pagination"] = {"next": str(start + limit)}
+        return web.json_response(body)
+
+
+class MemoryChatStore:
+    """Minimal PostgREST (Supabase) stand-in for the `messages` and `summaries` tables."""
+
+    def __init__(self, latency_ms=5):
+        self.latency_ms = latency_ms
+        self.tables = {"messages": [], "summaries": []}
+        self._ids = itertools.count(1)
+
+    def seed_chat(self, chat_id, turns):
+        """Insert `turns` user/ai message pairs for `chat_id`."""
+        now = time.time()
+        for turn in range(turns):
+            for sender in ("user", "ai"):
+                self.tables["messages"].append({
+                    "id": next(self._ids),
+                    "chat_id": chat_id,
+                    "sender": sender,
+                    "message": " ".join(random.choices(LOREM, k=40)),
+                    "is_summarized": False,
+                    "created_at": now + turn,
+                })
+
+    @staticmethod
+    def _matches(row, params):
+        for key, value in params.items():
+            if key in ("select", "order", "limit", "on_conflict"):
+                continue
+            op, _, expected = value.partition(".")
+            if op == "eq" and str(row.get(key)) != expected:
+                return False
+        return True
+
+    async def handle(self, request):
+        await asyncio.sleep(self.latency_ms / 1000)
+        table = self.tables.setdefault(request.match_info["table"], [])
+        params = dict(request.query)
+        single = "vnd.pgrst.object" in request.headers.get("Accept", "")
+
+        if request.method == "GET":
+            rows = [r for r in table if self._matches(r, params)]
+            if params.get("order"):
+                column, _, direction = params["order"].partition(".")
+                rows.sort(key=lambda r: r.get(column) or 0, reverse=direction == "desc")
+            if single:
+                if len(rows) != 1:
+                    return web.json_response({"message": "JSON object requested, multiple (or no) rows returned",
+                                              "code": "PGRST116"}, status=406)
+                return web.json_response(rows[0])
+            return web.json_response(rows)
+
+        payload = await request.json()
+        if request.method == "POST":
+            rows = payload if isinstance(payload, list) else [payload]
+            key = "chat_id" if request.match_info["table"] == "summaries" else "id"
+            for row in rows:
+                existing = next((r for r in table if key in row and r.get(key) == row[key]), None)
+                if existing:
+                    existing.update(row)
+                else:
+                    row.setdefault("id", next(self._ids))
+                    table.append(row)
+            return web.json_response(rows, status=201)
+
+        if request.method == "PATCH":
+            updated = [r for r in table if self._matches(r, params)]
+            for row in updated:
+                row.update(payload)
+            return web.json_response(updated)
+
+        return web.json_response({"message": "unsupported"}, status=405)
+
+    async def handle_seed(self, request):
+        body = await request.json()
+        for chat in body.get("chats", []):
+            self.seed_chat(chat["id"], chat.get("turns", 0))
+        return web.json_response({"messages": len(self.tables["messages"])})
+
+
+def build_app(openai=None, index=None, store=None):
+    """Build the aiohttp app serving all three stand-ins."""
+    openai = openai or FakeOpenAI()
+    index = index or FakeIndex()
+    store = store or MemoryChatStore()
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app["openai"], app["index"], app["store"] = openai, index, store
+    app.router.add_post("/v1/chat/completions", openai.handle)
+    app.router.add_post("/query", index.handle)
+    app.router.add_get("/vectors/fetch", index.handle_fetch)
+    app.router.add_get("/vectors/list", index.handle_list)
+    app.router.add_route("*", "/rest/v1/{table}", store.handle)
+    app.router.add_post("/_bench/seed", store.handle_seed)
+
+    async def stats(request):
+        return web.json_response({
+            "openai_requests": openai.requests,
+            "messages": len(store.tables["messages"]),
+            "corpus": len(index.ids),
+        })
+
+    app.router.add_get("/_bench/stats", stats)
+    return app
+
+
+def add_arguments(parser):
+    parser.add_argument("--ttft-ms", type=float, default=300, help="Fake LLM time to first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=80, help="Fake LLM streaming rate")
+    parser.add_argument("--max-tokens", type=int, default=400, help="Tokens per fake completion")
+    parser.add_argument("--docs-per-state", type=int, default=400, help="Synthetic corpus size per jurisdiction")
+    parser.add_argument("--states", type=int, default=len(STATES), help="Jurisdictions in the corpus (Federal included)")
+    parser.add_argument("--vector-latency-ms", type=float, default=20, help="Added latency per vector query")
+    parser.add_argument("--store-latency-ms", type=float, default=5, help="Added latency per chat store call")
+
+
+def app_from_args(args):
+    return build_app(
+        FakeOpenAI(ttft_ms=args.ttft_ms, tokens_per_sec=args.tokens_per_sec, max_tokens=args.max_tokens),
+        FakeIndex(docs_per_state=args.docs_per_state, latency_ms=args.vector_latency_ms, states=state_names(args.states)),
+        MemoryChatStore(latency_ms=args.store_latency_ms),
+    )
+
+
+def fake_env(port):
+    """Environment variables that point the app at a fakes server on `port`."""
+    base = f"http://127.0.0.1:{port}"
+    return {
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{base}/v1",
+        "PINECONE_API_KEY": "bench",
+        "PINECONE_INDEX_HOST": base,
+        "SUPABASE_URL": base,
+        # Shaped like a JWT so supabase-py's key validation accepts it
+        "SUPABASE_KEY": "bench." + hashlib.sha1(b"bench").hexdigest() + ".bench",
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the local OpenAI/Pinecone/Supabase stand-ins")
+    parser.add_argument("--port", type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args()
+    web.run_app(app_from_args(args), host="127.0.0.1", port=args.port)
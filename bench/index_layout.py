@@ -0,0 +1,114 @@
+"""
+Retrieval latency: `$or` metadata filter vs. jurisdiction namespaces.
+
+For each corpus size (number of jurisdictions) this starts the fake index,
+then times utils.pinecode.query_filtered and query_partitioned with the same
+random query vectors. With --live it instead times both layouts against the
+configured Pinecone index (migrate it with scripts/partition_index.py first).
+
+The fake scans with numpy, so local runs mostly show the client-side cost of
+the two-query fan-out and merge; filtered-ANN degradation as states are added
+only shows up with --live.
+
+Usage:
+    python -m bench.index_layout --states 2,5,10,27 --docs-per-state 2000
+    python -m bench.index_layout --live --queries 100 --state Maranhão
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from bench.fakes import state_names, fake_env
+from bench.run import ROOT, RESULTS_DIR, git_revision, percentiles
+
+
+def time_layout(query_fn, idx, vectors, top_k, states):
+    timings = []
+    for vector in vectors:
+        state = random.choice(states)
+        start = time.perf_counter()
+        query_fn(vector, top_k, state=state, idx=idx)
+        timings.append((time.perf_counter() - start) * 1000)
+    return percentiles(timings)
+
+
+def wait_for(url, timeout=120):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.3)
+    raise TimeoutError(url)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare filter vs. namespace index layouts")
+    parser.add_argument("--states", type=lambda s: [int(x) for x in s.split(",")], default=[2, 5, 10, 27])
+    parser.add_argument("--docs-per-state", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=16)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--vector-latency-ms", type=float, default=0, help="Fixed network latency the fake adds")
+    parser.add_argument("--port", type=int, default=8920)
+    parser.add_argument("--live", action="store_true", help="Time the configured Pinecone index instead of the fake")
+    parser.add_argument("--state", action="append", help="States to query in --live mode (repeatable)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(3)
+    vectors = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).tolist()
+
+    if not args.live:
+        # Point utils.pinecode at a placeholder host before import; each run passes its own index
+        os.environ.update(fake_env(args.port))
+
+    from pinecone import Pinecone
+    from utils.pinecode import query_filtered, query_partitioned, index as live_index
+
+    rows = []
+    if args.live:
+        states = args.state or ["Maranhão"]
+        for layout, fn in (("filter", query_filtered), ("namespaces", query_partitioned)):
+            rows.append({"states": "live", "layout": layout, "latency_ms": time_layout(fn, live_index, vectors, args.top_k, states)})
+    else:
+        for count in args.states:
+            proc = subprocess.Popen(
+                [sys.executable, "-m", "bench.fakes", "--port", str(args.port), "--states", str(count),
+                 "--docs-per-state", str(args.docs_per_state), "--vector-latency-ms", str(args.vector_latency_ms)],
+                cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                wait_for(f"http://127.0.0.1:{args.port}/_bench/stats")
+                idx = Pinecone(api_key="bench").Index(host=f"http://127.0.0.1:{args.port}")
+                states = state_names(count)[1:] or [None]
+                for layout, fn in (("filter", query_filtered), ("namespaces", query_partitioned)):
+                    rows.append({"states": count, "layout": layout,
+                                 "latency_ms": time_layout(fn, idx, vectors, args.top_k, states)})
+            finally:
+                proc.terminate()
+                proc.wait()
+
+    print(f"{'states':>7}{'layout':>12}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for r in rows:
+        l = r["latency_ms"]
+        print(f"{r['states']:>7}{r['layout']:>12}{l['p50']:>9}{l['p95']:>9}{l['p99']:>9}")
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    out = RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{git_revision()}-index-layout.json"
+    out.write_text(json.dumps({"commit": git_revision(), "params": vars(args), "results": rows}, indent=2))
+    print(f"\n📁 saved {out.relative_to(ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Replay a recorded traffic trace (utils/traffic.py) against a local instance.
+
+Starts the stand-ins and the app like bench/run.py. Then it re-issues every
+recorded /ask and /summarize-file request at its recorded arrival time,
+divided by --speed. The load is open loop: requests go out on schedule
+whether or not earlier ones have finished, so bursts and overlaps happen as
+they did in production.
+
+Request bodies are synthesized from the recorded shapes:
+
+- /ask: questions have the recorded word and character counts, with the
+  same language and jurisdiction. Chats are seeded with the recorded
+  history size.
+- /summarize-file: plain-text documents have the recorded extracted
+  length. PDF/DOCX parsing cost is therefore not reproduced; extraction
+  time is reported from the trace instead.
+
+The report compares replayed TTFT and latency per route with the recorded
+ones. It is written to bench/results/ like bench/run.py reports.
+
+Usage:
+    TRACE_RECORD_PATH=traces/prod.jsonl uvicorn main:app ...   # record
+    python -m bench.replay traces/prod.jsonl --speed 4
+    python -m bench.replay traces/prod.jsonl --speed 10 --max-gap 2 --ttft-ms 600 --app-env ASK_DEADLINE_MS=5000
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from pathlib import Path
+
+import httpx
+
+from bench.fakes import LOREM, add_arguments
+from bench.run import ROOT, RESULTS_DIR, Stack, git_revision, percentiles, read_rss_mb, sse_request
+
+ROUTES = ("/ask", "/summarize-file")
+
+
+def load_trace(path, routes=ROUTES, limit=None):
+    records = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            record = json.loads(line)
+            if record.get("route") in routes and "ts" in record:
+                records.append(record)
+    records.sort(key=lambda r: r["ts"])
+    return records[:limit] if limit else records
+
+
+def schedule(records, speed, max_gap=None):
+    """Offsets in seconds (from replay start) for each record: recorded gaps, capped, divided by speed."""
+    offsets, offset = [], 0.0
+    for previous, record in zip([None, *records], records):
+        if previous is not None:
+            gap = record["ts"] - previous["ts"]
+            offset += (min(gap, max_gap) if max_gap is not None else gap) / speed
+        offsets.append(offset)
+    return offsets
+
+
+def synth_text(words, chars):
+    words = max(1, words or 1)
+    text = " ".join(random.choices(LOREM, k=words))
+    while len(text) < (chars or 0):
+        text += " " + " ".join(random.choices(LOREM, k=words))
+    return text[:chars] if chars else text
+
+
+def synth_document(chars):
+    """Plain-text document of about `chars` characters, split into articles like a statute."""
+    lines, size, article = [], 0, 1
+    while size < chars:
+        line = f"Art. {article}. " + " ".join(random.choices(LOREM, k=60))
+        lines.append(line)
+        size += len(line) + 1
+        article += 1
+    return "\n".join(lines)[:max(chars, 1)].encode()
+
+
+def chats_to_seed(records):
+    """Seeded turns per anonymized chat: enough to give each request its recorded history size."""
+    turns = {}
+    for record in records:
+        if record["route"] == "/ask" and record.get("chat"):
+            turns[record["chat"]] = max(turns.get(record["chat"], 0), math.ceil((record.get("history") or 0) / 2))
+    return [{"id": f"replay-{chat}", "turns": n} for chat, n in turns.items()]
+
+
+def build_request(base, record):
+    if record["route"] == "/ask":
+        body = {
+            "query": synth_text(record.get("query_words"), record.get("query_chars")),
+            "id": f"replay-{record['chat']}" if record.get("chat") else None,
+            "lang": record.get("lang"),
+            "country": record.get("country"),
+            "state": record.get("state"),
+        }
+        return "POST", f"{base}/ask", {"json": body}
+    document = synth_document(record.get("raw_chars") or record.get("bytes") or 1024)
+    files = {"file": ("replay.txt", document, "text/plain")}
+    return "POST", f"{base}/summarize-file", {"files": files, "data": {"lang": record.get("lang") or "pt"}}
+
+
+async def replay(stack, args, records):
+    base = f"http://127.0.0.1:{args.app_port}"
+    offsets = schedule(records, args.speed, args.max_gap)
+    results = {route: [] for route in ROUTES}
+    lags, rss_samples = [], []
+    done = asyncio.Event()
+
+    async def sample_memory():
+        while not done.is_set():
+            rss, _ = read_rss_mb(stack.app_pid)
+            if rss:
+                rss_samples.append(rss)
+            await asyncio.sleep(0.5)
+
+    async def one(client, record):
+        method, url, kwargs = build_request(base, record)
+        results[record["route"]].append((record, *await sse_request(client, method, url, **kwargs)))
+
+    sampler = asyncio.create_task(sample_memory())
+    tasks = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=64)
+    start = time.perf_counter()
+    async with httpx.AsyncClient(timeout=args.request_timeout, limits=limits) as client:
+        for record, offset in zip(records, offsets):
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lags.append(max(0.0, -delay) * 1000)
+            tasks.append(asyncio.create_task(one(client, record)))
+        await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    done.set()
+    await sampler
+    _, peak = read_rss_mb(stack.app_pid)
+
+    report = []
+    for route, rows in results.items():
+        if not rows:
+            continue
+        ok = [r for r in rows if r[3] is None]
+        recorded = [r[0] for r in rows]
+        report.append({
+            "route": route,
+            "requests": len(rows),
+            "errors": len(rows) - len(ok),
+            "sample_errors": sorted({r[3] for r in rows if r[3]})[:5],
+            "rps": round(len(ok) / elapsed, 2) if elapsed else None,
+            "ttft_ms": percentiles([r[1] for r in ok if r[1] is not None]),
+            "latency_ms": percentiles([r[2] for r in ok]),
+            "recorded": {
+                "ttft_ms": percentiles([r["ttft_ms"] for r in recorded if r.get("ttft_ms") is not None]),
+                "latency_ms": percentiles([r["duration_ms"] for r in recorded if r.get("duration_ms") is not None]),
+                "extract_ms": percentiles([r["extract_ms"] for r in recorded if r.get("extract_ms") is not None]),
+                "outcomes": {o: sum(r.get("outcome") == o for r in recorded) for o in sorted({r.get("outcome") for r in recorded})},
+            },
+        })
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "dispatch_lag_ms": percentiles(lags),
+        "rss_mb": {"max": round(max(rss_samples), 1) if rss_samples else None, "peak_hwm": round(peak, 1) if peak else None},
+        "routes": report,
+    }
+
+
+def print_report(report):
+    print(f"\ncommit={report['commit']} trace={report['trace']} speed={report['speed']}x "
+          f"elapsed={report['results']['elapsed_s']}s dispatch lag p95={report['results']['dispatch_lag_ms']['p95']}ms")
+    print(f"{'route':<17}{'reqs':>6}{'err':>5}{'rps':>8}{'ttft p50':>10}{'p95':>8}{'rec p95':>9}"
+          f"{'lat p50':>10}{'p95':>8}{'rec p95':>9}")
+    for r in report["results"]["routes"]:
+        t, l, rec = r["ttft_ms"], r["latency_ms"], r["recorded"]
+        print(f"{r['route']:<17}{r['requests']:>6}{r['errors']:>5}{r['rps'] or 0:>8}{t['p50'] or '-':>10}{t['p95'] or '-':>8}"
+              f"{rec['ttft_ms']['p95'] or '-':>9}{l['p50'] or '-':>10}{l['p95'] or '-':>8}{rec['latency_ms']['p95'] or '-':>9}")
+    print("rec = recorded in production (real backends); the replay runs against the stand-ins")
+
+
+async def main(args):
+    random.seed(args.seed)
+    records = load_trace(args.trace, args.routes, args.limit)
+    if not records:
+        raise SystemExit(f"no {', '.join(args.routes)} records in {args.trace}")
+    span = records[-1]["ts"] - records[0]["ts"]
+    print(f"replaying {len(records)} requests recorded over {span:.0f}s at {args.speed}x")
+
+    stack = Stack(args)
+    try:
+        await stack.start()
+        await stack.seed(chats_to_seed(records))
+        results = await replay(stack, args, records)
+    finally:
+        stack.stop()
+
+    report = {
+        "commit": git_revision(),
+        "label": args.label,
+        "trace": str(args.trace),
+        "speed": args.speed,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": {k: v for k, v in vars(args).items() if k != "verbose"},
+        "results": results,
+    }
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    out = RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{report['commit']}-replay{'-' + args.label if args.label else ''}.json"
+    out.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print_report(report)
+    print(f"\n📁 saved {out.relative_to(ROOT)}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded traffic trace against local stand-ins")
+    parser.add_argument("trace", help="JSONL written with TRACE_RECORD_PATH")
+    parser.add_argument("--speed", type=float, default=1.0, help="Time compression, 1 = as recorded (1-10)")
+    parser.add_argument("--max-gap", type=float, default=None, help="Cap idle gaps between requests (recorded seconds)")
+    parser.add_argument("--routes", type=lambda s: tuple(s.split(",")), default=ROUTES)
+    parser.add_argument("--limit", type=int, default=None, help="Replay only the first N requests")
+    parser.add_argument("--app-port", type=int, default=4100)
+    parser.add_argument("--fakes-port", type=int, default=8900)
+    parser.add_argument("--app-env", action="append", default=[], type=lambda s: tuple(s.split("=", 1)),
+                        help="Extra KEY=VALUE passed to the app (repeatable)")
+    parser.add_argument("--app-log-level", default="WARNING")
+    parser.add_argument("--startup-timeout", type=float, default=600)
+    parser.add_argument("--request-timeout", type=float, default=300)
+    parser.add_argument("--label", default="", help="Suffix for the results file")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="Show app and fakes output")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    if not 1 <= args.speed <= 10:
+        parser.error("--speed must be between 1 and 10")
+    return args
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,323 @@
+"""
+Offline load test for /ask and /summarize-file.
+
+Starts the local stand-ins (bench/fakes.py) and the real FastAPI app as
+subprocesses, drives the endpoints at each requested concurrency and writes
+a JSON report to bench/results/ named after the current commit.
+
+Usage:
+    python -m bench.run --scenario ask --concurrency 1,8,32 --requests 200
+    python -m bench.run --scenario summarize --doc-kb 256 --concurrency 4
+    python -m bench.run --compare bench/results/a.json bench/results/b.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from bench.fakes import LOREM, STATES, add_arguments, fake_env
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT / "bench" / "results"
+
+QUESTIONS = [
+    "Qual é a pena para homicídio simples?",
+    "O que diz o Código Civil sobre usucapião?",
+    "What are the requirements for a valid contract?",
+    "Quais são os direitos do consumidor em caso de defeito?",
+    "How long is the statute of limitations for theft?",
+]
+
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+    ordered = sorted(values)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "mean": round(statistics.fmean(ordered), 1)}
+
+
+def git_revision():
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return sha + ("-dirty" if dirty else "")
+    except OSError:
+        return "unknown"
+
+
+def read_rss_mb(pid):
+    """Current and peak resident memory of `pid` in MB (Linux /proc only)."""
+    try:
+        fields = {}
+        with open(f"/proc/{pid}/status") as fh:
+            for line in fh:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    fields[key] = int(value.split()[0]) / 1024
+        return fields.get("VmRSS"), fields.get("VmHWM")
+    except OSError:
+        return None, None
+
+
+class Stack:
+    """Owns the fakes and app subprocesses for one run."""
+
+    def __init__(self, args):
+        self.args = args
+        self.procs = []
+        self.app_pid = None
+
+    def _spawn(self, argv, env):
+        proc = subprocess.Popen(argv, cwd=ROOT, env=env, stdout=subprocess.DEVNULL if not self.args.verbose else None,
+                                stderr=subprocess.STDOUT if not self.args.verbose else None)
+        self.procs.append(proc)
+        return proc
+
+    async def _wait_ready(self, url, timeout):
+        deadline = time.monotonic() + timeout
+        async with httpx.AsyncClient() as client:
+            while time.monotonic() < deadline:
+                try:
+                    if (await client.get(url)).status_code == 200:
+                        return
+                except httpx.HTTPError:
+                    pass
+                if any(p.poll() is not None for p in self.procs):
+                    raise RuntimeError(f"a benchmark subprocess exited while waiting for {url}")
+                await asyncio.sleep(0.5)
+        raise TimeoutError(f"{url} not ready after {timeout}s")
+
+    async def start(self):
+        a = self.args
+        env = dict(os.environ)
+        self._spawn([sys.executable, "-m", "bench.fakes", "--port", str(a.fakes_port),
+                     "--ttft-ms", str(a.ttft_ms), "--tokens-per-sec", str(a.tokens_per_sec),
+                     "--max-tokens", str(a.max_tokens), "--docs-per-state", str(a.docs_per_state),
+                     "--states", str(a.states),
+                     "--vector-latency-ms", str(a.vector_latency_ms), "--store-latency-ms", str(a.store_latency_ms)], env)
+        await self._wait_ready(f"http://127.0.0.1:{a.fakes_port}/_bench/stats", 60)
+
+        app_env = {**env, **fake_env(a.fakes_port), "LOG_LEVEL": a.app_log_level, **dict(a.app_env)}
+        app = self._spawn([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                           "--port", str(a.app_port), "--log-level", "warning"], app_env)
+        self.app_pid = app.pid
+        # First start loads the embedding model, which can take a while on CPU
+        await self._wait_ready(f"http://127.0.0.1:{a.app_port}/health", a.startup_timeout)
+
+    async def seed(self, chats):
+        async with httpx.AsyncClient() as client:
+            await client.post(f"http://127.0.0.1:{self.args.fakes_port}/_bench/seed", json={"chats": chats})
+
+    def stop(self):
+        for proc in self.procs:
+            proc.terminate()
+        for proc in self.procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+def make_document(size_kb):
+    words, size = [], 0
+    article = 1
+    while size < size_kb * 1024:
+        line = f"Art. {article}. " + " ".join(random.choices(LOREM, k=60))
+        words.append(line)
+        size += len(line) + 1
+        article += 1
+    return "\n".join(words).encode()
+
+
+async def sse_request(client, method, url, **kwargs):
+    """Issue one streaming request and time it; returns (ttft_ms, total_ms, error)."""
+    start = time.perf_counter()
+    ttft = None
+    error = None
+    try:
+        async with client.stream(method, url, **kwargs) as resp:
+            if resp.status_code != 200:
+                error = f"http {resp.status_code}"
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                if ttft is None and '"token"' in line:
+                    ttft = (time.perf_counter() - start) * 1000
+                if '"error"' in line:
+                    error = line[5:].strip()[:200]
+    except httpx.HTTPError as e:
+        error = f"{type(e).__name__}: {e}"
+    return ttft, (time.perf_counter() - start) * 1000, error
+
+
+def build_request(args, scenario, n, document):
+    base = f"http://127.0.0.1:{args.app_port}"
+    if scenario == "ask":
+        body = {
+            "query": random.choice(QUESTIONS),
+            "id": f"bench-{n % args.chats}",
+            "lang": random.choice(["pt", "en"]),
+            "country": "Brazil",
+            "state": random.choice(STATES[1:]),
+        }
+        return "POST", f"{base}/ask", {"json": body}
+    files = {"file": ("bench.txt", document, "text/plain")}
+    return "POST", f"{base}/summarize-file", {"files": files, "data": {"lang": random.choice(["pt", "en"])}}
+
+
+async def run_scenario(stack, args, scenario, concurrency, document):
+    sem = asyncio.Semaphore(concurrency)
+    results = []
+    rss_samples = []
+    done = asyncio.Event()
+
+    async def sample_memory():
+        while not done.is_set():
+            rss, _ = read_rss_mb(stack.app_pid)
+            if rss:
+                rss_samples.append(rss)
+            await asyncio.sleep(0.5)
+
+    async def one(client, n):
+        async with sem:
+            method, url, kwargs = build_request(args, scenario, n, document)
+            results.append(await sse_request(client, method, url, **kwargs))
+
+    sampler = asyncio.create_task(sample_memory())
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    start = time.perf_counter()
+    async with httpx.AsyncClient(timeout=args.request_timeout, limits=limits) as client:
+        await asyncio.gather(*(one(client, n) for n in range(args.requests)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await sampler
+    _, peak = read_rss_mb(stack.app_pid)
+
+    ok = [r for r in results if r[2] is None]
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "sample_errors": sorted({r[2] for r in results if r[2]})[:5],
+        "elapsed_s": round(elapsed, 2),
+        "rps": round(len(ok) / elapsed, 2) if elapsed else None,
+        "ttft_ms": percentiles([r[0] for r in ok if r[0] is not None]),
+        "latency_ms": percentiles([r[1] for r in ok]),
+        "rss_mb": {
+            "mean": round(statistics.fmean(rss_samples), 1) if rss_samples else None,
+            "max": round(max(rss_samples), 1) if rss_samples else None,
+            "peak_hwm": round(peak, 1) if peak else None,
+        },
+    }
+
+
+def print_report(report):
+    print(f"\ncommit={report['commit']} label={report['label']}")
+    print(f"{'scenario':<11}{'conc':>5}{'rps':>8}{'ttft p50':>10}{'p95':>8}{'p99':>8}"
+          f"{'lat p50':>10}{'p95':>8}{'p99':>8}{'rss MB':>9}{'err':>5}")
+    for r in report["results"]:
+        t, l = r["ttft_ms"], r["latency_ms"]
+        print(f"{r['scenario']:<11}{r['concurrency']:>5}{r['rps'] or 0:>8}{t['p50'] or '-':>10}{t['p95'] or '-':>8}"
+              f"{t['p99'] or '-':>8}{l['p50'] or '-':>10}{l['p95'] or '-':>8}{l['p99'] or '-':>8}"
+              f"{r['rss_mb']['max'] or '-':>9}{r['errors']:>5}")
+
+
+def compare(path_a, path_b):
+    """Print per-scenario deltas of `path_b` relative to `path_a`."""
+    a, b = (json.loads(Path(p).read_text()) for p in (path_a, path_b))
+    base = {(r["scenario"], r["concurrency"]): r for r in a["results"]}
+    print(f"{a['commit']} -> {b['commit']}")
+    print(f"{'scenario':<11}{'conc':>5}{'rps':>16}{'ttft p95':>20}{'lat p99':>20}")
+
+    def delta(old, new):
+        if old is None or new is None:
+            return "-"
+        pct = (new - old) / old * 100 if old else 0
+        return f"{new} ({pct:+.0f}%)"
+
+    for r in b["results"]:
+        old = base.get((r["scenario"], r["concurrency"]))
+        if not old:
+            continue
+        print(f"{r['scenario']:<11}{r['concurrency']:>5}{delta(old['rps'], r['rps']):>16}"
+              f"{delta(old['ttft_ms']['p95'], r['ttft_ms']['p95']):>20}"
+              f"{delta(old['latency_ms']['p99'], r['latency_ms']['p99']):>20}")
+
+
+async def main(args):
+    random.seed(args.seed)
+    stack = Stack(args)
+    try:
+        await stack.start()
+        await stack.seed([{"id": f"bench-{i}", "turns": args.history_turns} for i in range(args.chats)])
+        document = make_document(args.doc_kb)
+        scenarios = ["ask", "summarize"] if args.scenario == "both" else [args.scenario]
+        results = []
+        for scenario in scenarios:
+            for concurrency in args.concurrency:
+                if args.warmup:
+                    await run_scenario(stack, argparse.Namespace(**{**vars(args), "requests": args.warmup}),
+                                       scenario, concurrency, document)
+                results.append(await run_scenario(stack, args, scenario, concurrency, document))
+    finally:
+        stack.stop()
+
+    report = {
+        "commit": git_revision(),
+        "label": args.label,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": {k: v for k, v in vars(args).items() if k not in ("compare", "verbose")},
+        "results": results,
+    }
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{report['commit']}{'-' + args.label if args.label else ''}.json"
+    out = RESULTS_DIR / name
+    out.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print_report(report)
+    print(f"\n📁 saved {out.relative_to(ROOT)}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test against local stand-ins")
+    parser.add_argument("--scenario", choices=["ask", "summarize", "both"], default="ask")
+    parser.add_argument("--concurrency", type=lambda s: [int(x) for x in s.split(",")], default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=100, help="Requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests before each level")
+    parser.add_argument("--chats", type=int, default=50, help="Distinct chat ids to spread /ask over")
+    parser.add_argument("--history-turns", type=int, default=3, help="Seeded user/ai turns per chat")
+    parser.add_argument("--doc-kb", type=int, default=64, help="Uploaded document size for /summarize-file")
+    parser.add_argument("--app-port", type=int, default=4100)
+    parser.add_argument("--fakes-port", type=int, default=8900)
+    parser.add_argument("--app-env", action="append", default=[], type=lambda s: tuple(s.split("=", 1)),
+                        help="Extra KEY=VALUE passed to the app (repeatable), e.g. INDEX_LAYOUT=namespaces")
+    parser.add_argument("--app-log-level", default="WARNING")
+    parser.add_argument("--startup-timeout", type=float, default=600)
+    parser.add_argument("--request-timeout", type=float, default=300)
+    parser.add_argument("--label", default="", help="Suffix for the results file")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="Show app and fakes output")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="Compare two saved result files and exit")
+    add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.compare:
+        compare(*args.compare)
+    else:
+        asyncio.run(main(args))
@@ -2,13 +2,34 @@
 Configuration settings for the legal AI system.
 """
 import os
-import logging
 
-# Logging setup
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s"
-)
+
+def _parse_module_levels(spec):
+    """Parse "services.llm=DEBUG,utils.pinecode=WARNING" into a dict."""
+    levels = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _parse_ladder(spec):
+    """Parse "skip_summary=5000,skip_rerank=3000" into {step: remaining-budget threshold in ms}."""
+    return {name.strip(): int(ms) for name, ms in (item.split("=", 1) for item in spec.split(",") if "=" in item)}
+
+
+# Logging Configuration (applied by utils.log.setup_logging)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_MODULE_LEVELS = {
+    "httpx": "WARNING",
+    "openai": "WARNING",
+    **_parse_module_levels(os.getenv("LOG_MODULE_LEVELS")),
+}
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # "text" or "json"
+LOG_QUEUE_SIZE = 10000  # Records beyond this are dropped rather than blocking a request
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))  # Share of prompt/response dumps kept at DEBUG
+LOG_PAYLOAD_MAX_CHARS = 4000
 
 # OpenAI Configuration
 OPENAI_CONFIG = {
@@ -18,9 +39,45 @@ OPENAI_CONFIG = {
 }
 
 # Model Configuration
-EMBEDDING_MODEL = "intfloat/multilingual-e5-large"  # Still using sentence-transformers for embeddings
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "intfloat/multilingual-e5-large")  # Still using sentence-transformers for embeddings
 LLM_MODEL = "gpt-4o-mini"  # OpenAI model (gpt-4o-mini, gpt-4o, gpt-3.5-turbo, etc.)
 
+# Retrieval embeddings: question and conversation context are embedded separately and fused
+QUERY_EMBEDDING_WEIGHT = 0.8
+CONTEXT_EMBEDDING_WEIGHT = 0.2
+QUERY_EMBEDDING_CACHE_SIZE = 4096  # Distinct question texts kept
+CONTEXT_EMBEDDING_CACHE_SIZE = 2048  # Chats whose context vector is kept
+CONTEXT_TEXT_MAX_CHARS = 500  # Newest part of the summary/recent messages that gets embedded
+
+# Index layout: "filter" (one query, $or on state metadata) or "namespaces" (one namespace per jurisdiction,
+# Federal + requested state queried concurrently). Migrate with scripts/partition_index.py first.
+INDEX_LAYOUT = os.getenv("INDEX_LAYOUT", "filter")
+INDEX_QUERY_WORKERS = 16
+
+# Formatted [REFERENCE] bodies cached per chunk id; TTL picks up re-indexed text
+REFERENCE_CACHE_SIZE = 4096
+REFERENCE_CACHE_TTL = 3600
+
+# Retrieval: with conversation context, fetch top_k * SEARCH_OVERFETCH and rerank down to top_k
+SEARCH_OVERFETCH = 2
+CONTEXT_BOOST_WEIGHTS = {"query": 0.3, "context": 0.15, "similarity": 0.1}  # Score multiplier terms in context_rerank
+
+# Results of searches without conversation context (first questions, warm-up), per question and filters
+RETRIEVAL_CACHE_SIZE = 2048
+RETRIEVAL_CACHE_TTL = 900  # Seconds; re-indexed documents show up after this
+
+# Optional cross-encoder rerank (utils/reranker.py); off unless RERANK_MODEL is set
+RERANK_MODEL = os.getenv("RERANK_MODEL")  # e.g. cross-encoder/mmarco-mMiniLMv2-L12-H384-v1 (multilingual)
+RERANK_OVERFETCH = 3  # Candidates scored = top_k * this
+RERANK_KEEP = 5  # Chunks sent to the LLM after reranking (at most top_k)
+RERANK_MAX_MS = int(os.getenv("RERANK_MAX_MS", "250"))  # Scoring time per request; candidates beyond it keep index order
+RERANK_MAX_LENGTH = 256  # Tokens per (question, chunk) pair
+RERANK_BATCH_SIZE = 32
+RERANK_CACHE_SIZE = 50000  # Cached (question, chunk) scores
+
+# Local chunk store (scripts/build_doc_store.py); when present, vector queries return ids/scores only
+DOC_STORE_PATH = os.getenv("DOC_STORE_PATH")
+
 # LLM Parameters
 LLM_TEMPERATURE = 0.3
 LLM_TOP_P = 0.9
@@ -28,5 +85,107 @@ LLM_MAX_TOKENS = 2048
 SUMMARY_TEMPERATURE = 0.4
 SUMMARY_MAX_TOKENS = 512
 
+# Conversation summaries: "llm" (gpt round trip) or "local" (extractive, reuses the embedding model)
+CONVERSATION_SUMMARIZER = os.getenv("CONVERSATION_SUMMARIZER", "llm")
+LOCAL_SUMMARY_SENTENCES = 5
+LOCAL_SUMMARY_MMR_LAMBDA = 0.7  # 1.0 = most central sentences only, lower = more diverse
+LOCAL_SUMMARY_MAX_CANDIDATES = 120  # Newest sentences considered, bounds encode cost for long AI answers
+
+# Outbound LLM scheduling (services/llm_dispatcher.py)
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "500"))  # Requests per minute for the OpenAI project tier
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "200000"))  # Tokens per minute (prompt + max completion estimate)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))  # Simultaneous open completions
+LLM_MAX_RETRIES = 4  # Retries for 429/5xx/connection errors, honoring Retry-After
+
+# Identical in-flight /ask requests (same question, jurisdiction, language and chunks) share one generation
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+# /ask deadline budget: time allowed until the first answer token
+ASK_DEADLINE_MS = int(os.getenv("ASK_DEADLINE_MS", "8000"))
+# Degradation ladder: a step applies once the remaining budget drops below its threshold (ms).
+# Steps: skip_summary, skip_rerank, reduce_top_k, cached_answer; leave one out to disable it
+DEADLINE_LADDER = _parse_ladder(os.getenv(
+    "DEADLINE_LADDER", "skip_summary=5000,skip_rerank=3000,reduce_top_k=2500,cached_answer=1000"
+))
+DEGRADED_TOP_K = 4  # top_k once reduce_top_k applies (default 8)
+ANSWER_CACHE_SIZE = 2048  # Completed answers kept for the cached_answer step
+ANSWER_CACHE_TTL = 6 * 3600
+
+# Inbound admission control for streaming routes (services/admission.py)
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_LIMITS = {  # Most concurrent streams per route; the adaptive limit moves between ADMISSION_MIN_LIMIT and this
+    "/ask": int(os.getenv("ADMISSION_ASK_LIMIT", "48")),
+    "/summarize-file": int(os.getenv("ADMISSION_SUMMARIZE_LIMIT", "16")),
+    "/summarize-files": 4,
+    "/ask-batch": 4,
+    "/documents/{session_id}/ask": int(os.getenv("ADMISSION_DOCUMENT_ASK_LIMIT", "16")),
+}
+ADMISSION_TARGET_TTFT_MS = {  # Routes whose limit adapts to time-to-first-token (AIMD); others stay fixed
+    "/ask": 2500,
+    "/summarize-file": 4000,
+}
+ADMISSION_MIN_LIMIT = 2
+ADMISSION_DECREASE = 0.75  # Limit multiplier when TTFT misses the target (at most once per second)
+ADMISSION_TENANT_SHARE = float(os.getenv("ADMISSION_TENANT_SHARE", "1.0"))  # Fraction of a route's limit one tenant may hold; 1 = off, lower only with a trusted tenant identity (TRUST_TENANT_HEADER / TRUSTED_PROXY_HOPS)
+ADMISSION_MAX_QUEUE = 32  # Requests waiting per route before fast-failing
+ADMISSION_QUEUE_TIMEOUT = 2.0  # Seconds a request may wait for a slot
+
+# Seconds between client-connection checks while a streaming pipeline runs
+DISCONNECT_POLL_INTERVAL = 0.25
+
+# Batch question answering (/ask-batch)
+BATCH_MAX_QUESTIONS = 100  # Questions accepted per request
+BATCH_MAX_PARALLEL = 8  # Answers generated concurrently per request (LLM calls)
+
+# Multi-file summarization (/summarize-files)
+TENANT_HEADER = "X-Tenant-Id"  # Authenticated tenant, set by the gateway; only read when TRUST_TENANT_HEADER is on
+TRUST_TENANT_HEADER = os.getenv("TRUST_TENANT_HEADER", "false").lower() == "true"  # Only if the proxy sets it and strips client copies
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))  # Proxies in front of the app that append to X-Forwarded-For
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(os.cpu_count() or 2)))  # Text extraction processes
+SEGMENT_MAX_CHARS = 4000  # Longest segment the extraction cleaner emits; longer articles are split at a sentence end
+SUMMARY_TENANT_CONCURRENCY = 4  # Documents summarized at once per tenant, across requests
+MULTI_FILE_MAX_FILES = 50  # Files accepted per request
+
+# Ask-my-document sessions (/documents): uploaded files held in an in-memory vector index
+DOC_SESSION_TTL = 1800  # Seconds a session lives after its last use
+DOC_SESSION_MAX_BYTES = int(os.getenv("DOC_SESSION_MAX_BYTES", str(512 * 1024 * 1024)))  # Vectors + text, all sessions
+DOC_SESSION_MAX_PASSAGES = 5000  # Passages per uploaded document
+DOC_PASSAGE_CHARS = 1200
+DOC_PASSAGE_OVERLAP = 200
+DOC_SESSION_TOP_K = 6  # Passages sent to the LLM per question
+DOC_SESSION_MAX_TOP_K = 20  # Most passages a request may ask for (top_k)
+
+# Background summary jobs (/summarize-file/jobs): a worker pool summarizes stored uploads, results kept on disk
+SUMMARY_JOB_DIR = os.getenv("SUMMARY_JOB_DIR", "jobs")  # Uploads, event logs and job metadata
+SUMMARY_JOB_WORKERS = int(os.getenv("SUMMARY_JOB_WORKERS", "2"))  # Jobs processed at once
+SUMMARY_JOB_MAX_QUEUED = 100  # Jobs waiting for a worker; further submissions get 503
+SUMMARY_JOB_MAX_PER_TENANT = 10  # Queued or running jobs per tenant; further submissions get 429
+SUMMARY_JOB_TTL = int(os.getenv("SUMMARY_JOB_TTL", str(24 * 3600)))  # Seconds a finished job's result is kept
+SUMMARY_JOB_SWEEP_INTERVAL = 600  # Seconds between deletions of expired job files (also done on start and submit)
+
+# On-demand profiling (utils/profiling.py); all hooks, and /metrics, are off unless PROFILE_TOKEN is set
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")  # Must be sent as X-Profile-Token (profiling and /metrics)
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")  # Where .prof / .folded files are written
+PROFILE_MAX_PER_MINUTE = 6  # Captures (per-request or admin) allowed per minute
+PROFILE_MAX_SECONDS = 60  # Longest admin capture
+PROFILE_SAMPLE_INTERVAL_MS = 5  # Sampling period for explicit captures
+PROFILE_ROLLING = os.getenv("PROFILE_ROLLING", "false").lower() == "true"  # Always-on process sampler
+PROFILE_ROLLING_INTERVAL_MS = 50  # ~20 stack samples per second keeps overhead low
+PROFILE_ROLLING_WINDOW_S = 300  # Samples older than this are dropped
+
+# Cache warm-up after deploys (services/cache_warmer.py): embeddings, retrieval results, reference blocks
+WARMUP_SEED_PATH = os.getenv("WARMUP_SEED_PATH")  # JSONL of {query, lang, country, state, count?}
+HOT_QUERIES_PATH = os.getenv("HOT_QUERIES_PATH")  # Frequent first questions, saved by the app and warmed on the next start
+HOT_QUERIES_TRACKED = 5000  # Distinct questions counted in memory
+WARMUP_TOP_N = 50  # Questions warmed per jurisdiction and language
+WARMUP_QPS = float(os.getenv("WARMUP_QPS", "2"))  # Searches per second while warming, leaves room for live traffic
+WARMUP_INTERVAL_S = int(os.getenv("WARMUP_INTERVAL_S", "0"))  # Re-warm period (keep below RETRIEVAL_CACHE_TTL); 0 = startup only
+WARMUP_REFERENCES = True  # Also pre-format [REFERENCE] blocks for warmed chunks
+
+# Traffic recording for load replay (utils/traffic.py, bench/replay.py); off unless a path is set
+TRACE_RECORD_PATH = os.getenv("TRACE_RECORD_PATH")  # JSONL of anonymized request shapes and timings
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))  # Fraction of requests recorded
+TRACE_MAX_BYTES = 256 * 1024 * 1024  # Recording stops once the file reaches this size
+
 # Legacy Ollama URL (kept for backward compatibility if needed)
 # OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
\ No newline at end of file
@@ -1,10 +1,35 @@
+import os
+import sys
+
+if __name__ == "__main__":
+    # Re-exec as `python -m uvicorn main:app` before importing anything heavy. The extraction pool's
+    # spawned workers re-run a script started as __main__ (loading the whole app in every worker),
+    # but not a `-m` entry point.
+    os.execv(sys.executable, [sys.executable, "-m", "uvicorn", "main:app", "--host", "0.0.0.0", "--port", "4000"])
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from utils.log import setup_logging
+
+setup_logging()
+
 from routes.ask import router as ask_router
+from routes.ask_batch import router as ask_batch_router
 from routes.summarize_file import router as summarize_file_router
+from routes.summarize_files import router as summarize_files_router
+from routes.documents import router as documents_router
+from routes.admin import router as admin_router
+from routes.summary_jobs import router as summary_jobs_router
+from services.admission import AdmissionMiddleware
+from services import cache_warmer
+from services.summary_jobs import jobs as summary_jobs
+from config import PROFILE_ROLLING
+from utils import profiling
 
 app = FastAPI(title="Veritus Orchestrator", version="2.0.0")
 
+# Innermost, so shed responses still get CORS headers
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -12,9 +37,34 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(profiling.ProfilingMiddleware)
 
 app.include_router(ask_router, prefix="")
+app.include_router(ask_batch_router, prefix="")
 app.include_router(summarize_file_router, prefix="")
+app.include_router(summarize_files_router, prefix="")
+app.include_router(documents_router, prefix="")
+app.include_router(admin_router, prefix="")
+app.include_router(summary_jobs_router, prefix="")
+
+if PROFILE_ROLLING and profiling.enabled():
+    profiling.start_rolling_sampler()
+
+@app.on_event("startup")
+async def warm_caches():
+    cache_warmer.start()
+
+@app.on_event("shutdown")
+async def save_hot_queries():
+    await cache_warmer.stop()
+
+@app.on_event("startup")
+async def start_summary_jobs():
+    await summary_jobs.start()
+
+@app.on_event("shutdown")
+async def stop_summary_jobs():
+    await summary_jobs.stop()
 
 @app.get("/health")
 def health_check():
@@ -23,7 +73,3 @@ def health_check():
         "timestamp": "running",
         "message": "Backend streaming ready ✅"
     }
-
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=4000)
\ No newline at end of file
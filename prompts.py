@@ -126,16 +126,33 @@ Summary guidelines:
 URL_VALIDATION_WARNING = {
     "en": """
 ⚠️ CRITICAL REMINDER BEFORE RESPONDING:
-- Review ALL [REFERENCE X] sections above
+- Review ALL [REFERENCE X] sections in the legal context
 - Note each "EXACT URL TO CITE" 
 - ONLY cite these exact URLs - do not create, modify, or guess any URLs
-- If you write a URL not listed above, you are HALLUCINATING and must stop
+- If you write a URL not listed in the context, you are HALLUCINATING and must stop
 """,
     "pt": """
 ⚠️ LEMBRETE CRÍTICO ANTES DE RESPONDER:
-- Revise TODAS as seções [REFERENCE X] acima
+- Revise TODAS as seções [REFERENCE X] do contexto legal
 - Note cada "EXACT URL TO CITE"
 - Cite APENAS essas URLs exatas - não crie, modifique ou suponha nenhuma URL
-- Se você escrever uma URL não listada acima, você está ALUCINANDO e deve parar
+- Se você escrever uma URL não listada no contexto, você está ALUCINANDO e deve parar
 """
-}
\ No newline at end of file
+}
+
+ANSWER_LABELS = {
+    "en": {
+        "summary": "Conversation History Summary:",
+        "context": "Legal Context from Database:",
+        "question": "User Question:",
+        "instruction": "Your Response (following the mandatory format above):",
+        "no_context": "No legal documents retrieved for this query.",
+    },
+    "pt": {
+        "summary": "Resumo do Histórico da Conversa:",
+        "context": "Contexto Legal do Banco de Dados:",
+        "question": "Pergunta do Usuário:",
+        "instruction": "Sua Resposta (seguindo o formato obrigatório acima):",
+        "no_context": "No legal documents retrieved for this query.",
+    },
+}
@@ -0,0 +1,87 @@
+"""
+/admin endpoints - Operational hooks (profiling, metrics), guarded by PROFILE_TOKEN
+"""
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+import asyncio
+import logging
+
+from config import PROFILE_MAX_SECONDS
+from utils import metrics, profiling
+
+router = APIRouter()
+
+logger = logging.getLogger(__name__)
+
+
+def _denied(req):
+    """Error response when profiling is off or the token is wrong, else None."""
+    if not profiling.enabled():
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    if not profiling.token_ok(req.headers.get("X-Profile-Token")):
+        return JSONResponse({"error": "Invalid profile token"}, status_code=403)
+    return None
+
+
+@router.post("/admin/profile")
+async def profile_process(req: Request, seconds: float = 10, mode: str = "sample"):
+    """
+    Profile the whole process for `seconds` (at most PROFILE_MAX_SECONDS).
+
+    Query params:
+        - seconds: Capture length
+        - mode: "sample" (all threads, folded stacks) or "cprofile" (event-loop thread, pstats)
+
+    Returns:
+        {file, mode, seconds}; 429 when rate limited or another capture is running
+    """
+    denied = _denied(req)
+    if denied:
+        return denied
+    if mode not in profiling.MODES:
+        return JSONResponse({"error": f"mode must be one of {', '.join(profiling.MODES)}"}, status_code=400)
+
+    seconds = max(0.1, min(seconds, PROFILE_MAX_SECONDS))
+    capture = profiling.Capture.acquire(mode, "process")
+    if capture is None:
+        return JSONResponse({"error": "Profile rate limit reached or capture in progress"}, status_code=429)
+
+    logger.info("🔬 Process profile started", extra={"mode": mode, "seconds": seconds})
+    capture.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        path = await capture.stop()
+    return {"file": path, "mode": mode, "seconds": seconds}
+
+
+@router.get("/admin/profile/rolling")
+async def dump_rolling_profile(req: Request):
+    """
+    Write the rolling sampler's window (PROFILE_ROLLING=true) to a folded-stack file.
+
+    Returns:
+        {file, samples}
+    """
+    denied = _denied(req)
+    if denied:
+        return denied
+    dumped = await asyncio.to_thread(profiling.dump_rolling)
+    if dumped is None:
+        return JSONResponse({"error": "Rolling profiler is not running (set PROFILE_ROLLING=true)"}, status_code=409)
+    path, samples = dumped
+    return {"file": path, "samples": samples}
+
+
+@router.get("/metrics")
+async def get_metrics(req: Request):
+    """
+    Counters and gauges (admission, dispatcher, caches, jobs) for internal scraping.
+
+    Returns:
+        {counters, gauges}; 404 when PROFILE_TOKEN is unset, 403 without a valid X-Profile-Token
+    """
+    denied = _denied(req)
+    if denied:
+        return denied
+    return metrics.snapshot()
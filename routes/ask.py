@@ -3,38 +3,57 @@
 """
 from fastapi import APIRouter, Request
 from fastapi.responses import StreamingResponse
+import asyncio
 import logging
 import json
-import traceback
+from contextlib import aclosing
 
 # Updated imports to use new modular structure
 from services.conversation import build_context
 from services.embeddings import embed_and_search
 from services.llm import stream_final_response
+from services import answer_cache, cache_warmer
+from services.singleflight import ask_flights, answer_key
+from config import SINGLE_FLIGHT_ENABLED, ASK_DEADLINE_MS, DEGRADED_TOP_K
+from utils import deadline, traffic
+from utils.cancellation import DisconnectWatcher
+from utils.log import Lazy, Timer
 
 router = APIRouter()
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+logger = logging.getLogger(__name__)
+
+
+def _cached_answer_events(cached, budget):
+    """SSE events serving a cached answer (the ladder's last step) in place of a fresh one."""
+    budget.record("cached_answer")
+    return [
+        f"data: {json.dumps({'degraded': budget.degradations})}\n\n",
+        f"data: {json.dumps({'token': cached})}\n\n",
+        f"data: {json.dumps({'token': '[DONE]'})}\n\n",
+    ]
+
+
+def _deadline_exceeded_event(budget):
+    budget.record("deadline_exceeded")
+    return f"data: {json.dumps({'error': 'Request deadline exceeded', 'degraded': budget.degradations})}\n\n"
 
 
 @router.post("/ask")
 async def ask(req: Request):
     """
     Main endpoint for asking legal questions.
-    
+
     Request body:
         - query: User's question
         - id: Chat ID for conversation context
         - lang: Language code ('en' or 'pt')
         - country: Country filter for search
         - state: State filter for search
-    
+
     Returns:
         StreamingResponse with AI-generated legal answers
     """
-    logging.info("="*80)
-    logging.info("🛰️  NEW REQUEST TO /ask")
-    
     body = await req.json()
     query = body.get("query")
     chat_id = body.get("id")
@@ -42,89 +61,142 @@ async def ask(req: Request):
     country = body.get("country")
     state = body.get("state")
 
-    logging.info(f"📋 Request params:")
-    logging.info(f"   query: '{query}'")
-    logging.info(f"   chat_id: {chat_id}")
-    logging.info(f"   lang: {lang}")
-    logging.info(f"   country: {country}")
-    logging.info(f"   state: {state}")
+    logger.info(
+        "🛰️  /ask request",
+        extra={"chat_id": chat_id, "lang": lang, "country": country, "state": state, "query_chars": len(query or "")},
+    )
+
+    # Anonymized request shape for load replay (only when TRACE_RECORD_PATH is set)
+    trace = traffic.Trace("/ask")
+    trace.set(
+        query_chars=len(query or ""), query_words=len((query or "").split()), lang=lang,
+        country=country, state=state, chat=traffic.anonymize(chat_id),
+    )
+
+    # Cancels whichever step is running if the client goes away
+    watch = DisconnectWatcher(req, "/ask")
 
     async def event_stream():
+        timer = Timer()
+        # Budget until the first answer token; stages degrade along DEADLINE_LADDER when it runs short
+        budget = deadline.start(ASK_DEADLINE_MS, route="/ask")
+        chunks = []
+        retrieval_ms = None
+        token_count = 0
+        outcome = "cancelled"
         try:
-            # Step 1: Build conversation context
-            logging.info("="*60)
-            logging.info("STEP 1: Building conversation context")
-            logging.info("="*60)
+            # Step 1: Build conversation context (the summary is skipped if it would eat the budget)
+            watch.stage = "context"
             chat_context = await build_context(chat_id, lang)
-            logging.info(f"✅ Context built | type={type(chat_context)}")
-            logging.info(f"   - firstQuestion: {'Yes' if chat_context.get('firstQuestion') else 'No'}")
-            logging.info(f"   - userMessages: {len(chat_context.get('userMessages', []))}")
-            logging.info(f"   - aiMessages: {len(chat_context.get('aiMessages', []))}")
-            logging.info(f"   - summary: {'Yes' if chat_context.get('summary') else 'No'}")
+            trace.set(history=len(chat_context.get("userMessages") or []) + len(chat_context.get("aiMessages") or []))
+            cache_warmer.note(query, lang, country, state, chat_context)
 
             # Step 2: Search for relevant legal documents
-            logging.info("="*60)
-            logging.info("STEP 2: Searching for relevant documents")
-            logging.info("="*60)
-            chunks = await embed_and_search(query, chat_context, country, state)
-            
-            logging.info(f"✅ Search completed | type={type(chunks)}")
-            if isinstance(chunks, list):
-                logging.info(f"   Retrieved {len(chunks)} chunks")
-                for i, chunk in enumerate(chunks[:3]):  # Log first 3 chunks
-                    logging.debug(f"   Chunk {i+1}:")
-                    logging.debug(f"      - title: {chunk.get('title', 'N/A')}")
-                    logging.debug(f"      - chapter: {chunk.get('chapter', 'N/A')}")
-                    logging.debug(f"      - text preview: {str(chunk.get('text', ''))[:100]}...")
-            else:
-                logging.error(f"❌ embed_and_search returned invalid type: {type(chunks)}")
+            watch.stage = "retrieval"
+            top_k = DEGRADED_TOP_K if budget.should_degrade("reduce_top_k") else 8
+            try:
+                chunks = await asyncio.wait_for(
+                    embed_and_search(query, chat_context, country, state, chat_id, top_k),
+                    budget.allowance("cached_answer"),
+                )
+            except asyncio.TimeoutError:
+                chunks = None
+
+            if chunks is None or budget.below("cached_answer"):
+                cached = answer_cache.lookup(query, country, state, lang)
+                if cached is not None:
+                    outcome = "cached_answer"
+                    for event in _cached_answer_events(cached, budget):
+                        yield event
+                    return
+                if chunks is None:
+                    logger.warning("⏱️  Retrieval exceeded the deadline and no cached answer", extra={"chat_id": chat_id})
+                    outcome = "deadline_exceeded"
+                    yield _deadline_exceeded_event(budget)
+                    return
+
+            if not isinstance(chunks, list):
+                logger.error("❌ embed_and_search returned invalid type: %s", type(chunks).__name__)
+                outcome = "error"
                 yield f"data: {json.dumps({'error': 'Invalid chunks type returned from search'})}\n\n"
                 return
 
             if not chunks:
-                logging.warning("⚠️  No chunks returned from search")
-
-            # Step 3: Stream AI response
-            logging.info("="*60)
-            logging.info("STEP 3: Streaming AI response")
-            logging.info("="*60)
-            logging.info(f"🚀 Starting stream_final_response with {len(chunks)} chunks...")
-            
-            token_count = 0
-            async for token in stream_final_response(chunks, query, chat_context, lang):
-                token_count += 1
-                
-                if token_count <= 5 or token_count % 100 == 0:
-                    logging.debug(f"🪄 Token #{token_count}: '{token[:30]}...'")
-                
-                yield f"data: {json.dumps({'token': token})}\n\n"
-                
-                if token == "[DONE]":
-                    logging.info(f"✅ Stream finished cleanly | total_tokens={token_count}")
-                    break
-                
-                if token.startswith("[ERROR"):
-                    logging.error(f"❌ Error token received: {token}")
-                    break
-                    
-                if await req.is_disconnected():
-                    logging.warning("⚠️  Client disconnected mid-stream")
-                    break
-            
-            if token_count == 0:
-                logging.error("❌ NO TOKENS WERE YIELDED FROM stream_final_response!")
+                logger.warning("⚠️  No chunks returned from search")
+            logger.debug("📚 Top chunks: %s", Lazy(lambda: [c.get("title", "N/A") for c in chunks[:3]]))
+            retrieval_ms = timer.ms()
+
+            if budget.degradations:
+                yield f"data: {json.dumps({'degraded': budget.degradations})}\n\n"
+
+            # Step 3: Stream AI response (identical in-flight questions share one generation)
+            watch.stage = "generation"
+            if SINGLE_FLIGHT_ENABLED:
+                key = answer_key(query, country, state, lang, chunks, chat_context.get("summary"))
+                tokens = ask_flights.stream(key, lambda: stream_final_response(chunks, query, chat_context, lang))
             else:
-                logging.info(f"📊 Stream summary: {token_count} tokens yielded")
+                tokens = stream_final_response(chunks, query, chat_context, lang)
+
+            answer = []
+            async with aclosing(tokens):
+                # The first token must arrive within the budget when the ladder has a cached_answer step
+                first_token_timeout = budget.remaining_ms() / 1000 if "cached_answer" in budget.ladder else None
+                try:
+                    first = await asyncio.wait_for(anext(tokens, None), first_token_timeout)
+                except asyncio.TimeoutError:
+                    cached = answer_cache.lookup(query, country, state, lang)
+                    if cached is not None:
+                        outcome = "cached_answer"
+                        for event in _cached_answer_events(cached, budget):
+                            yield event
+                        return
+                    logger.warning("⏱️  No first token within the deadline", extra={"chat_id": chat_id})
+                    outcome = "deadline_exceeded"
+                    yield _deadline_exceeded_event(budget)
+                    return
+
+                if first is not None:
+                    trace.first_token()
+                outcome = "incomplete"
+                token = first
+                while token is not None:
+                    token_count += 1
+
+                    yield f"data: {json.dumps({'token': token})}\n\n"
+
+                    if token == "[DONE]":
+                        answer_cache.remember(query, country, state, lang, "".join(answer))
+                        outcome = "ok"
+                        break
+
+                    if token.startswith("[ERROR"):
+                        logger.error("❌ Error token received: %s", token)
+                        outcome = "error"
+                        break
+
+                    answer.append(token)
+                    token = await anext(tokens, None)
+
+            if token_count == 0:
+                logger.error("❌ NO TOKENS WERE YIELDED FROM stream_final_response!")
 
         except Exception as e:
-            err_trace = traceback.format_exc()
-            logging.error("="*60)
-            logging.error("💥 EXCEPTION IN /ask EVENT STREAM")
-            logging.error("="*60)
-            logging.error(f"Exception type: {type(e).__name__}")
-            logging.error(f"Exception message: {e}")
-            logging.error(f"Full traceback:\n{err_trace}")
+            logger.error("💥 Exception in /ask event stream: %s", e, exc_info=True)
+            outcome = "error"
             yield f"data: {json.dumps({'error': str(e)})}\n\n"
 
-    logging.info("📡 Returning StreamingResponse...")
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
\ No newline at end of file
+        finally:
+            logger.info(
+                "📊 /ask finished",
+                extra={
+                    "chat_id": chat_id,
+                    "chunks": len(chunks or []),
+                    "tokens": token_count,
+                    "retrieval_ms": retrieval_ms,
+                    "elapsed_ms": timer.ms(),
+                    "degraded": ",".join(budget.degradations) or None,
+                },
+            )
+            trace.finish(outcome, chunks=len(chunks or []), tokens=token_count, degraded=budget.degradations or None)
+
+    return StreamingResponse(watch.stream(event_stream()), media_type="text/event-stream")
@@ -0,0 +1,155 @@
+"""
+/ask-batch endpoint - Many questions per request for firm and API-platform clients
+"""
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
+import logging
+import json
+from contextlib import aclosing
+
+from services.llm import stream_final_response
+from services.llm_dispatcher import PRIORITY_BATCH
+from utils.encoder import encode_queries
+from utils.pinecode import search_legal_docs
+from config import BATCH_MAX_QUESTIONS, BATCH_MAX_PARALLEL
+from utils.cancellation import DisconnectWatcher
+from utils.log import Timer
+
+router = APIRouter()
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_questions(body):
+    """
+    Validate the request body.
+
+    Returns:
+        (questions, max_parallel, error) - error is a message when the body is invalid
+    """
+    questions = body.get("questions")
+    if not isinstance(questions, list) or not questions:
+        return None, None, "'questions' must be a non-empty list"
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        return None, None, f"At most {BATCH_MAX_QUESTIONS} questions per batch"
+
+    parsed = []
+    for position, item in enumerate(questions):
+        if not isinstance(item, dict) or not isinstance(item.get("query"), str) or not item["query"].strip():
+            return None, None, f"Question {position} has no 'query'"
+        parsed.append({
+            "id": item.get("id", position),
+            "query": item["query"],
+            "lang": item.get("lang") or "en",
+            "country": item.get("country"),
+            "state": item.get("state"),
+        })
+
+    try:
+        max_parallel = int(body.get("max_parallel") or BATCH_MAX_PARALLEL)
+    except (TypeError, ValueError):
+        return None, None, "'max_parallel' must be an integer"
+    return parsed, max(1, min(max_parallel, BATCH_MAX_PARALLEL)), None
+
+
+async def _answer(question, vector, semaphore):
+    """Retrieve and generate one answer; failures are reported in the result, not raised."""
+    timer = Timer()
+    result = {"id": question["id"]}
+    try:
+        chunks = await asyncio.to_thread(
+            search_legal_docs,
+            question["query"],
+            country=question["country"],
+            state=question["state"],
+            query_vector=vector,
+        )
+        result["chunks"] = [
+            {"id": c.id, "title": c.title, "url": c.url, "score": round(c.score, 4)} for c in chunks
+        ]
+
+        parts = []
+        async with semaphore:
+            tokens = stream_final_response(chunks, question["query"], {}, question["lang"], priority=PRIORITY_BATCH)
+            async with aclosing(tokens):
+                async for token in tokens:
+                    if token == "[DONE]":
+                        break
+                    if token.startswith("[ERROR"):
+                        result["error"] = token
+                        break
+                    parts.append(token)
+        result["answer"] = "".join(parts)
+    except Exception as e:
+        logger.error("💥 Batch question %s failed: %s", question["id"], e, exc_info=True)
+        result["error"] = str(e)
+    result["elapsed_ms"] = timer.ms()
+    return result
+
+
+@router.post("/ask-batch")
+async def ask_batch(req: Request):
+    """
+    Answer many legal questions in one request.
+
+    Request body:
+        - questions: List of {id, query, lang, country, state}
+        - max_parallel: Optional cap on concurrent answers (<= BATCH_MAX_PARALLEL)
+
+    All questions are embedded in one batched encode and retrieved
+    concurrently; answers are generated under bounded parallelism at batch
+    priority, so interactive /ask traffic is served first.
+
+    Returns:
+        StreamingResponse of NDJSON, one line per question as it completes
+        ({id, answer, chunks, elapsed_ms[, error]}), then a {"done": true} summary line
+    """
+    try:
+        body = await req.json()
+    except ValueError:
+        return JSONResponse({"error": "Body must be JSON"}, status_code=400)
+    questions, max_parallel, error = _parse_questions(body if isinstance(body, dict) else {})
+    if error:
+        return JSONResponse({"error": error}, status_code=400)
+
+    logger.info("🛰️  /ask-batch request", extra={"questions": len(questions), "max_parallel": max_parallel})
+
+    # Cancels every pending question if the client goes away
+    watch = DisconnectWatcher(req, "/ask-batch")
+
+    async def result_stream():
+        timer = Timer()
+        tasks = []
+        completed = failed = 0
+        try:
+            watch.stage = "embedding"
+            vectors = await asyncio.to_thread(encode_queries, [q["query"] for q in questions])
+            semaphore = asyncio.Semaphore(max_parallel)
+            tasks = [
+                asyncio.create_task(_answer(q, v.tolist(), semaphore))
+                for q, v in zip(questions, vectors)
+            ]
+            watch.stage = "questions"
+
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
+                completed += 1
+                failed += "error" in result
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+
+            yield json.dumps({"done": True, "completed": completed, "failed": failed, "elapsed_ms": timer.ms()}) + "\n"
+        except Exception as e:
+            logger.error("💥 Exception in /ask-batch stream: %s", e, exc_info=True)
+            yield json.dumps({"error": str(e)}) + "\n"
+        finally:
+            # Disconnects and errors must not leave generations running
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.info(
+                "📊 /ask-batch finished",
+                extra={"questions": len(questions), "completed": completed, "failed": failed, "elapsed_ms": timer.ms()},
+            )
+
+    return StreamingResponse(watch.stream(result_stream()), media_type="application/x-ndjson")
@@ -0,0 +1,154 @@
+"""
+/documents endpoints - Ask-my-document sessions over uploaded files
+"""
+from fastapi import APIRouter, Request, UploadFile, File
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
+import logging
+import json
+from contextlib import aclosing
+
+from services.conversation import build_context
+from services.doc_sessions import sessions, DocumentTooLarge
+from services.extract import extract_clean_in_pool
+from services.llm import stream_final_response
+from config import DOC_SESSION_TOP_K, DOC_SESSION_MAX_TOP_K
+from utils.cancellation import DisconnectWatcher
+from utils.log import Timer
+
+router = APIRouter()
+
+logger = logging.getLogger(__name__)
+
+
+@router.post("/documents")
+async def create_document_session(file: UploadFile = File(...)):
+    """
+    Index an uploaded document for follow-up questions.
+
+    The file is extracted, split into passages and batch-embedded once into
+    an in-memory session that expires after DOC_SESSION_TTL seconds idle.
+
+    Returns:
+        {session_id, filename, passages, bytes, expires_in}
+    """
+    timer = Timer()
+    try:
+        content = await file.read()
+        _, cleaned = await extract_clean_in_pool(content, file.filename)
+    except Exception as e:
+        logger.error("❌ Error reading file %s: %s", file.filename, e, exc_info=True)
+        return JSONResponse({"error": "Failed to read file"}, status_code=400)
+
+    if not cleaned.strip():
+        return JSONResponse({"error": "Empty file"}, status_code=400)
+
+    try:
+        session = await asyncio.to_thread(sessions.create, file.filename, cleaned)
+    except DocumentTooLarge as e:
+        return JSONResponse({"error": str(e)}, status_code=413)
+
+    logger.info(
+        "📄 Document session created",
+        extra={"session_id": session.id, "file": file.filename, "passages": len(session.passages), "elapsed_ms": timer.ms()},
+    )
+    return session.describe()
+
+
+@router.get("/documents/{session_id}")
+async def get_document_session(session_id: str):
+    session = sessions.get(session_id)
+    if session is None:
+        return JSONResponse({"error": "Session not found or expired"}, status_code=404)
+    return session.describe()
+
+
+@router.delete("/documents/{session_id}")
+async def delete_document_session(session_id: str):
+    if not sessions.drop(session_id):
+        return JSONResponse({"error": "Session not found or expired"}, status_code=404)
+    return {"deleted": session_id}
+
+
+@router.post("/documents/{session_id}/ask")
+async def ask_document(session_id: str, req: Request):
+    """
+    Ask a question about an uploaded document.
+
+    Request body:
+        - query: User's question
+        - id: Optional chat ID for conversation context
+        - lang: Language code ('en' or 'pt')
+        - top_k: Optional number of passages to retrieve (capped at DOC_SESSION_MAX_TOP_K)
+
+    Returns:
+        StreamingResponse with the answer, in the same SSE format as /ask
+    """
+    try:
+        body = await req.json()
+    except ValueError:
+        return JSONResponse({"error": "Body must be JSON"}, status_code=400)
+    if not isinstance(body, dict):
+        return JSONResponse({"error": "Body must be a JSON object"}, status_code=400)
+    query = body.get("query")
+    chat_id = body.get("id")
+    lang = body.get("lang") or "en"
+    top_k = body.get("top_k")
+    if top_k is None:
+        top_k = DOC_SESSION_TOP_K
+    else:
+        try:
+            top_k = int(top_k) if not isinstance(top_k, (bool, float)) else None
+        except (TypeError, ValueError):
+            top_k = None
+        if top_k is None or top_k < 1:
+            return JSONResponse({"error": "'top_k' must be a positive integer"}, status_code=400)
+        top_k = min(top_k, DOC_SESSION_MAX_TOP_K)
+
+    if not query:
+        return JSONResponse({"error": "'query' is required"}, status_code=400)
+    session = sessions.get(session_id)
+    if session is None:
+        return JSONResponse({"error": "Session not found or expired"}, status_code=404)
+
+    logger.info("🛰️  /documents ask request", extra={"session_id": session_id, "chat_id": chat_id, "lang": lang})
+
+    watch = DisconnectWatcher(req, "/documents/ask")
+
+    async def event_stream():
+        timer = Timer()
+        try:
+            watch.stage = "context"
+            chat_context = await build_context(chat_id, lang) if chat_id else {}
+            watch.stage = "retrieval"
+            chunks = await asyncio.to_thread(sessions.search, session, query, top_k)
+            retrieval_ms = timer.ms()
+            watch.stage = "generation"
+
+            token_count = 0
+            tokens = stream_final_response(chunks, query, chat_context, lang)
+            async with aclosing(tokens):
+                async for token in tokens:
+                    token_count += 1
+
+                    yield f"data: {json.dumps({'token': token})}\n\n"
+
+                    if token == "[DONE]" or token.startswith("[ERROR"):
+                        break
+
+            logger.info(
+                "📊 /documents ask finished",
+                extra={
+                    "session_id": session_id,
+                    "passages": len(chunks),
+                    "tokens": token_count,
+                    "retrieval_ms": retrieval_ms,
+                    "elapsed_ms": timer.ms(),
+                },
+            )
+
+        except Exception as e:
+            logger.error("💥 Exception in /documents ask stream: %s", e, exc_info=True)
+            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+
+    return StreamingResponse(watch.stream(event_stream()), media_type="text/event-stream")
@@ -1,13 +1,16 @@
 from fastapi import APIRouter, Request, UploadFile, File, Form
 from fastapi.responses import StreamingResponse
-import logging, json, traceback
+import logging, json, os
 
-from services.extract import extract_text_from_file_bytes, clean_text
+from services.extract import extract_clean_in_pool
 from services.llm import stream_summary_dual
+from utils import traffic
+from utils.cancellation import DisconnectWatcher
+from utils.log import Timer
 
 router = APIRouter()
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+logger = logging.getLogger(__name__)
 
 
 @router.post("/summarize-file")
@@ -16,53 +19,68 @@ async def summarize_file(
     file: UploadFile = File(...),
     lang: str = Form(...),
 ):
-    logging.info(f"📥 Received summarize request - File: {file.filename}, Language: {lang}")
-    
     # Read file content BEFORE entering the generator
     # This ensures the file is read while still open
     try:
-        logging.info(f"📖 Reading file: {file.filename}")
         file_content = await file.read()
-        file_size = len(file_content)
         filename = file.filename
-        logging.info(f"✅ File read successfully - Size: {file_size} bytes ({file_size / 1024:.2f} KB)")
-    except Exception as e:
-        logging.error(f"❌ Error reading file: {traceback.format_exc()}")
+    except Exception:
+        logger.error("❌ Error reading file %s", file.filename, exc_info=True)
         async def error_stream():
             yield "data: " + json.dumps({"error": "Failed to read file"}) + "\n\n"
         return StreamingResponse(error_stream(), media_type="text/event-stream")
-    
+
+    logger.info("📥 /summarize-file request", extra={"file": filename, "bytes": len(file_content), "lang": lang})
+
+    # Anonymized request shape for load replay (only when TRACE_RECORD_PATH is set)
+    trace = traffic.Trace("/summarize-file")
+    trace.set(lang=lang, ext=os.path.splitext(filename or "")[1].lower(), bytes=len(file_content))
+
+    # Cancels extraction or the summary stream if the client goes away
+    watch = DisconnectWatcher(request, "/summarize-file")
+
     async def event_stream():
+        timer = Timer()
+        token_count = 0
+        outcome = "cancelled"
         try:
-            logging.info(f"🔍 Extracting text from {filename}")
-            raw = await extract_text_from_file_bytes(file_content, filename)
-            text_length = len(raw)
-            logging.info(f"📝 Text extracted - Length: {text_length} characters")
-            
-            logging.info("🧹 Cleaning extracted text")
-            cleaned = clean_text(raw)
-            cleaned_length = len(cleaned)
-            logging.info(f"✨ Text cleaned - Length: {cleaned_length} characters (reduced by {text_length - cleaned_length})")
+            watch.stage = "extraction"
+            raw_chars, cleaned = await extract_clean_in_pool(file_content, filename)
+            extract_ms = timer.ms()
+            trace.set(raw_chars=raw_chars, clean_chars=len(cleaned), extract_ms=extract_ms)
 
             if not cleaned.strip():
-                logging.warning("⚠️ File is empty after cleaning")
+                logger.warning("⚠️ File is empty after cleaning", extra={"file": filename})
+                outcome = "empty"
                 yield "data: " + json.dumps({"error": "Empty file"}) + "\n\n"
                 return
 
-            logging.info(f"🤖 Starting AI summarization in language: {lang}")
-            token_count = 0
-            
+            watch.stage = "generation"
             async for token in  stream_summary_dual(cleaned, lang):
-                if await request.is_disconnected():
-                    logging.warning("⚠️ Client disconnected during streaming")
-                    break
+                if not token_count:
+                    trace.first_token()
                 token_count += 1
                 yield token
-            
-            logging.info(f"✅ Summarization complete - Streamed {token_count} tokens")
+            outcome = "ok"
+
+            logger.info(
+                "✅ Summarization complete",
+                extra={
+                    "file": filename,
+                    "raw_chars": raw_chars,
+                    "clean_chars": len(cleaned),
+                    "tokens": token_count,
+                    "extract_ms": extract_ms,
+                    "elapsed_ms": timer.ms(),
+                },
+            )
 
         except Exception as e:
-            logging.error(f"❌ Error during summarization: {traceback.format_exc()}")
+            logger.error("❌ Error during summarization: %s", e, exc_info=True)
+            outcome = "error"
             yield "data: " + json.dumps({"error": str(e)}) + "\n\n"
 
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
\ No newline at end of file
+        finally:
+            trace.finish(outcome, tokens=token_count)
+
+    return StreamingResponse(watch.stream(event_stream()), media_type="text/event-stream")
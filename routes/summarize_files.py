@@ -0,0 +1,168 @@
+"""
+/summarize-files endpoint - Summarize a whole folder of uploads in one request
+"""
+from typing import List
+
+from fastapi import APIRouter, Request, UploadFile, File, Form
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
+import logging
+import json
+
+from services.extract import extract_clean_in_pool
+from services.llm import stream_summary_dual
+from services.tenants import TenantLimiter, tenant_id
+from config import SUMMARY_TENANT_CONCURRENCY, MULTI_FILE_MAX_FILES
+from utils.cancellation import DisconnectWatcher
+from utils.log import Timer
+from utils.metrics import register_gauge
+
+router = APIRouter()
+
+logger = logging.getLogger(__name__)
+
+# Shared by all requests, so one tenant's folders can't take every LLM slot
+summary_limiter = TenantLimiter("summarize", SUMMARY_TENANT_CONCURRENCY)
+register_gauge("summary_tenants", summary_limiter.stats)
+
+_DONE = object()
+
+
+def _event(payload):
+    return "data: " + json.dumps(payload, ensure_ascii=False) + "\n\n"
+
+
+async def _summarize_one(file_id, filename, content, lang, tenant, emit):
+    """
+    Extract and summarize one file, reporting progress through `emit`.
+
+    Returns:
+        True when the summary completed
+    """
+    timer = Timer()
+    try:
+        await emit({"file": file_id, "status": "extracting"})
+        raw_chars, cleaned = await extract_clean_in_pool(content, filename)
+        extract_ms = timer.ms()
+
+        if not cleaned.strip():
+            logger.warning("⚠️ File is empty after cleaning", extra={"file": filename})
+            await emit({"file": file_id, "error": "Empty file"})
+            return False
+
+        await emit({"file": file_id, "status": "queued", "clean_chars": len(cleaned), "extract_ms": extract_ms})
+
+        ok = False
+        token_count = 0
+        async with summary_limiter.slot(tenant):
+            await emit({"file": file_id, "status": "summarizing"})
+            async for event in stream_summary_dual(cleaned, lang, file_id=file_id):
+                token_count += 1
+                await emit(event)
+                ok = '"[DONE]"' in event
+
+        logger.info(
+            "✅ Summarization complete",
+            extra={
+                "file": filename,
+                "raw_chars": raw_chars,
+                "clean_chars": len(cleaned),
+                "tokens": token_count,
+                "extract_ms": extract_ms,
+                "elapsed_ms": timer.ms(),
+            },
+        )
+        await emit({"file": file_id, "status": "done" if ok else "failed", "elapsed_ms": timer.ms()})
+        return ok
+
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error("❌ Error summarizing %s: %s", filename, e, exc_info=True)
+        await emit({"file": file_id, "error": str(e)})
+        return False
+
+
+@router.post("/summarize-files")
+async def summarize_files(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    lang: str = Form(...),
+):
+    """
+    Summarize several documents concurrently in one SSE stream.
+
+    Files are extracted in parallel on the extraction process pool and
+    summarized with at most SUMMARY_TENANT_CONCURRENCY documents in flight per
+    tenant (services.tenants.tenant_id). Every event carries the file's "file" id (its
+    position in the upload), so clients can demultiplex the interleaved
+    progress events ({"status": ...}), summary tokens and per-file errors.
+    A final {"done": true, ...} event closes the stream.
+    """
+    if len(files) > MULTI_FILE_MAX_FILES:
+        return JSONResponse({"error": f"At most {MULTI_FILE_MAX_FILES} files per request"}, status_code=400)
+
+    # Read every upload BEFORE entering the generator, while the files are still open
+    uploads = []
+    for file_id, file in enumerate(files):
+        try:
+            uploads.append((file_id, file.filename, await file.read()))
+        except Exception:
+            logger.error("❌ Error reading file %s", file.filename, exc_info=True)
+            uploads.append((file_id, file.filename, None))
+
+    tenant = tenant_id(request)
+    logger.info(
+        "📥 /summarize-files request",
+        extra={"tenant": tenant, "files": len(uploads), "bytes": sum(len(c or b"") for _, _, c in uploads), "lang": lang},
+    )
+
+    # Cancels every file's extraction and summary if the client goes away
+    watch = DisconnectWatcher(request, "/summarize-files")
+
+    async def event_stream():
+        timer = Timer()
+        events = asyncio.Queue(maxsize=256)
+        tasks = []
+        succeeded = 0
+
+        async def run(file_id, filename, content):
+            if content is None:
+                await events.put({"file": file_id, "error": "Failed to read file"})
+                ok = False
+            else:
+                ok = await _summarize_one(file_id, filename, content, lang, tenant, events.put)
+            await events.put(_DONE)
+            return ok
+
+        try:
+            for file_id, filename, content in uploads:
+                yield _event({"file": file_id, "filename": filename, "status": "received"})
+            tasks = [asyncio.create_task(run(*upload)) for upload in uploads]
+            watch.stage = "files"
+
+            remaining = len(tasks)
+            while remaining:
+                event = await events.get()
+                if event is _DONE:
+                    remaining -= 1
+                    continue
+                yield event if isinstance(event, str) else _event(event)
+
+            succeeded = sum(task.result() for task in tasks)
+            yield _event({"done": True, "files": len(tasks), "failed": len(tasks) - succeeded, "elapsed_ms": timer.ms()})
+
+        except Exception as e:
+            logger.error("❌ Error during multi-file summarization: %s", e, exc_info=True)
+            yield _event({"error": str(e)})
+        finally:
+            # Stop generations for files the client will never read, and wait for their upstreams to close
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.info(
+                "📊 /summarize-files finished",
+                extra={"tenant": tenant, "files": len(uploads), "succeeded": succeeded, "elapsed_ms": timer.ms()},
+            )
+
+    return StreamingResponse(watch.stream(event_stream()), media_type="text/event-stream")
@@ -0,0 +1,108 @@
+"""
+/summarize-file/jobs endpoints - Background summaries that survive dropped connections
+"""
+from fastapi import APIRouter, Request, UploadFile, File, Form
+from fastapi.responses import JSONResponse, StreamingResponse
+import logging
+
+from services.summary_jobs import jobs, JobRejected
+from services.tenants import tenant_id
+from utils.cancellation import DisconnectWatcher
+
+router = APIRouter()
+
+logger = logging.getLogger(__name__)
+
+
+def _not_found():
+    return JSONResponse({"error": "Job not found or expired"}, status_code=404)
+
+
+@router.post("/summarize-file/jobs")
+async def submit_summary_job(
+    request: Request,
+    file: UploadFile = File(...),
+    lang: str = Form(...),
+):
+    """
+    Queue a document for summarization and return at once.
+
+    Returns:
+        202 with {job_id, status, status_url, events_url}; 503 when the queue
+        is full or 429 when the tenant has too many unfinished jobs, both with
+        Retry-After
+    """
+    try:
+        content = await file.read()
+    except Exception:
+        logger.error("❌ Error reading file %s", file.filename, exc_info=True)
+        return JSONResponse({"error": "Failed to read file"}, status_code=400)
+
+    try:
+        job = await jobs.submit(tenant_id(request), file.filename, content, lang)
+    except JobRejected as e:
+        return JSONResponse({"error": e.reason}, status_code=e.status, headers={"Retry-After": str(e.retry_after)})
+
+    return JSONResponse(
+        {
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/summarize-file/jobs/{job.id}",
+            "events_url": f"/summarize-file/jobs/{job.id}/events",
+        },
+        status_code=202,
+    )
+
+
+@router.get("/summarize-file/jobs/{job_id}")
+async def get_summary_job(job_id: str):
+    """
+    Poll a job.
+
+    Returns:
+        {job_id, filename, lang, status, created, finished, error, summary}
+        with the summary text produced so far
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return _not_found()
+    meta = job.meta()
+    meta.pop("tenant")
+    meta["summary"] = await jobs.summary(job)
+    return meta
+
+
+@router.get("/summarize-file/jobs/{job_id}/events")
+async def stream_summary_job(job_id: str, request: Request, offset: int = 0):
+    """
+    Follow a job's events as SSE, starting at `offset` (or after the
+    Last-Event-ID header when reconnecting).
+
+    Events are those of /summarize-file plus {"status": ...} progress events,
+    each with an "id:" line holding its offset. The stream ends after the
+    final {"status": "done" | "failed" | "cancelled" | "interrupted"} event.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return _not_found()
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        offset = max(offset, int(last_event_id) + 1)
+
+    # Only stops this follower; the job keeps running without it
+    watch = DisconnectWatcher(request, "/summarize-file/jobs/events")
+    watch.stage = "follow"
+
+    async def event_stream():
+        async for index, data in jobs.events(job, max(0, offset)):
+            yield f"id: {index}\ndata: {data}\n\n"
+
+    return StreamingResponse(watch.stream(event_stream()), media_type="text/event-stream")
+
+
+@router.delete("/summarize-file/jobs/{job_id}")
+async def delete_summary_job(job_id: str):
+    """Cancel an unfinished job, or delete a finished one and its result."""
+    if not await jobs.cancel(job_id):
+        return _not_found()
+    return {"deleted": job_id}
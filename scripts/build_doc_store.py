@@ -0,0 +1,47 @@
+"""
+Build the local chunk store (utils/doc_store.py) from the Pinecone index.
+
+Every vector's metadata is fetched once, normalized the same way retrieval
+normalizes it (utils.chunk_processing.normalize_chunk) and written to a
+memory-mappable file. Point DOC_STORE_PATH at the result.
+
+Usage:
+    python -m scripts.build_doc_store --out data/chunks.vds
+    python -m scripts.build_doc_store --out data/chunks.vds --ids-file ids.txt
+"""
+import argparse
+import logging
+
+from utils.doc_store import STORE_FIELDS, write_store
+from scripts.partition_index import iter_id_batches
+
+logger = logging.getLogger(__name__)
+
+
+def iter_records(idx, batch_size, ids_file=None):
+    from utils.chunk_processing import normalize_chunk
+
+    for ids in iter_id_batches(idx, batch_size, ids_file):
+        fetched = idx.fetch(ids=ids).vectors
+        for vector_id, vector in fetched.items():
+            record = normalize_chunk({"id": vector_id, "metadata": vector.metadata or {}})
+            yield vector_id, {field: getattr(record, field) for field in STORE_FIELDS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the local memory-mapped chunk store")
+    parser.add_argument("--out", required=True, help="Output file (set DOC_STORE_PATH to it)")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--ids-file", help="Newline-separated vector ids (for indexes without list())")
+    args = parser.parse_args()
+
+    from utils.log import setup_logging
+    from utils.pinecode import index
+
+    setup_logging()
+    count = write_store(args.out, iter_records(index, args.batch_size, args.ids_file))
+    print(f"wrote {count} chunks to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Copy vectors from the default namespace into one namespace per jurisdiction.
+
+Needed before switching INDEX_LAYOUT to "namespaces". Each vector goes to
+namespace_for(metadata["state"]); the default namespace is left untouched so
+the "filter" layout keeps working until the switch.
+
+Usage:
+    python -m scripts.partition_index --dry-run
+    python -m scripts.partition_index --batch-size 100
+    python -m scripts.partition_index --ids-file ids.txt   # pod indexes without list()
+"""
+import argparse
+import logging
+from collections import Counter
+
+from utils.jurisdiction import namespace_for
+
+logger = logging.getLogger(__name__)
+
+
+def iter_id_batches(idx, batch_size, ids_file=None):
+    if ids_file:
+        with open(ids_file, encoding="utf-8") as fh:
+            ids = [line.strip() for line in fh if line.strip()]
+        for start in range(0, len(ids), batch_size):
+            yield ids[start:start + batch_size]
+        return
+    # Serverless indexes page through ids with list()
+    for page in idx.list(namespace="", limit=batch_size):
+        # Older clients yield id strings, newer ones ListItem objects
+        yield [getattr(item, "id", item) for item in page]
+
+
+def partition(idx, batch_size=100, ids_file=None, dry_run=False):
+    """
+    Copy every vector into its jurisdiction namespace.
+
+    Returns:
+        Counter of vectors per target namespace
+    """
+    counts = Counter()
+    for ids in iter_id_batches(idx, batch_size, ids_file):
+        fetched = idx.fetch(ids=ids).vectors
+        by_namespace = {}
+        for vector_id, vector in fetched.items():
+            metadata = vector.metadata or {}
+            state = metadata.get("state")
+            if not state:
+                logger.warning("⚠️  Vector %s has no state metadata, skipped", vector_id)
+                continue
+            by_namespace.setdefault(namespace_for(state), []).append(
+                {"id": vector_id, "values": vector.values, "metadata": metadata}
+            )
+        for namespace, vectors in by_namespace.items():
+            counts[namespace] += len(vectors)
+            if not dry_run:
+                idx.upsert(vectors=vectors, namespace=namespace)
+        logger.info("📦 Partitioned batch", extra={"total": sum(counts.values())})
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Partition the legal index by jurisdiction namespace")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--ids-file", help="Newline-separated vector ids (for indexes without list())")
+    parser.add_argument("--dry-run", action="store_true", help="Only count vectors per namespace")
+    args = parser.parse_args()
+
+    from utils.log import setup_logging
+    from utils.pinecode import index
+
+    setup_logging()
+    counts = partition(index, args.batch_size, args.ids_file, args.dry_run)
+    for namespace, count in sorted(counts.items()):
+        print(f"{namespace:<30}{count:>8}")
+
+
+if __name__ == "__main__":
+    main()
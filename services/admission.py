@@ -0,0 +1,303 @@
+"""
+Inbound admission control and load shedding for streaming routes.
+
+Each streaming request holds memory, an OpenAI connection and CPU for
+embedding until it finishes, so admitting everything during a spike just
+makes every stream slow. Every route in ADMISSION_LIMITS (a path or a
+template like /documents/{session_id}/ask) gets a controller:
+
+- At most `limit` streams run at once, and one tenant may hold at most
+  ADMISSION_TENANT_SHARE of them.
+- Requests over the limit wait in a FIFO queue for up to
+  ADMISSION_QUEUE_TIMEOUT seconds. When the queue is full or the wait runs
+  out, they get 503 (route saturated) or 429 (tenant over its share) with a
+  Retry-After header.
+- Routes with a target in ADMISSION_TARGET_TTFT_MS adapt `limit` (AIMD).
+  Each stream's time to first byte is measured from admission, so queueing
+  is excluded. Meeting the target grows the limit by about one per
+  round-trip of streams. Missing it multiplies the limit by
+  ADMISSION_DECREASE, at most once per second.
+
+Admission happens in AdmissionMiddleware, around the whole response, so a
+slot is released when the stream ends however it ends. Outcomes are counted
+as admission{route=...,outcome=...} and limits are reported on /metrics.
+"""
+import asyncio
+import json
+import logging
+import math
+import re
+import time
+from collections import deque
+
+from starlette.requests import Request
+
+from config import (
+    ADMISSION_ENABLED,
+    ADMISSION_LIMITS,
+    ADMISSION_TARGET_TTFT_MS,
+    ADMISSION_MIN_LIMIT,
+    ADMISSION_DECREASE,
+    ADMISSION_TENANT_SHARE,
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_QUEUE_TIMEOUT,
+)
+from services.tenants import tenant_id
+from utils.metrics import inc, register_gauge
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRY_AFTER = 30
+
+
+class Rejected(Exception):
+    """Raised by admit() when a request is shed."""
+
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """An admitted stream; release() exactly once when it ends."""
+
+    __slots__ = ("controller", "tenant", "admitted_at", "_released")
+
+    def __init__(self, controller, tenant):
+        self.controller = controller
+        self.tenant = tenant
+        self.admitted_at = time.monotonic()
+        self._released = False
+
+    def first_byte(self):
+        """Report time to first byte (from admission) to the adaptive limit."""
+        self.controller.observe_ttft((time.monotonic() - self.admitted_at) * 1000)
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.controller._release(self)
+
+
+class AdmissionController:
+    """
+    Concurrency limit, per-tenant share and bounded wait queue for one route.
+
+    Args:
+        route: Route path, used for metrics and logs
+        max_limit: Most concurrent streams
+        target_ttft_ms: Adapt the limit to this time-to-first-byte; None keeps it fixed at max_limit
+        min_limit: Floor for the adaptive limit
+        tenant_share: Fraction of the current limit one tenant may hold
+        max_queue: Waiting requests before fast-failing
+        queue_timeout: Seconds a request may wait for a slot
+    """
+
+    def __init__(self, route, max_limit, target_ttft_ms=None, min_limit=ADMISSION_MIN_LIMIT,
+                 tenant_share=ADMISSION_TENANT_SHARE, max_queue=ADMISSION_MAX_QUEUE,
+                 queue_timeout=ADMISSION_QUEUE_TIMEOUT):
+        self.route = route
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.target_ttft_ms = target_ttft_ms
+        self.tenant_share = tenant_share
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._tenants = {}
+        self._waiters = deque()  # (tenant, future), FIFO
+        self._last_decrease = 0.0
+        self._hold_s = 1.0  # EWMA of how long a stream holds its slot, for Retry-After
+        self._ttft_ms = None  # EWMA of observed time to first byte
+
+    def _capacity(self):
+        return max(self.min_limit, math.floor(self.limit))
+
+    def _tenant_cap(self):
+        return max(1, math.floor(self._capacity() * self.tenant_share))
+
+    def _has_room(self, tenant):
+        return self.in_flight < self._capacity() and self._tenants.get(tenant, 0) < self._tenant_cap()
+
+    def _grant(self, tenant):
+        self.in_flight += 1
+        self._tenants[tenant] = self._tenants.get(tenant, 0) + 1
+        return Ticket(self, tenant)
+
+    def _retry_after(self):
+        """Seconds until a slot is likely free: the queue ahead drained at limit / hold time."""
+        waves = (len(self._waiters) + 1) / self._capacity()
+        return max(1, min(MAX_RETRY_AFTER, math.ceil(waves * self._hold_s)))
+
+    def _rejected(self, tenant, outcome):
+        over_share = self._tenants.get(tenant, 0) >= self._tenant_cap()
+        status, reason = (429, "Too many concurrent requests for this tenant") if over_share else (503, "Server is busy")
+        inc("admission", route=self.route, outcome=outcome)
+        logger.warning(
+            "🚦 Request shed",
+            extra={"route": self.route, "tenant": tenant, "outcome": outcome, "status": status,
+                   "in_flight": self.in_flight, "limit": self._capacity(), "queued": len(self._waiters)},
+        )
+        return Rejected(status, reason, self._retry_after())
+
+    async def admit(self, tenant):
+        """
+        Take a slot for `tenant`, waiting up to queue_timeout.
+
+        Returns:
+            Ticket to release when the stream ends
+
+        Raises:
+            Rejected: queue full, or no slot within queue_timeout
+        """
+        # Nobody may overtake the queue, so new arrivals only go straight in when it's empty
+        if not self._waiters and self._has_room(tenant):
+            inc("admission", route=self.route, outcome="admitted")
+            return self._grant(tenant)
+        if len(self._waiters) >= self.max_queue:
+            raise self._rejected(tenant, "queue_full")
+
+        waiter = (tenant, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        # Waiters ahead may all be tenants over their share; don't let them hold back one that fits
+        self._wake()
+        try:
+            ticket = await asyncio.wait_for(asyncio.shield(waiter[1]), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter[1].done():
+                # Granted just as the wait ran out
+                ticket = waiter[1].result()
+            else:
+                self._waiters.remove(waiter)
+                waiter[1].cancel()
+                raise self._rejected(tenant, "queue_timeout")
+        except asyncio.CancelledError:
+            if waiter[1].done() and not waiter[1].cancelled():
+                waiter[1].result().release()
+            else:
+                self._waiters.remove(waiter)
+                waiter[1].cancel()
+            raise
+        inc("admission", route=self.route, outcome="queued")
+        return ticket
+
+    def _wake(self):
+        """Hand free slots to the oldest waiters whose tenant is under its share."""
+        for waiter in list(self._waiters):
+            if self.in_flight >= self._capacity():
+                return
+            tenant, future = waiter
+            if self._tenants.get(tenant, 0) < self._tenant_cap():
+                self._waiters.remove(waiter)
+                future.set_result(self._grant(tenant))
+
+    def _release(self, ticket):
+        self.in_flight -= 1
+        self._tenants[ticket.tenant] -= 1
+        if not self._tenants[ticket.tenant]:
+            del self._tenants[ticket.tenant]
+        self._hold_s = 0.8 * self._hold_s + 0.2 * (time.monotonic() - ticket.admitted_at)
+        self._wake()
+
+    def observe_ttft(self, ttft_ms):
+        """AIMD: grow the limit while TTFT meets the target, cut it when it doesn't."""
+        self._ttft_ms = ttft_ms if self._ttft_ms is None else 0.8 * self._ttft_ms + 0.2 * ttft_ms
+        if self.target_ttft_ms is None:
+            return
+        if ttft_ms > self.target_ttft_ms:
+            now = time.monotonic()
+            # Streams admitted together miss together; one cut per second is enough
+            if now - self._last_decrease >= 1.0 and self.limit > self.min_limit:
+                self._last_decrease = now
+                previous = self._capacity()
+                self.limit = max(self.min_limit, self.limit * ADMISSION_DECREASE)
+                inc("admission_limit_decreased", route=self.route)
+                logger.warning(
+                    "📉 Admission limit lowered",
+                    extra={"route": self.route, "ttft_ms": round(ttft_ms), "from": previous, "to": self._capacity()},
+                )
+        elif self.limit < self.max_limit:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._wake()
+
+    def stats(self):
+        return {
+            "limit": self._capacity(),
+            "max_limit": self.max_limit,
+            "tenant_cap": self._tenant_cap(),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "tenants": len(self._tenants),
+            "ttft_ms": round(self._ttft_ms) if self._ttft_ms is not None else None,
+        }
+
+
+controllers = {
+    route: AdmissionController(route, limit, ADMISSION_TARGET_TTFT_MS.get(route))
+    for route, limit in ADMISSION_LIMITS.items()
+}
+register_gauge("admission", lambda: {route: c.stats() for route, c in controllers.items()})
+
+_templates = [
+    (re.compile("[^/]+".join(re.escape(part) for part in re.split(r"\{[^/]+\}", route)) + "$"), route)
+    for route in ADMISSION_LIMITS
+    if "{" in route
+]
+
+
+def controller_for(path):
+    """Controller for a request path (exact routes first, then templates), or None."""
+    controller = controllers.get(path)
+    if controller is None:
+        for pattern, route in _templates:
+            if pattern.match(path):
+                return controllers[route]
+    return controller
+
+
+async def _send_rejection(send, rejected):
+    body = json.dumps({"error": rejected.reason, "retry_after": rejected.retry_after}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": rejected.status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"retry-after", str(rejected.retry_after).encode("latin-1")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """ASGI middleware admitting POSTs to the routes in ADMISSION_LIMITS."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        controller = controller_for(scope["path"]) if scope["type"] == "http" and ADMISSION_ENABLED else None
+        if controller is None or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+
+        try:
+            ticket = await controller.admit(tenant_id(Request(scope)))
+        except Rejected as rejected:
+            return await _send_rejection(send, rejected)
+
+        first_byte = True
+
+        async def send_observed(message):
+            nonlocal first_byte
+            if first_byte and message["type"] == "http.response.body" and message.get("body"):
+                first_byte = False
+                ticket.first_byte()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_observed)
+        finally:
+            ticket.release()
@@ -0,0 +1,31 @@
+"""
+Recent completed /ask answers, served when a request runs out of budget.
+
+Keyed by the normalized question, jurisdiction and language only (not the
+conversation), so a hit is a degraded answer: used by the cached_answer
+step of the deadline ladder rather than as a general response cache.
+"""
+import hashlib
+
+from config import ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL
+from services.singleflight import normalize_query
+from utils.lru import LRUCache
+from utils.metrics import register_gauge
+
+_answers = LRUCache(ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL)
+register_gauge("answer_cache", _answers.stats)
+
+
+def question_key(query, country, state, lang):
+    parts = [normalize_query(query), str(country or ""), str(state or ""), str(lang or "")]
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def remember(query, country, state, lang, answer):
+    if answer:
+        _answers.put(question_key(query, country, state, lang), answer)
+
+
+def lookup(query, country, state, lang):
+    """Cached answer text, or None."""
+    return _answers.get(question_key(query, country, state, lang))
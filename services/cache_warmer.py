@@ -0,0 +1,190 @@
+"""
+Cache warm-up so the first users after a deploy don't pay cold-cache latency.
+
+Warmed questions come from WARMUP_SEED_PATH and from HOT_QUERIES_PATH. The
+hot-query file holds the first questions (asked without conversation
+context) that /ask counted in memory; it is saved periodically and at
+shutdown. The WARMUP_TOP_N most frequent questions per jurisdiction and
+language are then:
+
+- embedded in one batched pass (query embedding cache),
+- searched exactly as /ask searches a new chat's first question (retrieval
+  results cache, plus cross-encoder pair scores when reranking is on),
+- optionally formatted into [REFERENCE] blocks (reference cache).
+
+Searches are paced at WARMUP_QPS so warming never crowds out live traffic.
+Warming runs in the background at startup and every WARMUP_INTERVAL_S
+seconds when that is set. Answers are not pre-generated: they depend on the
+conversation and cost tokens.
+
+Hot-query tracking stores question text, so it is off unless
+HOT_QUERIES_PATH is set.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+
+from config import (
+    WARMUP_SEED_PATH,
+    HOT_QUERIES_PATH,
+    HOT_QUERIES_TRACKED,
+    WARMUP_TOP_N,
+    WARMUP_QPS,
+    WARMUP_INTERVAL_S,
+    WARMUP_REFERENCES,
+)
+from utils.chunk_processing import format_context_chunk
+from utils.encoder import context_text, encode_queries
+from utils.log import Timer
+from utils.metrics import inc, register_gauge
+from utils.pinecode import search_legal_docs
+
+logger = logging.getLogger(__name__)
+
+# What build_context returns for a chat without messages, so warmed results match /ask's first questions
+NEW_CHAT_CONTEXT = {"firstQuestion": None, "userMessages": [], "aiMessages": [], "summary": None}
+ASK_TOP_K = 8  # /ask's top_k without degradation
+
+_hot = {}  # (query, lang, country, state) -> count
+_last_run = {}
+_task = None
+
+
+def note(query, lang, country, state, chat_context):
+    """Count an /ask question toward the hot-query list (first questions only, and only when tracking is on)."""
+    if not HOT_QUERIES_PATH or not query or context_text(chat_context).strip():
+        return
+    key = (query, lang, country, state)
+    _hot[key] = _hot.get(key, 0) + 1
+    if len(_hot) > HOT_QUERIES_TRACKED:
+        # Decay instead of evicting one at a time: halve every count and drop the ones that reach zero
+        for k in list(_hot):
+            _hot[k] //= 2
+            if not _hot[k]:
+                del _hot[k]
+
+
+def _read_entries(path):
+    entries = []
+    if not path or not os.path.exists(path):
+        return entries
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning("⚠️  Skipping malformed warm-up line in %s", path)
+                    continue
+                if entry.get("query"):
+                    entries.append(entry)
+    return entries
+
+
+def load_hot_queries():
+    """Merge the saved hot-query counts into the in-memory tracker."""
+    for entry in _read_entries(HOT_QUERIES_PATH):
+        key = (entry["query"], entry.get("lang"), entry.get("country"), entry.get("state"))
+        _hot[key] = _hot.get(key, 0) + int(entry.get("count") or 1)
+
+
+def save_hot_queries(counts=None):
+    """Write the tracked counts (most frequent first) atomically; pass a copy when calling off the event loop."""
+    if not HOT_QUERIES_PATH:
+        return
+    ranked = sorted((_hot if counts is None else counts).items(), key=lambda kv: kv[1], reverse=True)
+    os.makedirs(os.path.dirname(os.path.abspath(HOT_QUERIES_PATH)), exist_ok=True)
+    tmp_path = f"{HOT_QUERIES_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        for (query, lang, country, state), count in ranked:
+            fh.write(json.dumps({"query": query, "lang": lang, "country": country, "state": state, "count": count},
+                                ensure_ascii=False) + "\n")
+    os.replace(tmp_path, HOT_QUERIES_PATH)
+
+
+def select_queries(top_n=WARMUP_TOP_N):
+    """Seed and hot questions, the `top_n` most frequent per jurisdiction and language."""
+    counts = dict(_hot)
+    for entry in _read_entries(WARMUP_SEED_PATH):
+        key = (entry["query"], entry.get("lang"), entry.get("country"), entry.get("state"))
+        counts[key] = counts.get(key, 0) + int(entry.get("count") or 1)
+
+    groups = {}
+    for key, count in counts.items():
+        groups.setdefault(key[1:], []).append((count, key))
+    selected = []
+    for ranked in groups.values():
+        ranked.sort(key=lambda item: item[0], reverse=True)
+        selected.extend(key for _, key in ranked[:top_n])
+    return selected
+
+
+async def warm(queries):
+    """
+    Fill the embedding, retrieval and reference caches for `queries`.
+
+    Args:
+        queries: (query, lang, country, state) tuples
+
+    Returns:
+        Run summary dict
+    """
+    timer = Timer()
+    vectors = await asyncio.to_thread(encode_queries, [q[0] for q in queries]) if queries else []
+    interval = 1 / WARMUP_QPS if WARMUP_QPS > 0 else 0
+    chunks_warmed = 0
+    for (query, lang, country, state), vector in zip(queries, vectors):
+        started = time.monotonic()
+        chunks = await asyncio.to_thread(
+            search_legal_docs, query, top_k=ASK_TOP_K, context=NEW_CHAT_CONTEXT, country=country, state=state,
+            query_vector=vector.tolist(), refresh_cache=True,
+        )
+        if WARMUP_REFERENCES:
+            for i, chunk in enumerate(chunks):
+                format_context_chunk(chunk, i)
+        chunks_warmed += len(chunks)
+        inc("cache_warmup_queries")
+        await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    summary = {"queries": len(queries), "chunks": chunks_warmed, "elapsed_ms": timer.ms(), "at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    logger.info("🔥 Caches warmed", extra={k: v for k, v in summary.items() if k != "at"})
+    return summary
+
+
+async def _run():
+    while True:
+        try:
+            _last_run.update(await warm(select_queries()))
+        except Exception as e:
+            logger.error("❌ Cache warm-up failed: %s", e, exc_info=True)
+        if not WARMUP_INTERVAL_S:
+            return
+        await asyncio.sleep(WARMUP_INTERVAL_S)
+        try:
+            await asyncio.to_thread(save_hot_queries, dict(_hot))
+        except OSError as e:
+            logger.error("❌ Could not save hot queries: %s", e)
+
+
+def start():
+    """Load saved hot queries and start warming in the background (no-op without any source)."""
+    global _task
+    load_hot_queries()
+    if _task is None and (WARMUP_SEED_PATH or HOT_QUERIES_PATH):
+        _task = asyncio.get_running_loop().create_task(_run())
+    return _task
+
+
+async def stop():
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+    try:
+        save_hot_queries()
+    except OSError as e:
+        logger.error("❌ Could not save hot queries: %s", e)
+
+
+register_gauge("cache_warmer", lambda: {"tracked_queries": len(_hot), "last_run": dict(_last_run) or None})
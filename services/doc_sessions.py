@@ -0,0 +1,196 @@
+"""
+Ephemeral per-session vector index for Q&A over uploaded documents.
+
+An upload is split into overlapping passages, batch-embedded once and kept in
+memory; each follow-up question embeds only the question and retrieves the
+top-k passages, instead of sending the whole document to the LLM every turn.
+Sessions expire DOC_SESSION_TTL seconds after their last use, and the least
+recently used ones are evicted when DOC_SESSION_MAX_BYTES is exceeded.
+"""
+import logging
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+from config import (
+    DOC_SESSION_TTL,
+    DOC_SESSION_MAX_BYTES,
+    DOC_SESSION_MAX_PASSAGES,
+    DOC_PASSAGE_CHARS,
+    DOC_PASSAGE_OVERLAP,
+)
+from utils.chunk_processing import ChunkRecord
+from utils.encoder import model, encode_query
+from utils.metrics import inc, register_gauge
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_END = re.compile(r"[.;:!?]\s")
+
+
+class DocumentTooLarge(ValueError):
+    """The document can't fit in the session index."""
+
+
+def split_passages(text, size=DOC_PASSAGE_CHARS, overlap=DOC_PASSAGE_OVERLAP):
+    """
+    Split text into overlapping passages of about `size` characters, ending
+    at a sentence boundary where one is close to the cut.
+
+    Returns:
+        List of passage strings
+    """
+    text = text.strip()
+    passages = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            # Prefer the last sentence end in the second half of the window
+            last = None
+            for match in _SENTENCE_END.finditer(text, start + size // 2, end):
+                last = match
+            if last:
+                end = last.end()
+        passage = text[start:end].strip()
+        if passage:
+            passages.append(passage)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return passages
+
+
+def embed_passages(passages, batch_size=32):
+    """Batch-embed passages into an (n, dim) float32 matrix of unit rows."""
+    vectors = np.asarray(model.encode(passages, batch_size=batch_size), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_passages(vectors, query_vector, top_k):
+    """Indices and cosine scores of the `top_k` rows of `vectors` closest to `query_vector`."""
+    scores = vectors @ query_vector
+    top_k = min(top_k, len(scores))
+    if top_k <= 0:
+        return []
+    best = np.argpartition(-scores, top_k - 1)[:top_k]
+    best = best[np.argsort(-scores[best])]
+    return [(int(i), float(scores[i])) for i in best]
+
+
+class DocumentSession:
+    __slots__ = ("id", "filename", "passages", "vectors", "nbytes", "created", "last_used")
+
+    def __init__(self, session_id, filename, passages, vectors):
+        self.id = session_id
+        self.filename = filename
+        self.passages = passages
+        self.vectors = vectors
+        self.nbytes = vectors.nbytes + sum(len(p.encode("utf-8")) for p in passages)
+        self.created = self.last_used = time.monotonic()
+
+    def describe(self):
+        return {
+            "session_id": self.id,
+            "filename": self.filename,
+            "passages": len(self.passages),
+            "bytes": self.nbytes,
+            "expires_in": max(0, round(self.last_used + DOC_SESSION_TTL - time.monotonic())),
+        }
+
+    def record(self, position, score):
+        """Passage `position` as a ChunkRecord, so the /ask prompt formatting applies unchanged."""
+        # No id: id-keyed caches (references, rerank scores) would keep private text after the session is gone
+        return ChunkRecord(
+            id=None,
+            score=score,
+            text=self.passages[position],
+            source=self.filename,
+            doc_type="Uploaded document",
+            country="N/A",
+            state="N/A",
+            title=f"{self.filename} (passage {position + 1})",
+        )
+
+
+class SessionIndex:
+    """Thread-safe, memory-capped collection of document sessions."""
+
+    def __init__(self, ttl=DOC_SESSION_TTL, max_bytes=DOC_SESSION_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        for session_id in [s.id for s in self._sessions.values() if now - s.last_used > self.ttl]:
+            self._remove(session_id)
+            inc("doc_sessions_expired")
+
+    def _remove(self, session_id):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._bytes -= session.nbytes
+        return session
+
+    def create(self, filename, text):
+        """
+        Chunk and embed a document into a new session (blocking; run in a thread).
+
+        Raises:
+            DocumentTooLarge: The document exceeds the passage or memory limits
+        """
+        passages = split_passages(text)
+        if not passages:
+            raise ValueError("Document has no text")
+        if len(passages) > DOC_SESSION_MAX_PASSAGES:
+            raise DocumentTooLarge(f"Document has {len(passages)} passages (limit {DOC_SESSION_MAX_PASSAGES})")
+
+        session = DocumentSession(uuid.uuid4().hex, filename, passages, embed_passages(passages))
+        if session.nbytes > self.max_bytes:
+            raise DocumentTooLarge("Document is larger than the session memory limit")
+
+        with self._lock:
+            self._expire(time.monotonic())
+            while self._sessions and self._bytes + session.nbytes > self.max_bytes:
+                evicted = self._sessions.popitem(last=False)[1]
+                self._bytes -= evicted.nbytes
+                inc("doc_sessions_evicted")
+                logger.info("🧹 Evicted document session", extra={"session_id": evicted.id, "bytes": evicted.nbytes})
+            self._sessions[session.id] = session
+            self._bytes += session.nbytes
+        return session
+
+    def get(self, session_id):
+        """Live session by id (refreshing its TTL), or None."""
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_used = now
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def drop(self, session_id):
+        with self._lock:
+            return self._remove(session_id) is not None
+
+    def search(self, session, query, top_k):
+        """Top-k passages of `session` for `query` as ChunkRecords (blocking; run in a thread)."""
+        return [session.record(i, score) for i, score in top_passages(session.vectors, encode_query(query), top_k)]
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._sessions), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+sessions = SessionIndex()
+register_gauge("doc_sessions", sessions.stats)
@@ -1,12 +1,11 @@
 """
 Embedding generation and search functionality.
 """
-from sentence_transformers import SentenceTransformer
+import asyncio
+from config import DOC_SESSION_TOP_K
+from utils.chunk_processing import ChunkRecord
+from utils.encoder import model, encode_query
 from utils.pinecode import search_legal_docs
-from config import EMBEDDING_MODEL
-
-# Initialize embedding model
-model = SentenceTransformer(EMBEDDING_MODEL)
 
 
 async def embed_text(text: str):
@@ -14,7 +13,7 @@ async def embed_text(text: str):
     return model.encode([text])[0].tolist()
 
 
-async def embed_and_search(query, context=None, country=None, state=None):
+async def embed_and_search(query, context=None, country=None, state=None, chat_id=None, top_k=8):
     """
     Embed query and search legal documents.
     
@@ -23,28 +22,43 @@ async def embed_and_search(query, context=None, country=None, state=None):
         context: Optional context information
         country: Optional country filter
         state: Optional state filter
+        chat_id: Chat the context belongs to (keys the context embedding cache)
+        top_k: Number of chunks to return
     
     Returns:
         Search results from legal documents database
     """
-    return search_legal_docs(query, context=context, country=country, state=state)
+    # Encoding and the index round trip are blocking; keep them off the event loop
+    return await asyncio.to_thread(
+        search_legal_docs, query, top_k=top_k, context=context, country=country, state=state, chat_id=chat_id
+    )
 
 
-async def incremental_embed_and_stream(texts, query, chat_context, lang="en"):
+async def incremental_embed_and_stream(texts, query, chat_context, lang="en", top_k=DOC_SESSION_TOP_K):
     """
-    Generate embeddings for text chunks and stream final AI response.
+    Embed text chunks in one batch, retrieve the most relevant ones and stream
+    the final AI response over them.
     
     Args:
         texts: List of text strings to embed
         query: User's query
         chat_context: Conversation context
         lang: Language code ('en' or 'pt')
+        top_k: Number of chunks sent to the LLM
     
     Yields:
         Tokens from the streaming response
     """
     from services.llm import stream_final_response
-    
-    chunks = [{"text": t, "vector": await embed_text(t)} for t in texts]
+    from services.doc_sessions import embed_passages, top_passages
+
+    chunks = []
+    if texts:
+        vectors = await asyncio.to_thread(embed_passages, texts)
+        query_vector = await asyncio.to_thread(encode_query, query)
+        chunks = [
+            ChunkRecord(id=None, score=score, text=texts[i], source="Uploaded document")
+            for i, score in top_passages(vectors, query_vector, top_k)
+        ]
     async for token in stream_final_response(chunks, query, chat_context, lang):
-        yield token
\ No newline at end of file
+        yield token
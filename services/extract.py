@@ -1,38 +1,311 @@
 from fastapi import UploadFile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import threading
+import asyncio
 import pdfplumber
 import docx
+import codecs
 import logging
 import io
+import re
 
+from config import EXTRACTION_WORKERS, SEGMENT_MAX_CHARS
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
+logger = logging.getLogger(__name__)
 
-async def extract_text_from_file_bytes(content: bytes, filename: str) -> str:
-    """Extract text from file bytes"""
-    logging.info(f"Processing file: {filename}")
+# PDF/DOCX parsing is CPU-bound; it runs in worker processes so several
+# uploads extract in parallel and the event loop never blocks on it
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: workers don't inherit the embedding model or the app's threads
+            _pool = ProcessPoolExecutor(
+                max_workers=EXTRACTION_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _replace_pool(broken):
+    """Drop a pool whose worker died (e.g. OOM on a huge PDF); the next _get_pool starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+async def _run_in_pool(fn, *args):
+    """Run fn on the extraction pool, retrying once on a fresh pool if the current one is broken."""
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    try:
+        return await loop.run_in_executor(pool, fn, *args)
+    except BrokenProcessPool:
+        logger.warning("⚠️  Extraction pool broken, retrying on a fresh one", extra={"task": fn.__name__})
+        _replace_pool(pool)
+        return await loop.run_in_executor(_get_pool(), fn, *args)
+
+
+_TXT_BLOCK_BYTES = 64 * 1024
+
+
+def _txt_blocks(content: bytes):
+    """Decode text in blocks of whole lines; a line longer than a block is cut at its last space."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    view = memoryview(content)
+    tail = ""
+    for start in range(0, len(content), _TXT_BLOCK_BYTES):
+        text = tail + decoder.decode(view[start:start + _TXT_BLOCK_BYTES])
+        cut = text.rfind("\n")
+        if cut < 0 and len(text) >= _TXT_BLOCK_BYTES:
+            cut = text.rfind(" ")
+        if cut < 0:
+            tail = text
+            continue
+        yield text[:cut]
+        tail = text[cut + 1:]
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_pages(content: bytes, filename: str):
+    """
+    Extract text from file bytes one page at a time (blocking).
+
+    Pages end at line boundaries: PDF pages (without a page number heading or
+    closing them), DOCX paragraphs (followed by an empty line, which marks the
+    paragraph break) or blocks of whole lines of a text file. Joining them
+    with "\n" gives the whole document text.
+    """
     filename_lower = filename.lower()
 
     # PDF
     if filename_lower.endswith(".pdf"):
         with pdfplumber.open(io.BytesIO(content)) as pdf:
-            pages = [page.extract_text() or "" for page in pdf.pages]
-        return "\n".join(pages)
+            for page in pdf.pages:
+                yield _drop_page_numbers(page.extract_text() or "")
+                # Drop the page's parsed layout so memory doesn't grow with the page count
+                page.close()
+        return
 
     # DOCX
     if filename_lower.endswith(".docx"):
         doc = docx.Document(io.BytesIO(content))
-        return "\n".join([para.text for para in doc.paragraphs])
+        for para in doc.paragraphs:
+            yield para.text + "\n"
+        return
 
     # TXT
     if filename_lower.endswith(".txt"):
-        return content.decode("utf-8", errors="ignore")
+        yield from _txt_blocks(content)
+        return
+
+    logger.warning("Unsupported file type: %s", filename)
+
+
+def extract_text(content: bytes, filename: str) -> str:
+    """Extract text from file bytes (blocking)"""
+    return "\n".join(iter_pages(content, filename))
+
+
+def extract_segments(content: bytes, filename: str, max_chars=SEGMENT_MAX_CHARS):
+    """Extract, clean and segment a document in one pass (blocking); yields Segments."""
+    return segment_pages(iter_pages(content, filename), max_chars)
+
+
+def extract_and_clean(content: bytes, filename: str):
+    """
+    Extract and clean in one worker call, so only the cleaned text crosses
+    the process boundary. Pages are streamed through the segmenter, so the
+    raw text is never held whole.
+
+    Returns:
+        (raw_chars, cleaned_text) where the cleaned text has one segment per line
+    """
+    raw_chars = 0
+
+    def counted(pages):
+        nonlocal raw_chars
+        for page in pages:
+            raw_chars += len(page) + 1
+            yield page
+
+    segments = segment_pages(counted(iter_pages(content, filename)))
+    cleaned = "\n".join(segment.text for segment in segments)
+    return max(0, raw_chars - 1), cleaned
+
+
+async def extract_clean_in_pool(content: bytes, filename: str):
+    """Run extract_and_clean on the shared extraction process pool."""
+    return await _run_in_pool(extract_and_clean, content, filename)
+
+
+async def extract_text_from_file_bytes(content: bytes, filename: str) -> str:
+    """Extract text from file bytes"""
+    return await _run_in_pool(extract_text, content, filename)
+
+
+# Legal structure markers, recognized at the start of a line
+_HEADING = re.compile(
+    r"(?:CAP[ÍI]TULO|T[ÍI]TULO|LIVRO|PARTE|SUBSE[ÇC][ÃA]O|SE[ÇC][ÃA]O|CHAPTER|TITLE|PART|SECTION)\s+[IVXLCDM\d]+\b"
+)
+_ARTICLE = re.compile(r"(?:Art\.|ART\.|Artigo|ARTIGO|Article|ARTICLE)\s*\d+(?:\.\d+)*[º°oª]?(?:-[A-Z])?")
+_SECTION = re.compile(r"(?:§\s*\d+[º°oª]?|Par[áa]grafo [úu]nico|PAR[ÁA]GRAFO [ÚU]NICO)")
+_PAGE_NUMBER = re.compile(r"(?:\d{1,4}|(?:P[áa]gina|Page)\s+\d+(?:\s+(?:de|of)\s+\d+)?)", re.IGNORECASE)
+_SENTENCE_END = re.compile(r"[.;:!?]\s")
+_CLOSES_SENTENCE = tuple(".;:!?)")
+
+
+class Segment:
+    """
+    A structural unit of a cleaned document.
+
+    kind is "heading", "article" (Art. N), "section" (§ N, Parágrafo único)
+    or "text". article and heading are the enclosing article and the latest
+    heading, for citations; page is where the segment starts (1-based).
+    """
+    __slots__ = ("kind", "label", "text", "article", "heading", "page")
+
+    def __init__(self, kind, label, text, article=None, heading=None, page=1):
+        self.kind = kind
+        self.label = label
+        self.text = text
+        self.article = article
+        self.heading = heading
+        self.page = page
+
+    def __repr__(self):
+        return f"Segment({self.kind!r}, {self.label!r}, {self.text[:40]!r}...)"
+
+
+def _drop_page_numbers(page):
+    """
+    Drop a page number ("12", "Página 3 de 10") from a PDF page's first and
+    last non-empty lines, where headers and footers sit. Numbers elsewhere on
+    the page (amounts, table cells) are kept.
+    """
+    lines = page.split("\n")
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    edges = {filled[0], filled[-1]} if filled else set()
+    drop = {i for i in edges if _PAGE_NUMBER.fullmatch(" ".join(lines[i].split()))}
+    return "\n".join(line for i, line in enumerate(lines) if i not in drop)
+
+
+def _lines(pages):
+    """Whitespace-normalized lines of a page stream, with their page numbers."""
+    for page_number, page in enumerate(pages, 1):
+        for line in page.replace("\r", "").split("\n"):
+            yield page_number, " ".join(line.split())
+
+
+def segment_pages(pages, max_chars=SEGMENT_MAX_CHARS):
+    """
+    Normalize a page stream in a single pass and split it into Segments.
+
+    Whitespace inside lines is collapsed and words hyphenated across a line
+    break are rejoined. A new segment starts at an empty line (paragraph
+    break), a heading, or an "Art."/"§" marker at the start of a line that
+    follows a finished sentence (so a wrapped reference like "...nos termos
+    do\nArt. 5º" stays inline). Only the segment being built is held in
+    memory; one longer than `max_chars` is emitted in parts, cut at a
+    sentence end where possible.
+
+    Args:
+        pages: Iterable of page texts ending at line boundaries (see iter_pages)
+        max_chars: Longest segment emitted
+
+    Yields:
+        Segment objects in document order
+    """
+    parts, size = [], 0
+    kind, label, article, heading, start_page = "text", None, None, None, 1
+    closed = True  # The previous line ended a sentence (or there was none)
+
+    def emit(text):
+        return Segment(kind, label, text, article if kind != "heading" else None, heading, start_page)
+
+    def flush():
+        nonlocal parts, size
+        text = "".join(parts)
+        parts, size = [], 0
+        return emit(text) if text else None
+
+    for page_number, line in _lines(pages):
+        if not line:
+            if kind == "heading":
+                continue  # A heading's title may be its own paragraph (DOCX)
+            segment = flush()
+            if segment:
+                yield segment
+            kind, label, closed = "text", None, True
+            continue
+
+        heading_match = _HEADING.match(line)
+        marker = None
+        if heading_match:
+            marker = ("heading", heading_match.group(0))
+        elif closed or kind == "heading":
+            match = _ARTICLE.match(line)
+            if match:
+                marker = ("article", match.group(0))
+            else:
+                match = _SECTION.match(line)
+                if match:
+                    marker = ("section", match.group(0))
+        if marker is None and kind == "heading" and not line.isupper():
+            # The heading's title lines are over; what follows is body text
+            marker = ("text", None)
+
+        if marker is not None:
+            segment = flush()
+            if segment:
+                yield segment
+            kind, label = marker
+            if kind == "heading":
+                heading, article = label, None
+            elif kind == "article":
+                article = label
+            start_page = page_number
+
+        if not parts:
+            start_page = page_number
+            parts.append(line)
+        elif parts[-1][-1:] == "-" and parts[-1][-2:-1].isalpha() and line[:1].islower():
+            parts[-1] = parts[-1][:-1] + line
+            size -= 1
+        else:
+            parts.append(" " + line)
+            size += 1
+        size += len(line)
+        closed = line.endswith(_CLOSES_SENTENCE) or (kind == "heading" and line.isupper())
+
+        while size > max_chars:
+            text = "".join(parts)
+            cut = None
+            for match in _SENTENCE_END.finditer(text, max_chars // 2, max_chars):
+                cut = match.end()
+            if cut is None:
+                cut = text.rfind(" ", 0, max_chars) + 1 or max_chars
+            yield emit(text[:cut].strip())
+            rest = text[cut:].lstrip()
+            parts, size = ([rest], len(rest)) if rest else ([], 0)
+            start_page = page_number
 
-    logging.warning(f"Unsupported file type: {filename}")
-    return ""
+    segment = flush()
+    if segment:
+        yield segment
 
 
 def clean_text(text: str) -> str:
-    text = text.replace("\r", "")
-    text = " ".join(text.split())
-    return text
\ No newline at end of file
+    """Normalize whitespace, keeping one segment (paragraph, article, §) per line."""
+    return "\n".join(segment.text for segment in segment_pages([text]))
@@ -0,0 +1,98 @@
+"""
+Local extractive conversation summarizer.
+
+Picks the most representative, non-redundant sentences from recent messages
+using the already-loaded embedding model (centroid similarity + MMR), so
+building context needs no remote LLM call.
+"""
+import re
+
+import numpy as np
+
+from config import LOCAL_SUMMARY_SENTENCES, LOCAL_SUMMARY_MMR_LAMBDA, LOCAL_SUMMARY_MAX_CANDIDATES
+from utils.encoder import model
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+_URL = re.compile(r"\(?(?:Source|Fonte):[^)]*\)?|https?://\S+")
+_MIN_WORDS = 4
+
+
+def split_sentences(messages):
+    """
+    Split messages into candidate sentences, most recent last.
+
+    Args:
+        messages: Message dicts in chronological order
+
+    Returns:
+        List of (sender, sentence) tuples, capped to the newest candidates
+    """
+    candidates = []
+    seen = set()
+    for msg in messages:
+        text = _URL.sub("", msg.get("message") or "")
+        for sentence in _SENTENCE_SPLIT.split(text):
+            sentence = sentence.strip(" *#-•\t")
+            key = sentence.casefold()
+            if len(sentence.split()) < _MIN_WORDS or key in seen:
+                continue
+            seen.add(key)
+            candidates.append((msg.get("sender"), sentence))
+    return candidates[-LOCAL_SUMMARY_MAX_CANDIDATES:]
+
+
+def mmr_select(embeddings, k, mmr_lambda):
+    """
+    Maximal Marginal Relevance selection against the embedding centroid.
+
+    Args:
+        embeddings: (n, d) L2-normalized sentence embeddings
+        k: Number of sentences to select
+        mmr_lambda: Weight of relevance vs. novelty (1.0 = pure centroid ranking)
+
+    Returns:
+        Selected row indices in selection order
+    """
+    centroid = embeddings.mean(axis=0)
+    centroid /= np.linalg.norm(centroid) or 1.0
+    relevance = embeddings @ centroid
+
+    selected = []
+    max_redundancy = np.zeros(len(embeddings))
+    for _ in range(min(k, len(embeddings))):
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * max_redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        max_redundancy = np.maximum(max_redundancy, embeddings @ embeddings[best])
+    return selected
+
+
+def summarize_extractive(messages, lang="en", max_sentences=LOCAL_SUMMARY_SENTENCES, mmr_lambda=LOCAL_SUMMARY_MMR_LAMBDA):
+    """
+    Summarize a conversation by extracting representative sentences.
+
+    CPU-bound; call it through asyncio.to_thread from async code.
+
+    Args:
+        messages: Message dicts in chronological order
+        lang: Language code ('en' or 'pt')
+        max_sentences: Sentences to keep
+        mmr_lambda: MMR relevance/novelty trade-off
+
+    Returns:
+        str: Summary text or None if nothing usable was found
+    """
+    candidates = split_sentences(messages)
+    if not candidates:
+        return None
+
+    embeddings = model.encode([s for _, s in candidates], normalize_embeddings=True, batch_size=32)
+    chosen = sorted(mmr_select(np.asarray(embeddings), max_sentences, mmr_lambda))
+
+    user_label = "User" if lang == "en" else "Usuário"
+    lines = []
+    for idx in chosen:
+        sender, sentence = candidates[idx]
+        lines.append(f"- {user_label if sender == 'user' else 'AI'}: {sentence}")
+    return "\n".join(lines)
@@ -11,25 +11,65 @@ from config import (
     LLM_TOP_P, 
     LLM_MAX_TOKENS,
     SUMMARY_TEMPERATURE,
-    SUMMARY_MAX_TOKENS
+    SUMMARY_MAX_TOKENS,
+    LLM_RPM_LIMIT,
+    LLM_TPM_LIMIT,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_RETRIES
 )
 from prompts import (
-    SYSTEM_PROMPTS, 
     SUMMARIZATION_PROMPTS,
-    DOCUMENT_SUMMARY_INSTRUCTIONS,
-    URL_VALIDATION_WARNING
+    DOCUMENT_SUMMARY_INSTRUCTIONS
 )
-from utils.chunk_processing import ensure_chunk_metadata, format_context_chunk
+from services.prompt_assembly import build_answer_messages
+from utils.chunk_processing import normalize_chunks
+from services.llm_dispatcher import (
+    LLMDispatcher,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_CONVERSATION_SUMMARY,
+    PRIORITY_DOCUMENT_SUMMARY
+)
+from utils.log import log_payload, should_sample, Timer
+from utils.metrics import inc, register_gauge
+
+logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
+# Initialize OpenAI client (retries are handled by the dispatcher so they respect shared budgets)
 client = AsyncOpenAI(
     api_key=OPENAI_CONFIG["api_key"],
     project=OPENAI_CONFIG.get("project"),
-    organization=OPENAI_CONFIG.get("organization")
+    organization=OPENAI_CONFIG.get("organization"),
+    max_retries=0
+)
+
+# All completions go through one dispatcher: RPM/TPM budgets, priority classes, Retry-After aware retries
+dispatcher = LLMDispatcher(
+    client,
+    rpm=LLM_RPM_LIMIT,
+    tpm=LLM_TPM_LIMIT,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    max_retries=LLM_MAX_RETRIES
 )
+register_gauge("llm_dispatcher", dispatcher.stats)
 
 
-async def stream_final_response(chunks, query, chat_context, lang="en"):
+def record_usage(kind, usage):
+    """
+    Count prompt and provider-cached prompt tokens from a completion's usage.
+
+    Returns:
+        (prompt_tokens, cached_tokens), None for both when usage wasn't reported
+    """
+    if usage is None:
+        return None, None
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = (getattr(details, "cached_tokens", None) or 0) if details else 0
+    inc("llm_prompt_tokens", usage.prompt_tokens or 0, kind=kind)
+    inc("llm_cached_prompt_tokens", cached_tokens, kind=kind)
+    return usage.prompt_tokens, cached_tokens
+
+
+async def stream_final_response(chunks, query, chat_context, lang="en", priority=PRIORITY_INTERACTIVE):
     """
     Streams AI response token-by-token using OpenAI with enhanced legal reasoning.
     
@@ -38,232 +78,170 @@ async def stream_final_response(chunks, query, chat_context, lang="en"):
         query: User's query
         chat_context: Conversation context including summary
         lang: Language code ('en' or 'pt')
+        priority: Dispatcher priority class for the LLM call
     
     Yields:
         Response tokens from the LLM
     """
-    logging.info(f"🎯 stream_final_response called | chunks={len(chunks) if isinstance(chunks, list) else 'not-list'} | query='{query[:50]}...' | lang={lang}")
-    
     if isinstance(lang, dict):
         lang = lang.get("code", "en")
-        logging.info(f"📝 Extracted lang code: {lang}")
-    
-    # CRITICAL: Ensure chunks have proper URL metadata
-    chunks = ensure_chunk_metadata(chunks)
-    logging.info(f"✅ Chunks metadata ensured | count={len(chunks)}")
     
-    # DEBUG: Inspect chunk structure
-    logging.info("="*60)
-    logging.info("🔍 DEBUGGING CHUNK STRUCTURE:")
-    logging.info("="*60)
+    # CRITICAL: Ensure chunks have proper URL metadata (no-op for records from retrieval)
+    chunks = normalize_chunks(chunks)
     if chunks:
-        chunk = chunks[0]
-        logging.info(f"📦 First chunk keys: {list(chunk.keys())}")
-        logging.info(f"📦 Chunk type: {type(chunk)}")
-        
-        # Check all possible text fields
-        text_fields = ['text', 'raw_text', 'content', 'chunk_text', 'body', 'article_text', 'page_content']
-        for field in text_fields:
-            if field in chunk:
-                text_val = chunk[field]
-                preview = str(text_val)[:150] if text_val else "EMPTY/NONE"
-                logging.info(f"  ✅ '{field}': {preview}...")
-        
-        # Check metadata structure
-        if 'metadata' in chunk:
-            meta = chunk['metadata']
-            logging.info(f"📦 Metadata keys: {list(meta.keys())}")
-            for key, val in meta.items():
-                preview = str(val)[:100] if val else "EMPTY/NONE"
-                logging.info(f"  📎 metadata['{key}']: {preview}")
-        
-        # Show full chunk for first one
-        logging.info("="*60)
-        logging.info(f"📄 FULL FIRST CHUNK:\n{chunk}")
-        logging.info("="*60)
+        log_payload(logger, "📄 First chunk", chunks[0])
     else:
-        logging.warning("⚠️  No chunks to inspect!")
-    logging.info("="*60)
+        logger.warning("⚠️  No chunks available for context")
     
-    # Get the appropriate system prompt
-    system_prompt = SYSTEM_PROMPTS.get(lang, SYSTEM_PROMPTS["en"])
-    logging.info(f"📋 System prompt retrieved | length={len(system_prompt)} chars")
-    
-    # Format context with clear structure and URLs
-    if chunks:
-        context_sections = [format_context_chunk(c, i) for i, c in enumerate(chunks)]
-        context_text = "\n\n".join(context_sections)
-        logging.info(f"📚 Context formatted | sections={len(context_sections)} | total_chars={len(context_text)}")
-    else:
-        context_text = "No legal documents retrieved for this query."
-        logging.warning("⚠️  No chunks available for context")
-    
-    # Add conversation summary if available
-    summary_section = ""
-    if chat_context.get("summary"):
-        summary_label = "Conversation History Summary:" if lang == "en" else "Resumo do Histórico da Conversa:"
-        summary_section = f"\n\n{summary_label}\n{chat_context.get('summary')}\n"
-        logging.info(f"💬 Summary added | length={len(chat_context.get('summary'))} chars")
-    else:
-        logging.info("💬 No summary in chat context")
-    
-    # Construct the user message
-    question_label = "User Question:" if lang == "en" else "Pergunta do Usuário:"
-    context_label = "Legal Context from Database:" if lang == "en" else "Contexto Legal do Banco de Dados:"
-    instruction = "Your Response (following the mandatory format above):" if lang == "en" else "Sua Resposta (seguindo o formato obrigatório acima):"
-    
-    # Add URL validation reminder
-    url_warning = URL_VALIDATION_WARNING.get(lang, URL_VALIDATION_WARNING["en"])
-    
-    user_message = f"""{summary_section}
-
-📜 **{context_label}**
-{context_text}
+    messages = build_answer_messages(chunks, query, chat_context.get("summary"), lang)
+    prompt_chars = sum(len(m["content"]) for m in messages)
 
-❓ **{question_label}**
-{query}
-{url_warning}
-
-🧠 **{instruction}**
-"""
-    
-    logging.info(f"📝 User message constructed | total_length={len(user_message)} chars")
-    
-    # DEBUG: Log the full messages being sent to OpenAI
-    logging.info("="*60)
-    logging.info("📤 MESSAGES BEING SENT TO OPENAI:")
-    logging.info("="*60)
-    logging.info(f"SYSTEM PROMPT:\n{system_prompt}\n")
-    logging.info(f"USER MESSAGE:\n{user_message}\n")
-    logging.info("="*60)
+    logger.info(
+        "🚀 Calling OpenAI",
+        extra={"model": LLM_MODEL, "lang": lang, "chunks": len(chunks), "prompt_chars": prompt_chars},
+    )
+    for message in messages:
+        log_payload(logger, f"📤 {message['role'].capitalize()} message", message["content"])
 
     try:
-        logging.info(f"🚀 Calling OpenAI API | model={LLM_MODEL} | temp={LLM_TEMPERATURE} | max_tokens={LLM_MAX_TOKENS}")
+        timer = Timer()
+        
+        token_count = 0
+        ttft_ms = None
+        finished = False
+        usage = None
+        # Only hold on to the full answer when this request was picked for a payload dump
+        full_response = [] if logger.isEnabledFor(logging.DEBUG) and should_sample() else None
         
         # Stream response from OpenAI
-        stream = await client.chat.completions.create(
+        async with dispatcher.stream(
+            priority,
             model=LLM_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ],
+            messages=messages,
             temperature=LLM_TEMPERATURE,
             top_p=LLM_TOP_P,
             max_tokens=LLM_MAX_TOKENS,
-            stream=True
-        )
-        
-        logging.info("✅ OpenAI stream created, starting to iterate...")
-        token_count = 0
-        full_response = []  # Collect full response for debugging
-        
-        async for chunk in stream:
-            if chunk.choices[0].delta.content is not None:
-                token = chunk.choices[0].delta.content
-                full_response.append(token)
-                token_count += 1
-                if token_count <= 5 or token_count % 50 == 0:
-                    logging.debug(f"🪄 Token #{token_count}: '{token[:20]}...'")
-                yield token
-            
-            # Check if stream is done
-            if chunk.choices[0].finish_reason == "stop":
-                complete_response = "".join(full_response)
-                logging.info(f"✅ Stream completed | total_tokens={token_count} | finish_reason=stop")
-                logging.info("="*60)
-                logging.info("📥 COMPLETE AI RESPONSE:")
-                logging.info("="*60)
-                logging.info(complete_response)
-                logging.info("="*60)
-                yield "[DONE]"
-                break
-        
-        logging.info(f"🏁 Stream iteration finished | total_tokens_yielded={token_count}")
+            stream=True,
+            stream_options={"include_usage": True}
+        ) as stream:
+            async for chunk in stream:
+                # The usage chunk comes last and has no choices
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+
+                if chunk.choices[0].delta.content is not None:
+                    token = chunk.choices[0].delta.content
+                    if ttft_ms is None:
+                        ttft_ms = timer.ms()
+                    if full_response is not None:
+                        full_response.append(token)
+                    token_count += 1
+                    yield token
+                
+                # Check if stream is done (keep reading: the usage chunk follows)
+                if chunk.choices[0].finish_reason == "stop":
+                    finished = True
+
+        if finished:
+            prompt_tokens, cached_tokens = record_usage("answer", usage)
+            logger.info(
+                "✅ Stream completed",
+                extra={
+                    "tokens": token_count,
+                    "prompt_tokens": prompt_tokens,
+                    "cached_tokens": cached_tokens,
+                    "ttft_ms": ttft_ms,
+                    "elapsed_ms": timer.ms(),
+                },
+            )
+            if full_response is not None:
+                logger.debug("📥 Complete AI response:\n%s", "".join(full_response))
+            yield "[DONE]"
                 
     except Exception as e:
-        logging.error(f"💥 Error in stream_final_response: {e}", exc_info=True)
+        logger.error("💥 Error in stream_final_response: %s", e, exc_info=True)
         yield f"[ERROR: {str(e)}]"
 
 
-async def summarize_text(text, lang="en"):
+async def summarize_text(text, lang="en", priority=PRIORITY_CONVERSATION_SUMMARY):
     """
     Summarize text and return the complete summary.
     
     Args:
         text: Text to summarize
         lang: Language code ('en' or 'pt')
+        priority: Dispatcher priority class for the LLM call
     
     Returns:
         str: Complete summary text or None
     """
-    logging.info(f"📝 summarize_text called | text_length={len(text)} | lang={lang}")
-    
     if not text.strip():
-        logging.warning("⚠️  Empty text provided, returning None")
+        logger.warning("⚠️  Empty text provided, returning None")
         return None
 
     prompt = SUMMARIZATION_PROMPTS.get(lang, SUMMARIZATION_PROMPTS["en"]).format(text=text)
-    logging.info(f"📋 Summarization prompt created | length={len(prompt)} chars")
-    logging.debug(f"📄 Prompt preview: {prompt[:200]}...")
+    log_payload(logger, "📄 Summarization prompt", prompt)
 
     try:
-        logging.info(f"🚀 Calling OpenAI for summarization | model={LLM_MODEL}")
+        timer = Timer()
         
         # Accumulate the complete response
         summary_parts = []
         
-        stream = await client.chat.completions.create(
+        async with dispatcher.stream(
+            priority,
             model=LLM_MODEL,
             messages=[
                 {"role": "user", "content": prompt}
             ],
             temperature=SUMMARY_TEMPERATURE,
             max_tokens=SUMMARY_MAX_TOKENS,
-            stream=True
-        )
-        
-        logging.info("✅ Summary stream created, accumulating tokens...")
-        token_count = 0
-        
-        async for chunk in stream:
-            if chunk.choices[0].delta.content is not None:
-                content = chunk.choices[0].delta.content
-                summary_parts.append(content)
-                token_count += 1
-                if token_count <= 3 or token_count % 20 == 0:
-                    logging.debug(f"📝 Summary token #{token_count}: '{content[:30]}...'")
-            
-            if chunk.choices[0].finish_reason == "stop":
-                logging.info(f"✅ Summary stream completed | tokens={token_count}")
-                break
+            stream=True,
+            stream_options={"include_usage": True}
+        ) as stream:
+            usage = None
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content is not None:
+                    summary_parts.append(chunk.choices[0].delta.content)
         
         # Return the complete summary
         complete_summary = "".join(summary_parts)
-        logging.info(f"✅ Summary generated | length={len(complete_summary)} chars")
-        logging.debug(f"📄 Summary preview: {complete_summary[:200]}...")
+        prompt_tokens, cached_tokens = record_usage("conversation_summary", usage)
+        logger.info(
+            "✅ Summary generated",
+            extra={
+                "input_chars": len(text),
+                "summary_chars": len(complete_summary),
+                "prompt_tokens": prompt_tokens,
+                "cached_tokens": cached_tokens,
+                "elapsed_ms": timer.ms(),
+            },
+        )
         
         return complete_summary
                 
     except Exception as e:
-        logging.error(f"💥 Error in summarize_text: {e}", exc_info=True)
+        logger.error("💥 Error in summarize_text: %s", e, exc_info=True)
         return None
 
 
-async def stream_summary_dual(text: str, lang):
+async def stream_summary_dual(text: str, lang, file_id=None):
     """
     Stream a summary of the document in English or Portuguese based on user selection.
     
     Args:
         text: Document text to summarize
         lang: Language code ('en' or 'pt')
+        file_id: Optional id added to every event (multi-file requests)
     
     Yields:
         JSON-formatted tokens with language metadata
     """
-    logging.info(f"🌐 stream_summary_dual called | text_length={len(text)} | lang={lang}")
-    
     lang_config = DOCUMENT_SUMMARY_INSTRUCTIONS[lang]
-    logging.info(f"📋 Language config loaded: {lang_config.get('language')}")
 
     if lang == "en":
         prompt = f"""You are a professional document summarizer. Your task is to create a concise, well-structured summary in {lang_config['language']}.
@@ -286,12 +264,17 @@ Documento a ser resumido:
 Forneça um resumo claro e abrangente agora:"""
         lang_code = "pt"
     
-    logging.info(f"📝 Dual summary prompt created | lang_code={lang_code} | length={len(prompt)}")
+    tag = {"file": file_id} if file_id is not None else {}
+
+    logger.info("🌐 Starting document summary stream", extra={"lang": lang_code, "prompt_chars": len(prompt)})
 
     try:
-        logging.info("🚀 Starting dual summary stream...")
+        timer = Timer()
+        
+        token_count = 0
         
-        stream = await client.chat.completions.create(
+        async with dispatcher.stream(
+            PRIORITY_DOCUMENT_SUMMARY,
             model=LLM_MODEL,
             messages=[
                 {"role": "user", "content": prompt}
@@ -299,25 +282,38 @@ Forneça um resumo claro e abrangente agora:"""
             temperature=LLM_TEMPERATURE,
             top_p=LLM_TOP_P,
             max_tokens=SUMMARY_MAX_TOKENS,
-            stream=True
-        )
-        
-        logging.info("✅ Dual summary stream created")
-        token_count = 0
-        
-        async for chunk in stream:
-            if chunk.choices[0].delta.content is not None:
-                token = chunk.choices[0].delta.content
-                token_count += 1
-                if token_count <= 3 or token_count % 30 == 0:
-                    logging.debug(f"🪄 Dual summary token #{token_count}")
-                yield "data: " + json.dumps({"lang": lang_code, "token": token}) + "\n\n"
-            
-            if chunk.choices[0].finish_reason == "stop":
-                logging.info(f"✅ Dual summary completed | tokens={token_count}")
-                yield "data: " + json.dumps({"lang": lang_code, "token": "[DONE]"}) + "\n\n"
-                break
+            stream=True,
+            stream_options={"include_usage": True}
+        ) as stream:
+            finished = False
+            usage = None
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+
+                if chunk.choices[0].delta.content is not None:
+                    token = chunk.choices[0].delta.content
+                    token_count += 1
+                    yield "data: " + json.dumps({**tag, "lang": lang_code, "token": token}) + "\n\n"
+                
+                if chunk.choices[0].finish_reason == "stop":
+                    finished = True
+
+        if finished:
+            prompt_tokens, cached_tokens = record_usage("document_summary", usage)
+            logger.info(
+                "✅ Document summary completed",
+                extra={
+                    "tokens": token_count,
+                    "prompt_tokens": prompt_tokens,
+                    "cached_tokens": cached_tokens,
+                    "elapsed_ms": timer.ms(),
+                },
+            )
+            yield "data: " + json.dumps({**tag, "lang": lang_code, "token": "[DONE]"}) + "\n\n"
                 
     except Exception as e:
-        logging.error(f"💥 Error in stream_summary_dual: {e}", exc_info=True)
-        yield "data: " + json.dumps({"lang": lang_code, "error": str(e)}) + "\n\n"
\ No newline at end of file
+        logger.error("💥 Error in stream_summary_dual: %s", e, exc_info=True)
+        yield "data: " + json.dumps({**tag, "lang": lang_code, "error": str(e)}) + "\n\n"
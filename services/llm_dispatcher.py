@@ -0,0 +1,237 @@
+"""
+Shared outbound scheduler for OpenAI chat completions.
+
+Every call goes through one dispatcher that enforces requests-per-minute and
+tokens-per-minute budgets, serves waiting calls in priority order and retries
+rate-limited calls, honoring the server's Retry-After.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+# Priority classes (lower is served first)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_CONVERSATION_SUMMARY = 1
+PRIORITY_DOCUMENT_SUMMARY = 2
+PRIORITY_BATCH = 3  # Bulk API work never delays anyone waiting on a screen
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_CONVERSATION_SUMMARY: "conversation_summary",
+    PRIORITY_DOCUMENT_SUMMARY: "document_summary",
+    PRIORITY_BATCH: "batch",
+}
+
+_RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `per_minute / 60` per second."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` tokens are available (0 if available now)."""
+        self._refill()
+        # A single request larger than the whole bucket is let through once the bucket is full
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+def estimate_tokens(messages, max_tokens):
+    """Rough prompt+completion token estimate (~4 chars per token) for budget accounting."""
+    prompt_chars = sum(len(m.get("content") or "") for m in messages)
+    return prompt_chars // 4 + (max_tokens or 0)
+
+
+def retry_after_seconds(error):
+    """Extract the server-requested delay from a rate-limit response, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+class LLMDispatcher:
+    """
+    Priority queue in front of `client.chat.completions.create`.
+
+    Usage:
+        async with dispatcher.stream(PRIORITY_INTERACTIVE, model=..., messages=..., stream=True) as stream:
+            async for chunk in stream:
+                ...
+    """
+
+    def __init__(self, client, rpm, tpm, max_concurrency, max_retries=4, base_delay=0.5, max_delay=30.0):
+        self.client = client
+        self.requests_bucket = TokenBucket(rpm)
+        self.tokens_bucket = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._heap = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._timer = None
+        self._stats = {"dispatched": 0, "retries": 0, "rate_limited": 0, "failed": 0, "cancelled": 0}
+
+    # --- scheduling ---
+
+    def _schedule(self):
+        """Grant queued waiters, in priority order, while slots and budgets allow."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._heap:
+            priority, seq, tokens, future = self._heap[0]
+            if future.cancelled():
+                heapq.heappop(self._heap)
+                continue
+            if self._in_flight >= self.max_concurrency:
+                return  # A release() will reschedule
+
+            wait = max(
+                self._paused_until - time.monotonic(),
+                self.requests_bucket.wait_time(1),
+                self.tokens_bucket.wait_time(tokens),
+            )
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._schedule)
+                return
+
+            heapq.heappop(self._heap)
+            self.requests_bucket.take(1)
+            self.tokens_bucket.take(tokens)
+            self._in_flight += 1
+            future.set_result(None)
+
+    async def _acquire(self, priority, tokens):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (priority, next(self._seq), tokens, future))
+        self._schedule()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+
+    def _release(self):
+        self._in_flight -= 1
+        self._schedule()
+
+    # --- calls ---
+
+    def _backoff(self, attempt, error):
+        server_delay = retry_after_seconds(error)
+        if server_delay is not None:
+            return min(server_delay, self.max_delay)
+        return min(self.max_delay, self.base_delay * 2 ** attempt) * (0.5 + random.random() / 2)
+
+    @staticmethod
+    def _is_retryable(error):
+        if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+            return True
+        return isinstance(error, openai.APIStatusError) and error.status_code in _RETRYABLE_STATUS
+
+    async def _create(self, priority, tokens, kwargs):
+        """Acquire a slot and issue the call, retrying retryable failures. Returns holding the slot."""
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(priority, tokens)
+            try:
+                self._stats["dispatched"] += 1
+                return await self.client.chat.completions.create(**kwargs)
+            except asyncio.CancelledError:
+                # Caller went away while the request was being opened
+                self._release()
+                self._stats["cancelled"] += 1
+                raise
+            except Exception as e:
+                self._release()
+                if not self._is_retryable(e) or attempt == self.max_retries:
+                    self._stats["failed"] += 1
+                    raise
+                delay = self._backoff(attempt, e)
+                self._stats["retries"] += 1
+                if getattr(e, "status_code", None) == 429:
+                    self._stats["rate_limited"] += 1
+                    # Hold back every caller, not just this one, until the provider's window reopens
+                    self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                logger.warning(
+                    "⏳ LLM call failed, retrying",
+                    extra={"priority": PRIORITY_NAMES.get(priority, priority), "attempt": attempt + 1,
+                           "delay_s": round(delay, 2), "error": type(e).__name__},
+                )
+                await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def stream(self, priority, **kwargs):
+        """
+        Open a completion under the dispatcher's budgets.
+
+        The concurrency slot is held until the block exits, and streamed
+        responses are closed on exit so the upstream connection is freed.
+        """
+        tokens = estimate_tokens(kwargs.get("messages", []), kwargs.get("max_tokens"))
+        response = await self._create(priority, tokens, kwargs)
+        try:
+            yield response
+        except (asyncio.CancelledError, GeneratorExit):
+            self._stats["cancelled"] += 1
+            raise
+        finally:
+            try:
+                close = getattr(response, "close", None)
+                if close is not None:
+                    await close()
+            finally:
+                self._release()
+
+    def stats(self):
+        """Queue depth per priority class, in-flight calls and budget levels."""
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, _, future in self._heap:
+            if not future.done():
+                depth[PRIORITY_NAMES.get(priority, str(priority))] += 1
+        return {
+            "queued": depth,
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "requests_available": round(self.requests_bucket.tokens, 1),
+            "tokens_available": round(self.tokens_bucket.tokens),
+            "paused_for_s": round(max(0.0, self._paused_until - time.monotonic()), 2),
+            **self._stats,
+        }
@@ -0,0 +1,72 @@
+"""
+Answer prompt assembly laid out for provider-side prompt-prefix caching.
+
+Providers cache the longest previously seen prompt prefix, so content is
+ordered from most to least stable:
+
+    1. system  - system prompt + citation rules + response instruction (static per language)
+    2. system  - conversation summary (stable across the turns of one chat)
+    3. user    - retrieved references, then the question (new on every call)
+
+The static block is compiled once per language at import (app startup); per
+call only the dynamic tail is formatted.
+"""
+from prompts import SYSTEM_PROMPTS, URL_VALIDATION_WARNING, ANSWER_LABELS
+from utils.chunk_processing import format_context_chunk
+
+
+class AnswerTemplate:
+    """Precompiled per-language pieces of the answer prompt."""
+    __slots__ = ("lang", "static_message", "summary_prefix", "context_header", "question_header", "no_context")
+
+    def __init__(self, lang):
+        labels = ANSWER_LABELS.get(lang, ANSWER_LABELS["en"])
+        system_prompt = SYSTEM_PROMPTS.get(lang, SYSTEM_PROMPTS["en"])
+        url_warning = URL_VALIDATION_WARNING.get(lang, URL_VALIDATION_WARNING["en"])
+
+        self.lang = lang
+        self.static_message = {
+            "role": "system",
+            "content": f"{system_prompt}\n{url_warning}\n🧠 **{labels['instruction']}**",
+        }
+        self.summary_prefix = f"{labels['summary']}\n"
+        self.context_header = f"📜 **{labels['context']}**\n"
+        self.question_header = f"\n\n❓ **{labels['question']}**\n"
+        self.no_context = labels["no_context"]
+
+
+TEMPLATES = {lang: AnswerTemplate(lang) for lang in SYSTEM_PROMPTS}
+
+
+def template_for(lang):
+    return TEMPLATES.get(lang, TEMPLATES["en"])
+
+
+def build_answer_messages(chunks, query, summary=None, lang="en"):
+    """
+    Chat messages for a RAG answer, most stable content first.
+
+    Args:
+        chunks: Normalized ChunkRecords, in reference order
+        query: User's question
+        summary: Conversation summary, if any
+        lang: Language code ('en' or 'pt')
+
+    Returns:
+        List of chat message dicts
+    """
+    template = template_for(lang)
+    messages = [template.static_message]
+
+    if summary:
+        messages.append({"role": "system", "content": template.summary_prefix + summary})
+
+    if chunks:
+        context_text = "\n\n".join(format_context_chunk(c, i) for i, c in enumerate(chunks))
+    else:
+        context_text = template.no_context
+    messages.append({
+        "role": "user",
+        "content": f"{template.context_header}{context_text}{template.question_header}{query}",
+    })
+    return messages
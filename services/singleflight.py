@@ -0,0 +1,147 @@
+"""
+Single-flight coalescing of identical in-flight generations.
+
+When many clients ask the same question against the same retrieved chunks,
+only the first one opens an upstream LLM stream. Everyone else attaches to
+it and receives the same tokens; late joiners first get the prefix that was
+already emitted.
+"""
+import asyncio
+import hashlib
+import logging
+import re
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query):
+    """Case-fold, collapse whitespace and drop trailing punctuation."""
+    return _WHITESPACE.sub(" ", (query or "").casefold()).strip().rstrip("?!.;: ")
+
+
+def chunk_identity(chunk):
+    """Stable id for a retrieved chunk (falls back to a hash of its text)."""
+    chunk_id = chunk.get("id")
+    if chunk_id:
+        return str(chunk_id)
+    return hashlib.sha1(str(chunk.get("text", "")).encode("utf-8")).hexdigest()[:16]
+
+
+def answer_key(query, country, state, lang, chunks, summary=None):
+    """
+    Coalescing key for an /ask generation.
+
+    Chunk ids are kept in retrieval order because the order decides the
+    [REFERENCE n] numbering the answer cites. The conversation summary is
+    part of the prompt, so it is part of the key too.
+    """
+    parts = [
+        normalize_query(query),
+        str(country or ""),
+        str(state or ""),
+        str(lang or ""),
+        ",".join(chunk_identity(c) for c in chunks),
+        hashlib.sha1((summary or "").encode("utf-8")).hexdigest(),
+    ]
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    __slots__ = ("tokens", "done", "subscribers", "task", "_changed")
+
+    def __init__(self):
+        self.tokens = []
+        self.done = False
+        self.subscribers = 0
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def changed(self):
+        return self._changed
+
+
+class SingleFlight:
+    """
+    Registry of in-flight generations keyed by `answer_key`.
+
+    The upstream generator keeps running while at least one subscriber is
+    attached and is cancelled when the last one leaves.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._flights = {}
+        metrics.register_gauge(f"singleflight_{name}", self.stats)
+
+    async def _run(self, key, flight, source):
+        try:
+            async for token in source:
+                flight.tokens.append(token)
+                flight.notify()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("💥 Coalesced generation failed: %s", e, exc_info=True)
+            flight.tokens.append(f"[ERROR: {str(e)}]")
+        finally:
+            await source.aclose()
+            flight.done = True
+            flight.notify()
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    async def stream(self, key, source_factory):
+        """
+        Yield the token stream for `key`, starting `source_factory()` if nobody else has.
+
+        Args:
+            key: Coalescing key (see answer_key)
+            source_factory: Zero-arg callable returning the upstream async generator
+
+        Yields:
+            Tokens, replaying the already-emitted prefix for late joiners
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(key, flight, source_factory()))
+        else:
+            metrics.inc("singleflight_joined", flight=self.name)
+            logger.info("🔗 Joined in-flight generation", extra={"flight": self.name, "replayed": len(flight.tokens)})
+
+        flight.subscribers += 1
+        try:
+            position = 0
+            while True:
+                changed = flight.changed()
+                while position < len(flight.tokens):
+                    yield flight.tokens[position]
+                    position += 1
+                if flight.done:
+                    return
+                await changed.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Detach first so a new request for the same key starts a fresh generation
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    def stats(self):
+        return {
+            "in_flight": len(self._flights),
+            "subscribers": sum(f.subscribers for f in self._flights.values()),
+        }
+
+
+ask_flights = SingleFlight("ask")
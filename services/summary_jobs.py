@@ -0,0 +1,414 @@
+"""
+Background summary jobs, for uploads too long to summarize over one connection.
+
+POST /summarize-file/jobs stores the upload and returns a job id at once. A
+pool of SUMMARY_JOB_WORKERS tasks takes queued jobs in order, extracts the
+text on the extraction process pool and streams the summary. Every event the
+job produces (status changes, summary tokens, errors) is numbered and kept,
+so clients can:
+
+- poll the job's status and the summary so far, or
+- follow the events as SSE from any offset, reconnecting with Last-Event-ID.
+
+A dropped connection loses nothing, and long summaries don't hold request
+capacity while they run.
+
+Jobs live in SUMMARY_JOB_DIR: the upload (until the job ends), an event log
+and a metadata file. Finished jobs are deleted SUMMARY_JOB_TTL seconds after
+they end (checked every SUMMARY_JOB_SWEEP_INTERVAL, so an idle server cleans
+up too). Jobs still queued or running when the server stops are marked
+"interrupted" on the next start and have to be resubmitted.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+import uuid
+
+from config import (
+    SUMMARY_JOB_DIR,
+    SUMMARY_JOB_WORKERS,
+    SUMMARY_JOB_MAX_QUEUED,
+    SUMMARY_JOB_MAX_PER_TENANT,
+    SUMMARY_JOB_TTL,
+    SUMMARY_JOB_SWEEP_INTERVAL,
+)
+from services.extract import extract_clean_in_pool
+from services.llm import stream_summary_dual
+from utils.log import Timer
+from utils.metrics import inc, register_gauge
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = ("queued", "extracting", "summarizing")
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class JobRejected(Exception):
+    """A job can't be accepted now; carries the HTTP status and a Retry-After hint."""
+
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class SummaryJob:
+    __slots__ = ("id", "tenant", "filename", "lang", "status", "created", "finished", "error",
+                 "events", "task", "changed", "log")
+
+    def __init__(self, job_id, tenant, filename, lang, status="queued", created=None, finished=None, error=None):
+        self.id = job_id
+        self.tenant = tenant
+        self.filename = filename
+        self.lang = lang
+        self.status = status
+        self.created = created or time.time()
+        self.finished = finished
+        self.error = error
+        self.events = [] if status in ACTIVE else None  # In memory while active, on disk once finished
+        self.task = None
+        self.changed = asyncio.Event()  # Set and replaced on every new event
+        self.log = None  # Event log file while active
+
+    @property
+    def active(self):
+        return self.status in ACTIVE
+
+    def meta(self):
+        return {
+            "job_id": self.id,
+            "tenant": self.tenant,
+            "filename": self.filename,
+            "lang": self.lang,
+            "status": self.status,
+            "created": self.created,
+            "finished": self.finished,
+            "error": self.error,
+        }
+
+    def emit(self, payload):
+        """Append an event (dict or JSON string) and wake the followers."""
+        data = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+        self.events.append(data)
+        self.log.write(data + "\n")
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def end(self, status, error=None, **fields):
+        """Record the final status; from here on the events are read from the log."""
+        self.status, self.error, self.finished = status, error, time.time()
+        self.emit({"status": status, **({"error": error} if error else {}), **fields})
+        self.log.close()
+        self.log = None
+        self.events = None
+
+
+class JobStore:
+    """Queued, running and finished summary jobs, with a bounded worker pool."""
+
+    def __init__(self, directory=SUMMARY_JOB_DIR, workers=SUMMARY_JOB_WORKERS, max_queued=SUMMARY_JOB_MAX_QUEUED,
+                 max_per_tenant=SUMMARY_JOB_MAX_PER_TENANT, ttl=SUMMARY_JOB_TTL,
+                 sweep_interval=SUMMARY_JOB_SWEEP_INTERVAL):
+        self.directory = directory
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_per_tenant = max_per_tenant
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._jobs = {}
+        self._queue = None
+        self._workers = []
+        self._sweeper = None
+        self._running = 0
+        self._stopping = False
+        self._job_s = 60.0  # EWMA of how long a job takes, for Retry-After
+
+    def _path(self, job_id, suffix):
+        return os.path.join(self.directory, f"{job_id}.{suffix}")
+
+    def _save(self, job):
+        tmp_path = self._path(job.id, "json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(job.meta(), fh, ensure_ascii=False)
+        os.replace(tmp_path, self._path(job.id, "json"))
+
+    def _delete_files(self, *job_ids):
+        for job_id in job_ids:
+            for suffix in ("json", "events", "upload"):
+                try:
+                    os.remove(self._path(job_id, suffix))
+                except FileNotFoundError:
+                    pass
+
+    def _load(self):
+        """Index the jobs on disk; unfinished ones belonged to a previous process and are marked interrupted."""
+        interrupted = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding="utf-8") as fh:
+                    meta = json.load(fh)
+            except (OSError, ValueError):
+                logger.warning("⚠️  Skipping unreadable job file %s", name)
+                continue
+            meta.pop("job_id", None)
+            job = SummaryJob(name[:-5], **meta)
+            if job.active:
+                job.status, job.error, job.finished, job.events = "interrupted", "Server restarted", time.time(), None
+                with open(self._path(job.id, "events"), "a", encoding="utf-8") as fh:
+                    fh.write(json.dumps({"status": "interrupted", "error": job.error}) + "\n")
+                self._save(job)
+                try:
+                    os.remove(self._path(job.id, "upload"))
+                except FileNotFoundError:
+                    pass
+                interrupted += 1
+            self._jobs[job.id] = job
+        return interrupted
+
+    def _expire(self):
+        """Forget finished jobs past their TTL; returns their ids so the files can be deleted."""
+        now = time.time()
+        expired = [j.id for j in self._jobs.values() if not j.active and j.finished and now - j.finished > self.ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+            inc("summary_jobs_expired")
+        return expired
+
+    async def _sweep(self):
+        """Delete expired jobs periodically, so their files don't outlive the TTL on an idle server."""
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                expired = self._expire()
+                if expired:
+                    await asyncio.to_thread(self._delete_files, *expired)
+                    logger.info("🧹 Expired summary jobs deleted", extra={"jobs": len(expired)})
+            except Exception:
+                logger.error("❌ Summary job sweep failed", exc_info=True)
+
+    async def start(self):
+        """Load the jobs kept on disk and start the workers."""
+        if self._queue is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        interrupted = await asyncio.to_thread(self._load)
+        await asyncio.to_thread(self._delete_files, *self._expire())
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._work(), name=f"summary-job-{i}") for i in range(self.workers)]
+        self._sweeper = asyncio.create_task(self._sweep(), name="summary-job-sweeper")
+        logger.info(
+            "🗂️  Summary job workers started",
+            extra={"workers": self.workers, "jobs": len(self._jobs), "interrupted": interrupted, "dir": self.directory},
+        )
+
+    async def stop(self):
+        """Stop the workers; running jobs end as "interrupted"."""
+        self._stopping = True
+        tasks = self._workers + ([self._sweeper] if self._sweeper is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._sweeper = None
+
+    def _retry_after(self):
+        return max(1, round(self._job_s * (self._queue.qsize() + 1) / max(1, self.workers)))
+
+    async def submit(self, tenant, filename, content, lang):
+        """
+        Store an upload and queue it for summarization.
+
+        Raises:
+            JobRejected: The queue is full (503) or the tenant has too many jobs (429)
+        """
+        if self._queue is None:
+            raise JobRejected(503, "Summary jobs are not running", 5)
+        if self._queue.qsize() >= self.max_queued:
+            inc("summary_jobs_rejected", reason="queue_full")
+            raise JobRejected(503, "Too many queued jobs", self._retry_after())
+        if sum(j.active and j.tenant == tenant for j in self._jobs.values()) >= self.max_per_tenant:
+            inc("summary_jobs_rejected", reason="tenant")
+            raise JobRejected(429, f"At most {self.max_per_tenant} unfinished jobs per tenant", self._retry_after())
+
+        job = SummaryJob(uuid.uuid4().hex, tenant, filename, lang)
+
+        def store(expired):
+            self._delete_files(*expired)
+            with open(self._path(job.id, "upload"), "wb") as fh:
+                fh.write(content)
+            self._save(job)
+            job.log = open(self._path(job.id, "events"), "w", encoding="utf-8")
+
+        await asyncio.to_thread(store, self._expire())
+        self._jobs[job.id] = job
+        job.emit({"status": "queued", "position": self._queue.qsize() + 1})
+        self._queue.put_nowait(job)
+        inc("summary_jobs_submitted")
+        logger.info("🗂️  Summary job queued", extra={"job_id": job.id, "tenant": tenant, "file": filename, "bytes": len(content)})
+        return job
+
+    def get(self, job_id):
+        """Job by id, or None if it doesn't exist or has expired."""
+        job = self._jobs.get(job_id) if _JOB_ID.match(job_id or "") else None
+        if job is not None and not job.active and job.finished and time.time() - job.finished > self.ttl:
+            return None
+        return job
+
+    async def cancel(self, job_id):
+        """Stop an unfinished job, or delete a finished one. Returns False if there is no such job."""
+        job = self.get(job_id)
+        if job is None:
+            return False
+        if job.active:
+            if job.task is not None:
+                job.task.cancel()
+                await asyncio.gather(job.task, return_exceptions=True)
+            else:
+                # Still queued: the worker skips it when it comes up
+                job.end("cancelled")
+                inc("summary_jobs", outcome="cancelled")
+                await asyncio.to_thread(self._finish_files, job)
+        else:
+            del self._jobs[job.id]
+            await asyncio.to_thread(self._delete_files, job.id)
+        return True
+
+    def _read_events(self, job):
+        try:
+            with open(self._path(job.id, "events"), encoding="utf-8") as fh:
+                return fh.read().splitlines()
+        except FileNotFoundError:
+            return []
+
+    async def events(self, job, offset=0):
+        """
+        Yield (index, event JSON) from `offset` on: the recorded ones, then the
+        live ones until the job ends.
+        """
+        while True:
+            if job.events is None:
+                for index, data in enumerate(await asyncio.to_thread(self._read_events, job)):
+                    if index >= offset:
+                        yield index, data
+                return
+            changed = job.changed
+            while job.events is not None and offset < len(job.events):
+                yield offset, job.events[offset]
+                offset += 1
+            if job.events is not None:
+                await changed.wait()
+
+    async def summary(self, job):
+        """Summary text produced so far."""
+        events = job.events if job.events is not None else await asyncio.to_thread(self._read_events, job)
+        tokens = []
+        for data in events:
+            token = json.loads(data).get("token")
+            if token and token != "[DONE]":
+                tokens.append(token)
+        return "".join(tokens)
+
+    def _read_upload(self, job):
+        with open(self._path(job.id, "upload"), "rb") as fh:
+            return fh.read()
+
+    def _finish_files(self, job):
+        self._save(job)
+        try:
+            os.remove(self._path(job.id, "upload"))
+        except FileNotFoundError:
+            pass
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            if not job.active:
+                continue
+            self._running += 1
+            task = job.task = asyncio.create_task(self._run(job))
+            try:
+                # Shielded so cancelling the job (DELETE) doesn't stop the worker
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not asyncio.current_task().cancelling():
+                    continue  # Only the job was cancelled
+                # The worker itself is stopping (shutdown), possibly just as the job ended: stop the job too
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise
+            finally:
+                self._running -= 1
+
+    async def _run(self, job):
+        timer = Timer()
+        status, error = "failed", None
+        try:
+            job.status = "extracting"
+            job.emit({"status": "extracting"})
+            await asyncio.to_thread(self._save, job)
+            content = await asyncio.to_thread(self._read_upload, job)
+            raw_chars, cleaned = await extract_clean_in_pool(content, job.filename)
+            del content
+            extract_ms = timer.ms()
+
+            if not cleaned.strip():
+                logger.warning("⚠️ File is empty after cleaning", extra={"job_id": job.id, "file": job.filename})
+                error = "Empty file"
+                return
+
+            job.status = "summarizing"
+            job.emit({"status": "summarizing", "clean_chars": len(cleaned), "extract_ms": extract_ms})
+            await asyncio.to_thread(self._save, job)
+            token_count = 0
+            ok = False
+            async for event in stream_summary_dual(cleaned, job.lang):
+                data = event[len("data: "):].strip()
+                job.emit(data)
+                token_count += 1
+                ok = '"[DONE]"' in data
+            status, error = ("done", None) if ok else ("failed", "Summary did not complete")
+
+            logger.info(
+                "✅ Summary job complete",
+                extra={
+                    "job_id": job.id,
+                    "file": job.filename,
+                    "raw_chars": raw_chars,
+                    "clean_chars": len(cleaned),
+                    "tokens": token_count,
+                    "extract_ms": extract_ms,
+                    "elapsed_ms": timer.ms(),
+                },
+            )
+
+        except asyncio.CancelledError:
+            status = "interrupted" if self._stopping else "cancelled"
+            raise
+        except Exception as e:
+            logger.error("❌ Summary job %s failed: %s", job.id, e, exc_info=True)
+            error = str(e)
+
+        finally:
+            job.end(status, error, elapsed_ms=timer.ms())
+            job.task = None
+            self._job_s = 0.8 * self._job_s + 0.2 * (timer.ms() / 1000)
+            inc("summary_jobs", outcome=job.status)
+            await asyncio.shield(asyncio.to_thread(self._finish_files, job))
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": self._running,
+            "jobs": len(self._jobs),
+        }
+
+
+jobs = JobStore()
+register_gauge("summary_jobs", jobs.stats)
@@ -0,0 +1,64 @@
+"""
+Tenant identification and per-tenant concurrency limits.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+from config import TENANT_HEADER, TRUST_TENANT_HEADER, TRUSTED_PROXY_HOPS
+
+
+def tenant_id(request):
+    """
+    Tenant a request belongs to.
+
+    Only identities a client can't choose count: the TENANT_HEADER value when
+    the gateway sets it (TRUST_TENANT_HEADER), else the client address the
+    last of TRUSTED_PROXY_HOPS proxies saw in X-Forwarded-For, else the
+    connection's address.
+    """
+    if TRUST_TENANT_HEADER:
+        tenant = request.headers.get(TENANT_HEADER)
+        if tenant and tenant.strip():
+            return tenant.strip()
+    if TRUSTED_PROXY_HOPS:
+        # Each proxy appends the address it received from; entries further left are client-supplied
+        hops = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+        if len(hops) >= TRUSTED_PROXY_HOPS:
+            return hops[-TRUSTED_PROXY_HOPS]
+    return request.client.host if request.client else "anonymous"
+
+
+class TenantLimiter:
+    """
+    At most `limit` concurrent slots per tenant, shared by every request of
+    that tenant. Idle tenants are forgotten, so arbitrary header values can't
+    grow the table.
+    """
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self._semaphores = {}
+        self._users = {}
+
+    @asynccontextmanager
+    async def slot(self, tenant):
+        semaphore = self._semaphores.get(tenant)
+        if semaphore is None:
+            semaphore = self._semaphores[tenant] = asyncio.Semaphore(self.limit)
+        self._users[tenant] = self._users.get(tenant, 0) + 1
+        try:
+            async with semaphore:
+                yield
+        finally:
+            self._users[tenant] -= 1
+            if not self._users[tenant]:
+                del self._users[tenant]
+                del self._semaphores[tenant]
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "tenants": len(self._semaphores),
+            "waiting_or_active": sum(self._users.values()),
+        }
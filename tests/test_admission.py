@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from services.admission import AdmissionController, Rejected, controller_for
+
+
+def test_new_tenant_is_not_blocked_by_a_tenant_over_its_share():
+    async def scenario():
+        controller = AdmissionController("/test", 4, tenant_share=0.5, queue_timeout=0.5)
+        held = [await controller.admit("a"), await controller.admit("a")]
+
+        # Tenant a is at its share: its next request waits at the head of the queue
+        blocked = asyncio.ensure_future(controller.admit("a"))
+        await asyncio.sleep(0)
+        assert controller.stats()["queued"] == 1
+
+        # Tenant b arrives behind it while 2 of 4 slots are free, and gets one at once
+        ticket = await asyncio.wait_for(controller.admit("b"), 0.1)
+        assert controller.stats()["in_flight"] == 3
+        assert controller.stats()["queued"] == 1
+
+        with pytest.raises(Rejected) as rejected:
+            await blocked
+        assert rejected.value.status == 429
+
+        for t in held + [ticket]:
+            t.release()
+        assert controller.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_templated_routes_are_admitted():
+    assert controller_for("/documents/3f2a9c/ask").route == "/documents/{session_id}/ask"
+    assert controller_for("/ask").route == "/ask"
+    assert controller_for("/documents/3f2a9c") is None
+    assert controller_for("/documents/a/b/ask") is None
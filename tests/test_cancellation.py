@@ -0,0 +1,87 @@
+import asyncio
+from contextlib import aclosing
+
+from utils import metrics
+from utils.cancellation import DisconnectWatcher
+
+
+class _Request:
+    """Stand-in for a Starlette request whose client goes away when `disconnect` is set."""
+
+    def __init__(self):
+        self.disconnect = asyncio.Event()
+
+    async def is_disconnected(self):
+        return self.disconnect.is_set()
+
+
+def _abandoned(route, stage):
+    return metrics.snapshot()["counters"].get(f"abandoned{{route={route},stage={stage}}}", 0)
+
+
+def test_disconnect_closes_the_llm_stream_mid_generation():
+    async def scenario():
+        request = _Request()
+        watch = DisconnectWatcher(request, "/test-generation", interval=0.01)
+        upstream = {"tokens": 0, "closed": False}
+
+        async def llm_stream():
+            try:
+                while True:
+                    upstream["tokens"] += 1
+                    yield "token"
+                    await asyncio.sleep(0.005)
+            finally:
+                upstream["closed"] = True
+
+        async def pipeline():
+            watch.stage = "generation"
+            async with aclosing(llm_stream()) as tokens:
+                async for token in tokens:
+                    yield token
+
+        received = []
+        async for chunk in watch.stream(pipeline()):
+            received.append(chunk)
+            if len(received) == 3:
+                request.disconnect.set()
+
+        assert watch.disconnected
+        assert upstream["closed"]
+        # Nothing is produced once the pipeline is cancelled
+        produced = upstream["tokens"]
+        await asyncio.sleep(0.05)
+        assert upstream["tokens"] == produced
+        assert _abandoned("/test-generation", "generation") == 1
+
+    asyncio.run(scenario())
+
+
+def test_disconnect_cancels_the_running_stage():
+    async def scenario():
+        request = _Request()
+        watch = DisconnectWatcher(request, "/test-retrieval", interval=0.01)
+        stage = {"cancelled": False, "generated": False}
+
+        async def pipeline():
+            watch.stage = "retrieval"
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                stage["cancelled"] = True
+                raise
+            stage["generated"] = True
+            yield "token"
+
+        async def client():
+            return [chunk async for chunk in watch.stream(pipeline())]
+
+        task = asyncio.create_task(client())
+        await asyncio.sleep(0.02)
+        request.disconnect.set()
+
+        assert await asyncio.wait_for(task, 1) == []
+        assert stage == {"cancelled": True, "generated": False}
+        assert _abandoned("/test-retrieval", "retrieval") == 1
+
+    asyncio.run(scenario())
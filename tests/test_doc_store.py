@@ -0,0 +1,41 @@
+from utils import doc_store
+from utils.doc_store import DocStore, write_store
+
+RECORDS = [
+    ("lei-1#0", {"text": "Art. 1º Todo poder emana do povo.", "state": "Federal", "title": "Constituição"}),
+    ("lei-2#3", {"text": "§ 2º O prazo é de quinze dias.", "state": "Maranhão", "section": "§ 2º"}),
+    ("lei-3#1", {"text": "", "state": "São Paulo"}),
+]
+
+
+def test_write_open_get_round_trip(tmp_path):
+    path = str(tmp_path / "chunks.vds")
+    assert write_store(path, RECORDS) == 3
+
+    store = DocStore(path)
+    try:
+        assert len(store) == 3
+        assert store.fields == doc_store.STORE_FIELDS
+        for chunk_id, values in RECORDS:
+            expected = {field: values.get(field) for field in doc_store.STORE_FIELDS}
+            assert store.get(chunk_id) == expected
+        assert store.get("lei-9#9") is None
+    finally:
+        store.close()
+
+
+def test_ids_sharing_a_hash_are_told_apart(tmp_path, monkeypatch):
+    # Every id hashes to one of two values, so lookups must compare the stored ids
+    monkeypatch.setattr(doc_store, "id_hash", lambda chunk_id: len(str(chunk_id)) % 2)
+    path = str(tmp_path / "chunks.vds")
+    write_store(path, RECORDS + [("x", {"text": "odd"}), ("yy", {"text": "even"})])
+
+    store = DocStore(path)
+    try:
+        assert store.get("lei-2#3")["text"] == "§ 2º O prazo é de quinze dias."
+        assert store.get("x")["text"] == "odd"
+        assert store.get("yy")["text"] == "even"
+        assert store.get("zz") is None
+        assert store.get("z") is None
+    finally:
+        store.close()
@@ -0,0 +1,36 @@
+import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from services import extract
+from services.extract import _drop_page_numbers, clean_text, extract_text, segment_pages
+
+
+def test_inline_amounts_are_kept():
+    assert clean_text("O valor é de\n1500\nreais por mês.") == "O valor é de 1500 reais por mês."
+    assert extract_text("Tabela\n100\n200\n".encode(), "valores.txt") == "Tabela\n100\n200"
+
+
+def test_pdf_page_numbers_are_dropped_only_at_the_page_edges():
+    page = "Página 3 de 10\nO valor é de\n1500\nreais por mês.\n  \n12\n"
+    assert _drop_page_numbers(page) == "O valor é de\n1500\nreais por mês.\n  \n"
+    assert clean_text(_drop_page_numbers(page)) == "O valor é de 1500 reais por mês."
+
+
+def test_forced_splits_leave_no_empty_or_space_led_segments():
+    segments = list(segment_pages(["palavra " * 60 + "fim.", "Outra linha."], max_chars=50))
+    assert len(segments) > 1
+    assert all(s.text and s.text == s.text.strip() and len(s.text) <= 50 for s in segments)
+
+
+def test_a_crashed_worker_does_not_break_later_extractions():
+    pool = extract._get_pool()
+    # A worker dying mid-task (as on an OOM kill) breaks the whole pool
+    with pytest.raises(BrokenProcessPool):
+        pool.submit(os._exit, 1).result()
+
+    text = asyncio.run(extract.extract_text_from_file_bytes(b"Art. 1\nTexto.", "lei.txt"))
+    assert text == "Art. 1\nTexto."
+    assert extract._get_pool() is not pool
@@ -0,0 +1,46 @@
+import os
+from types import SimpleNamespace
+
+os.environ.setdefault("PINECONE_API_KEY", "test")
+os.environ.setdefault("PINECONE_INDEX_HOST", "http://localhost:1")
+
+from utils.doc_store import DocStore, write_store
+from utils.pinecode import hydrate_matches
+
+
+class _Index:
+    """Index stand-in whose fetch only finds a vector in the namespace it lives in."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors  # {(namespace, id): metadata}
+        self.fetches = []
+
+    def fetch(self, ids, namespace=""):
+        self.fetches.append((namespace, sorted(ids)))
+        found = {i: SimpleNamespace(metadata=self.vectors[namespace, i]) for i in ids if (namespace, i) in self.vectors}
+        return SimpleNamespace(vectors=found)
+
+
+def test_ids_missing_from_the_store_are_fetched_from_their_namespace(tmp_path):
+    path = str(tmp_path / "chunks.vds")
+    write_store(path, [("federal-1", {"text": "Do store", "state": "Federal"})])
+    store = DocStore(path)
+    idx = _Index({
+        ("federal", "federal-2"): {"text": "Federal novo", "state": "Federal"},
+        ("maranhao", "ma-7"): {"text": "Estadual novo", "state": "Maranhão"},
+        ("", "legacy-3"): {"text": "Sem partição", "state": "Federal"},
+    })
+    matches = [
+        {"id": "ma-7", "score": 0.9, "namespace": "maranhao"},
+        {"id": "federal-1", "score": 0.8, "namespace": "federal"},
+        {"id": "federal-2", "score": 0.7, "namespace": "federal"},
+        {"id": "legacy-3", "score": 0.6},
+    ]
+    try:
+        records = hydrate_matches(matches, store=store, idx=idx)
+    finally:
+        store.close()
+
+    assert [r.text for r in records] == ["Estadual novo", "Do store", "Federal novo", "Sem partição"]
+    assert [r.score for r in records] == [0.9, 0.8, 0.7, 0.6]
+    assert sorted(idx.fetches) == [("", ["legacy-3"]), ("federal", ["federal-2"]), ("maranhao", ["ma-7"])]
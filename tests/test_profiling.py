@@ -0,0 +1,32 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import admin
+from utils import profiling
+
+
+def test_token_check_refuses_instead_of_raising(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "s3cret")
+    assert profiling.token_ok("s3cret")
+    assert not profiling.token_ok("sécret")
+    assert not profiling.token_ok("")
+    assert not profiling.token_ok(None)
+
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "")
+    assert not profiling.token_ok("")
+
+
+def test_metrics_need_the_admin_token(monkeypatch):
+    app = FastAPI()
+    app.include_router(admin.router)
+    client = TestClient(app)
+
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", None)
+    assert client.get("/metrics").status_code == 404
+
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "s3cret")
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers={"X-Profile-Token": "wrong"}).status_code == 403
+    response = client.get("/metrics", headers={"X-Profile-Token": "s3cret"})
+    assert response.status_code == 200
+    assert set(response.json()) == {"counters", "gauges"}
@@ -0,0 +1,106 @@
+import asyncio
+
+from services.singleflight import SingleFlight
+
+
+class _Upstream:
+    """Async generator stand-in that emits tokens when told to and records how it ended."""
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.started = 0
+        self.closed = False
+
+    def __call__(self):
+        self.started += 1
+        return self._gen()
+
+    async def _gen(self):
+        try:
+            while True:
+                item = await self.queue.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self.closed = True
+
+
+async def _collect(stream, into):
+    async for token in stream:
+        into.append(token)
+
+
+def test_late_joiner_gets_the_replayed_prefix():
+    async def scenario():
+        flights, upstream = SingleFlight("test-replay"), _Upstream()
+        first, late = [], []
+        first_task = asyncio.create_task(_collect(flights.stream("k", upstream), first))
+        await upstream.queue.put("a")
+        await upstream.queue.put("b")
+        while len(first) < 2:
+            await asyncio.sleep(0)
+
+        late_task = asyncio.create_task(_collect(flights.stream("k", upstream), late))
+        await asyncio.sleep(0)
+        await upstream.queue.put("c")
+        await upstream.queue.put(None)
+        await asyncio.wait_for(asyncio.gather(first_task, late_task), 1)
+
+        assert first == late == ["a", "b", "c"]
+        assert upstream.started == 1
+        assert flights.stats() == {"in_flight": 0, "subscribers": 0}
+
+    asyncio.run(scenario())
+
+
+def test_last_subscriber_leaving_cancels_upstream_and_detaches():
+    async def scenario():
+        flights, upstream = SingleFlight("test-cancel"), _Upstream()
+        got = [[], []]
+        tasks = [asyncio.create_task(_collect(flights.stream("k", upstream), g)) for g in got]
+        await upstream.queue.put("a")
+        while not all(got):
+            await asyncio.sleep(0)
+
+        # One subscriber leaving keeps the generation going for the other
+        tasks[0].cancel()
+        await asyncio.sleep(0)
+        assert flights.stats() == {"in_flight": 1, "subscribers": 1}
+        assert not upstream.closed
+
+        tasks[1].cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        assert flights.stats() == {"in_flight": 0, "subscribers": 0}
+        for _ in range(10):
+            await asyncio.sleep(0)
+        assert upstream.closed
+
+        # The key is free again: the next request starts a fresh generation
+        fresh = []
+        task = asyncio.create_task(_collect(flights.stream("k", upstream), fresh))
+        await upstream.queue.put("z")
+        await upstream.queue.put(None)
+        await asyncio.wait_for(task, 1)
+        assert fresh == ["z"]
+        assert upstream.started == 2
+
+    asyncio.run(scenario())
+
+
+def test_upstream_error_reaches_every_subscriber():
+    async def scenario():
+        flights, upstream = SingleFlight("test-error"), _Upstream()
+        got = [[], []]
+        tasks = [asyncio.create_task(_collect(flights.stream("k", upstream), g)) for g in got]
+        await upstream.queue.put("a")
+        await upstream.queue.put(RuntimeError("upstream down"))
+        await asyncio.wait_for(asyncio.gather(*tasks), 1)
+
+        assert got[0] == got[1] == ["a", "[ERROR: upstream down]"]
+        assert upstream.closed
+        assert flights.stats() == {"in_flight": 0, "subscribers": 0}
+
+    asyncio.run(scenario())
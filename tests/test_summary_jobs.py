@@ -0,0 +1,120 @@
+import asyncio
+import json
+import os
+from contextlib import aclosing
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import summary_jobs as summary_jobs_route
+from services import summary_jobs
+
+
+def _fake_pipeline(monkeypatch, release):
+    """Extraction returns the upload as text; the summary emits two tokens, then waits for `release`."""
+    async def extract(content, filename):
+        return len(content), content.decode()
+
+    async def summarize(text, lang):
+        for token in ("Resumo", " parcial"):
+            yield f"data: {json.dumps({'token': token})}\n\n"
+        await release.wait()
+        for token in (" final.", "[DONE]"):
+            yield f"data: {json.dumps({'token': token})}\n\n"
+
+    monkeypatch.setattr(summary_jobs, "extract_clean_in_pool", extract)
+    monkeypatch.setattr(summary_jobs, "stream_summary_dual", summarize)
+
+
+async def _follow(events, limit=None):
+    """(index, event) pairs from a job's event stream, dropping the connection after `limit`."""
+    received = []
+    async with aclosing(events):
+        async for index, data in events:
+            received.append((index, json.loads(data)))
+            if len(received) == limit:
+                break
+    return received
+
+
+def test_followers_resume_after_the_last_event_they_saw(tmp_path, monkeypatch):
+    store = summary_jobs.JobStore(directory=str(tmp_path), workers=1)
+
+    async def scenario():
+        release = asyncio.Event()
+        _fake_pipeline(monkeypatch, release)
+        await store.start()
+        job = await store.submit("tenant", "lei.txt", "Art. 1 Texto.".encode(), "pt")
+
+        # queued, extracting, summarizing, "Resumo", " parcial" - then the connection drops
+        seen = await _follow(store.events(job), limit=5)
+        assert [index for index, _ in seen] == [0, 1, 2, 3, 4]
+
+        # Reconnecting while the job runs, from the next offset, gets the rest exactly once
+        release.set()
+        rest = await _follow(store.events(job, seen[-1][0] + 1))
+        assert [index for index, _ in rest] == [5, 6, 7]
+        assert [event.get("token") for _, event in rest] == [" final.", "[DONE]", None]
+        assert rest[-1][1]["status"] == "done"
+        assert await store.summary(job) == "Resumo parcial final."
+        # Stopping right after a job ends must not hang the worker
+        await asyncio.wait_for(store.stop(), 1)
+        return job.id
+
+    job_id = asyncio.run(scenario())
+
+    # Once the job has ended its events come from the log on disk; Last-Event-ID resumes there too
+    monkeypatch.setattr(summary_jobs_route, "jobs", store)
+    app = FastAPI()
+    app.include_router(summary_jobs_route.router)
+    with TestClient(app) as client:
+        response = client.get(f"/summarize-file/jobs/{job_id}/events", headers={"Last-Event-ID": "5"})
+    ids = [line[len("id: "):] for line in response.text.splitlines() if line.startswith("id: ")]
+    assert ids == ["6", "7"]
+
+
+def test_cancelling_a_job_keeps_its_worker(tmp_path, monkeypatch):
+    store = summary_jobs.JobStore(directory=str(tmp_path), workers=1)
+
+    async def scenario():
+        release = asyncio.Event()
+        _fake_pipeline(monkeypatch, release)
+        await store.start()
+        first = await store.submit("tenant", "a.txt", "Art. 1 Texto.".encode(), "pt")
+        await _follow(store.events(first), limit=5)
+        assert await store.cancel(first.id)
+        assert first.status == "cancelled"
+
+        release.set()
+        second = await store.submit("tenant", "b.txt", "Art. 2 Texto.".encode(), "pt")
+        events = await asyncio.wait_for(_follow(store.events(second)), 1)
+        assert events[-1][1]["status"] == "done"
+        await asyncio.wait_for(store.stop(), 1)
+
+    asyncio.run(scenario())
+
+
+def test_expired_jobs_are_swept_while_idle(tmp_path, monkeypatch):
+    store = summary_jobs.JobStore(directory=str(tmp_path), workers=1, ttl=0, sweep_interval=0.01)
+
+    async def scenario():
+        release = asyncio.Event()
+        release.set()
+        _fake_pipeline(monkeypatch, release)
+        await store.start()
+        job = await store.submit("tenant", "lei.txt", "Art. 1 Texto.".encode(), "pt")
+        await _follow(store.events(job))
+
+        # No further submissions: only the sweeper can delete the finished job
+        for _ in range(100):
+            if not os.listdir(tmp_path):
+                break
+            await asyncio.sleep(0.01)
+        await store.stop()
+        return job.id
+
+    job_id = asyncio.run(scenario())
+    assert os.listdir(tmp_path) == []
+    assert store.get(job_id) is None
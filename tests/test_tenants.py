@@ -0,0 +1,23 @@
+from starlette.requests import Request
+
+from services import tenants
+
+
+def _request(headers, client="10.0.0.1"):
+    raw = [(k.lower().encode(), v.encode()) for k, v in headers.items()]
+    return Request({"type": "http", "headers": raw, "client": (client, 1234)})
+
+
+def test_client_chosen_identities_are_ignored_by_default(monkeypatch):
+    monkeypatch.setattr(tenants, "TRUST_TENANT_HEADER", False)
+    monkeypatch.setattr(tenants, "TRUSTED_PROXY_HOPS", 0)
+    request = _request({"X-Tenant-Id": "spoofed", "X-Forwarded-For": "1.2.3.4"})
+    assert tenants.tenant_id(request) == "10.0.0.1"
+
+
+def test_trusted_header_and_forwarded_address(monkeypatch):
+    monkeypatch.setattr(tenants, "TRUST_TENANT_HEADER", True)
+    monkeypatch.setattr(tenants, "TRUSTED_PROXY_HOPS", 1)
+    assert tenants.tenant_id(_request({"X-Tenant-Id": "acme"})) == "acme"
+    # The left entry was sent by the client; the one the proxy appended wins
+    assert tenants.tenant_id(_request({"X-Forwarded-For": "6.6.6.6, 203.0.113.7"})) == "203.0.113.7"
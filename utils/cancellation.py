@@ -0,0 +1,106 @@
+"""
+Cooperative cancellation of streaming pipelines when the client disconnects.
+
+A route's pipeline (an async generator producing response chunks) runs in
+its own task. A watcher polls the connection; when the client goes away the
+pipeline task is cancelled wherever it is - conversation summarization,
+retrieval, extraction or the LLM stream - so the OpenAI response is closed
+and dispatcher / tenant slots are released immediately instead of after the
+work runs to completion. Abandoned pipelines are counted per route and stage
+on /metrics (abandoned{route=...,stage=...}).
+
+Blocking work already handed to a thread keeps running to completion in
+that thread (it can't be interrupted), but its result is dropped and nothing
+downstream of it starts; extraction jobs still queued for the process pool
+are cancelled before they start.
+"""
+import asyncio
+import logging
+from contextlib import aclosing
+
+from config import DISCONNECT_POLL_INTERVAL
+from utils.log import Timer
+from utils.metrics import inc
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+class DisconnectWatcher:
+    """
+    Runs a pipeline and cancels it when the client disconnects.
+
+    Pipelines update `stage` as they go, so abandoned work is attributed to
+    the step that was running.
+
+    Usage:
+        watch = DisconnectWatcher(request, "/ask")
+
+        async def pipeline():
+            watch.stage = "retrieval"
+            ...
+            yield chunk
+
+        return StreamingResponse(watch.stream(pipeline()), ...)
+    """
+
+    def __init__(self, request, route, interval=DISCONNECT_POLL_INTERVAL):
+        self.request = request
+        self.route = route
+        self.interval = interval
+        self.stage = "start"
+        self.disconnected = False
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if await self.request.is_disconnected():
+                self.disconnected = True
+                return
+
+    async def _produce(self, source, queue):
+        async with aclosing(source):
+            async for item in source:
+                await queue.put(item)
+        await queue.put(_END)
+
+    async def stream(self, source):
+        """
+        Yield `source`'s items until it finishes or the client disconnects.
+
+        Exceptions raised by `source` are re-raised here.
+        """
+        queue = asyncio.Queue(maxsize=1)
+        producer = asyncio.create_task(self._produce(source, queue))
+        watcher = asyncio.create_task(self._watch())
+        getter = None
+        try:
+            while True:
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait({getter, watcher, producer}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    if watcher.done() or producer.cancelled() or producer.exception() is not None:
+                        getter.cancel()
+                        break
+                    # The producer finished normally; its end marker is already queued
+                    await getter
+                item = getter.result()
+                if item is _END:
+                    break
+                yield item
+        finally:
+            watcher.cancel()
+            if getter is not None:
+                getter.cancel()
+            if not producer.done():
+                # Disconnected (or the server is tearing the response down): stop all remaining work
+                inc("abandoned", route=self.route, stage=self.stage)
+                logger.warning("⚠️  Client disconnected, cancelling pipeline", extra={"route": self.route, "stage": self.stage})
+                timer = Timer()
+                producer.cancel()
+                # Wait for upstream streams to close; may itself be cancelled if the server is shutting down
+                await asyncio.gather(producer, return_exceptions=True)
+                logger.debug("🧹 Pipeline cleaned up", extra={"route": self.route, "cleanup_ms": timer.ms()})
+            elif not producer.cancelled() and producer.exception() is not None:
+                raise producer.exception()
@@ -1,140 +1,195 @@
 """
 Utilities for processing and formatting document chunks.
+
+Retrieved matches are normalized once into compact ChunkRecord objects; the
+formatted [REFERENCE] body of each chunk id is cached, and only the reference
+number is filled in when the prompt is assembled.
 """
 import logging
 
+from config import REFERENCE_CACHE_SIZE, REFERENCE_CACHE_TTL
+from utils.lru import LRUCache
+from utils.metrics import register_gauge
+
+logger = logging.getLogger(__name__)
+
+# Try all possible text field names
+TEXT_FIELDS = (
+    'text',
+    'raw_text',
+    'content',
+    'page_content',  # Common in LangChain
+    'chunk_text',
+    'body',
+    'article_text',
+    'document_text',
+)
+
+_reference_cache = LRUCache(REFERENCE_CACHE_SIZE, ttl=REFERENCE_CACHE_TTL)
+register_gauge("reference_cache", _reference_cache.stats)
+
+
+class ChunkRecord:
+    """
+    Normalized retrieved chunk.
+
+    Supports `get()` with the old dict keys so callers that treated chunks as
+    dicts keep working.
+    """
+    __slots__ = ("id", "score", "text", "source", "url", "doc_type", "country", "state", "title", "chapter", "section")
+
+    def __init__(self, id=None, score=0.0, text="", source="Unknown", url="", doc_type="N/A",
+                 country="N/A", state="N/A", title="Unknown", chapter=None, section=None):
+        self.id = id
+        self.score = score
+        self.text = text
+        self.source = source
+        self.url = url
+        self.doc_type = doc_type
+        self.country = country
+        self.state = state
+        self.title = title
+        self.chapter = chapter
+        self.section = section
+
+    def get(self, key, default=None):
+        if key == "type":
+            key = "doc_type"
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        return default if value is None else value
+
+    def __repr__(self):
+        return f"ChunkRecord(id={self.id!r}, score={self.score:.4f}, title={self.title!r}, text_chars={len(self.text)})"
+
+
+def _resolve_url(chunk, metadata):
+    """Planalto URL from any of the known fields, else a non-planalto source_url, else ''."""
+    url = (
+        metadata.get('url') or
+        metadata.get('source_url') or
+        metadata.get('source') or
+        chunk.get('source') or
+        chunk.get('url') or
+        ''
+    )
+    if url and isinstance(url, str) and 'planalto.gov.br' in url.lower():
+        return url
+    return metadata.get('source_url') or ''
+
+
+def normalize_chunk(chunk):
+    """
+    Build a ChunkRecord from a retrieval match or a legacy chunk dict.
+
+    Args:
+        chunk: Pinecone match, chunk dictionary or an existing ChunkRecord
+
+    Returns:
+        ChunkRecord
+    """
+    if isinstance(chunk, ChunkRecord):
+        return chunk
+    metadata = chunk.get('metadata') or {}
+    return ChunkRecord(
+        id=chunk.get('id'),
+        score=float(chunk.get('score') or 0),
+        text=extract_text_from_chunk(chunk),
+        source=metadata.get('source', 'Unknown'),
+        url=_resolve_url(chunk, metadata),
+        doc_type=metadata.get('type', 'N/A'),
+        country=metadata.get('country', 'N/A'),
+        state=metadata.get('state', 'N/A'),
+        title=metadata.get('title') or chunk.get('title') or 'Unknown',
+        chapter=metadata.get('chapter', chunk.get('chapter')),
+        section=metadata.get('section', chunk.get('section')),
+    )
+
+
+def normalize_chunks(chunks):
+    """Normalize a list of chunks (records pass through untouched)."""
+    return [normalize_chunk(c) for c in chunks]
+
 
 def ensure_chunk_metadata(chunks):
     """
     Ensure all chunks have properly extracted URLs in metadata.
-    
+
+    Kept for existing callers; chunks are now normalized into ChunkRecord
+    objects whose `url` is already resolved.
+
     Args:
-        chunks: List of chunk dictionaries
-    
+        chunks: List of chunk dictionaries or records
+
     Returns:
-        List of processed chunks with proper metadata
+        List of ChunkRecord
     """
-    processed_chunks = []
-    for chunk in chunks:
-        # Make a copy to avoid mutating original
-        processed = dict(chunk)
-        
-        if 'metadata' not in processed:
-            processed['metadata'] = {}
-        
-        metadata = processed['metadata']
-        
-        # Try multiple ways to extract URL
-        url = (
-            metadata.get('url') or 
-            metadata.get('source_url') or 
-            metadata.get('source') or 
-            chunk.get('source') or 
-            chunk.get('url') or
-            ''
-        )
-        
-        # Ensure URL is a string and looks like a planalto URL
-        if url and isinstance(url, str) and 'planalto.gov.br' in url.lower():
-            metadata['url'] = url
-        else:
-            metadata['url'] = ''
-            
-        processed_chunks.append(processed)
-    
-    return processed_chunks
+    return normalize_chunks(chunks)
 
 
 def extract_text_from_chunk(chunk):
     """
     Try multiple field names to extract text content from chunk.
-    
+
     Args:
         chunk: Chunk dictionary
-    
+
     Returns:
         Text content or empty string
     """
-    # Try all possible text field names
-    text_fields = [
-        'text',
-        'raw_text', 
-        'content',
-        'page_content',  # Common in LangChain
-        'chunk_text',
-        'body',
-        'article_text',
-        'document_text',
-    ]
-    
-    for field in text_fields:
+    for field in TEXT_FIELDS:
         text = chunk.get(field)
         if text and isinstance(text, str) and text.strip():
-            logging.debug(f"✅ Found text in field '{field}' | length={len(text)}")
             return text
-    
+
     # Check if text is nested in metadata - CRITICAL FIX!
-    metadata = chunk.get('metadata', {})
-    
+    metadata = chunk.get('metadata') or {}
+
     # First check text_preview in metadata (your database uses this!)
     text_preview = metadata.get('text_preview')
     if text_preview and isinstance(text_preview, str) and text_preview.strip():
-        logging.debug(f"✅ Found text in metadata['text_preview'] | length={len(text_preview)}")
         return text_preview
-    
+
     # Then check other possible metadata fields
-    for field in text_fields:
+    for field in TEXT_FIELDS:
         text = metadata.get(field)
         if text and isinstance(text, str) and text.strip():
-            logging.debug(f"✅ Found text in metadata['{field}'] | length={len(text)}")
             return text
-    
-    logging.warning(f"⚠️  No text found in chunk with keys: {list(chunk.keys())}")
+
+    logger.warning("⚠️  No text found in chunk %s", chunk.get('id'))
     return ''
 
 
+def _reference_body(record):
+    """Everything between the [REFERENCE n] and [END REFERENCE n] lines."""
+    return f"""📘 Source Document: {record.source}
+🔗 EXACT URL TO CITE: {record.url if record.url else '[URL NOT AVAILABLE IN DATABASE]'}
+🧾 Type: {record.doc_type} | Jurisdiction: {record.country}/{record.state}
+
+Content:
+{record.text}"""
+
+
 def format_context_chunk(chunk, index):
     """
     Format a single context chunk with metadata and reference number.
-    
+
     Args:
-        chunk: Chunk dictionary with text and metadata
+        chunk: ChunkRecord (or chunk dictionary) with text and metadata
         index: Reference index number
-    
+
     Returns:
         Formatted string representation of the chunk
     """
-    metadata = chunk.get('metadata', {})
-    
-    # Use the improved text extraction
-    text = extract_text_from_chunk(chunk)
-    
-    if not text:
-        logging.error(f"❌ EMPTY TEXT for chunk {index+1} | chunk keys: {list(chunk.keys())}")
-        if metadata:
-            logging.error(f"   metadata keys: {list(metadata.keys())}")
-    
-    source = metadata.get('source', 'Unknown')
-    doc_type = metadata.get('type', 'N/A')
-    country = metadata.get('country', 'N/A')
-    state = metadata.get('state', 'N/A')
-    
-    # CRITICAL: Extract URL from metadata or construct from source
-    url = metadata.get('url') or metadata.get('source_url') or ''
-    
-    # If no URL in metadata but we have a source field that looks like a URL
-    if not url and source and 'planalto.gov.br' in str(source).lower():
-        url = source
-    
-    # Create structured context with clear reference number
-    formatted = f"""[REFERENCE {index + 1}]
-📘 Source Document: {source}
-🔗 EXACT URL TO CITE: {url if url else '[URL NOT AVAILABLE IN DATABASE]'}
-🧾 Type: {doc_type} | Jurisdiction: {country}/{state}
+    record = normalize_chunk(chunk)
 
-Content:
-{text}
+    if not record.text:
+        logger.error("❌ EMPTY TEXT for chunk %d | id=%s", index + 1, record.id)
 
-[END REFERENCE {index + 1}]"""
-    
-    return formatted.strip()
\ No newline at end of file
+    body = _reference_cache.get(record.id) if record.id else None
+    if body is None:
+        body = _reference_body(record)
+        if record.id:
+            _reference_cache.put(record.id, body)
+
+    # Create structured context with clear reference number
+    return f"[REFERENCE {index + 1}]\n{body}\n\n[END REFERENCE {index + 1}]"
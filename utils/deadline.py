@@ -0,0 +1,74 @@
+"""
+Request-scoped deadline budgets with a graceful degradation ladder.
+
+A route starts a Deadline at the top of its pipeline; every stage reads it
+through `current()` (a context variable, so it follows the request into
+tasks and `asyncio.to_thread` calls). Optional work consults the ladder
+(config.DEADLINE_LADDER): each step names the remaining budget below which
+it applies, e.g. skip_summary=5000 means the conversation summary may only
+run while at least 5s of budget would remain. Applied steps are recorded on
+the deadline and reported with the response.
+"""
+import contextvars
+import time
+
+from config import DEADLINE_LADDER
+from utils.metrics import inc
+
+_current = contextvars.ContextVar("deadline", default=None)
+
+
+class Deadline:
+    """Time budget for one request, plus the degradations applied to it."""
+
+    def __init__(self, budget_ms, ladder=None, route=None):
+        self.budget_ms = budget_ms
+        self.ladder = DEADLINE_LADDER if ladder is None else ladder
+        self.route = route
+        self.degradations = []
+        self._expires = time.monotonic() + budget_ms / 1000
+
+    def remaining_ms(self):
+        return max(0.0, (self._expires - time.monotonic()) * 1000)
+
+    def allowance(self, step):
+        """
+        Seconds the work guarded by `step` may take before the step applies.
+
+        Returns:
+            None when `step` isn't on the ladder (no limit), else a
+            non-negative number of seconds
+        """
+        threshold = self.ladder.get(step)
+        if threshold is None:
+            return None
+        return max(0.0, (self.remaining_ms() - threshold) / 1000)
+
+    def below(self, step):
+        """True when the remaining budget is already below `step`'s threshold."""
+        threshold = self.ladder.get(step)
+        return threshold is not None and self.remaining_ms() < threshold
+
+    def should_degrade(self, step):
+        """Like below(), but records the step when it applies."""
+        if self.below(step):
+            self.record(step)
+            return True
+        return False
+
+    def record(self, step):
+        if step not in self.degradations:
+            self.degradations.append(step)
+            inc("degraded", route=self.route, step=step)
+
+
+def start(budget_ms, ladder=None, route=None):
+    """Start a deadline for the current request context and return it."""
+    deadline = Deadline(budget_ms, ladder, route)
+    _current.set(deadline)
+    return deadline
+
+
+def current():
+    """The running request's Deadline, or None outside a budgeted request."""
+    return _current.get()
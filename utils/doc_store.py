@@ -0,0 +1,138 @@
+"""
+Local memory-mapped chunk store keyed by chunk id.
+
+Holds the canonical chunk text and citation fields so vector queries can
+return ids and scores only. File layout (little-endian):
+
+    header   "VDS1" | u32 count | u64 index_offset | u16 n_fields | field names (u8 len + utf-8)...
+    records  per record: u16 id_len | id | per field: u32 len (0xFFFFFFFF = None) | utf-8 bytes
+    index    count x (u64 id_hash | u64 record_offset), sorted by id_hash
+
+Lookups hash the id, binary-search the index in the mapped file and decode a
+single record; nothing is loaded into the Python heap up front.
+"""
+import hashlib
+import mmap
+import os
+import struct
+
+MAGIC = b"VDS1"
+STORE_FIELDS = ("text", "source", "url", "doc_type", "country", "state", "title", "chapter", "section")
+
+_HEADER = struct.Struct("<4sIQH")
+_INDEX_ENTRY = struct.Struct("<QQ")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_NONE = 0xFFFFFFFF
+
+
+def id_hash(chunk_id):
+    return int.from_bytes(hashlib.blake2b(str(chunk_id).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def write_store(path, records, fields=STORE_FIELDS):
+    """
+    Write a store atomically.
+
+    Args:
+        path: Destination file
+        records: Iterable of (chunk_id, {field: value}) pairs
+        fields: Field names, in on-disk order
+
+    Returns:
+        Number of records written
+    """
+    tmp_path = f"{path}.tmp"
+    entries = []
+    with open(tmp_path, "wb") as fh:
+        field_names = b"".join(bytes([len(f)]) + f.encode("ascii") for f in fields)
+        fh.write(_HEADER.pack(MAGIC, 0, 0, len(fields)) + field_names)
+        for chunk_id, values in records:
+            entries.append((id_hash(chunk_id), fh.tell()))
+            raw_id = str(chunk_id).encode("utf-8")
+            parts = [_U16.pack(len(raw_id)), raw_id]
+            for field in fields:
+                value = values.get(field)
+                if value is None:
+                    parts.append(_U32.pack(_NONE))
+                else:
+                    raw = str(value).encode("utf-8")
+                    parts.append(_U32.pack(len(raw)))
+                    parts.append(raw)
+            fh.write(b"".join(parts))
+
+        entries.sort()
+        index_offset = fh.tell()
+        fh.write(b"".join(_INDEX_ENTRY.pack(h, off) for h, off in entries))
+        fh.seek(0)
+        fh.write(_HEADER.pack(MAGIC, len(entries), index_offset, len(fields)))
+    os.replace(tmp_path, path)
+    return len(entries)
+
+
+class DocStore:
+    """Read-only, memory-mapped view of a store written by write_store."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self._index_offset, n_fields = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a chunk store")
+        pos = _HEADER.size
+        fields = []
+        for _ in range(n_fields):
+            length = self._map[pos]
+            fields.append(self._map[pos + 1:pos + 1 + length].decode("ascii"))
+            pos += 1 + length
+        self.fields = tuple(fields)
+
+    def __len__(self):
+        return self.count
+
+    def _find(self, target):
+        """Offsets of records whose id hashes to `target` (normally exactly one)."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            h, _ = _INDEX_ENTRY.unpack_from(self._map, self._index_offset + mid * _INDEX_ENTRY.size)
+            if h < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        while lo < self.count:
+            h, offset = _INDEX_ENTRY.unpack_from(self._map, self._index_offset + lo * _INDEX_ENTRY.size)
+            if h != target:
+                return
+            yield offset
+            lo += 1
+
+    def _decode(self, offset):
+        (id_len,) = _U16.unpack_from(self._map, offset)
+        pos = offset + _U16.size
+        record_id = self._map[pos:pos + id_len].decode("utf-8")
+        pos += id_len
+        values = {}
+        for field in self.fields:
+            (length,) = _U32.unpack_from(self._map, pos)
+            pos += _U32.size
+            if length == _NONE:
+                values[field] = None
+            else:
+                values[field] = self._map[pos:pos + length].decode("utf-8")
+                pos += length
+        return record_id, values
+
+    def get(self, chunk_id):
+        """Fields for `chunk_id`, or None if the store doesn't have it."""
+        chunk_id = str(chunk_id)
+        for offset in self._find(id_hash(chunk_id)):
+            record_id, values = self._decode(offset)
+            if record_id == chunk_id:
+                return values
+        return None
+
+    def close(self):
+        self._map.close()
+        self._file.close()
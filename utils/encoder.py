@@ -0,0 +1,137 @@
+"""
+Shared embedding model and cached query/context encoders.
+
+The question and the conversation context are embedded separately and fused
+as a weighted sum, so the (short) question embedding is cacheable by text and
+the context embedding is cached per chat until new messages arrive.
+"""
+import hashlib
+import logging
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from config import (
+    EMBEDDING_MODEL,
+    QUERY_EMBEDDING_WEIGHT,
+    CONTEXT_EMBEDDING_WEIGHT,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    CONTEXT_EMBEDDING_CACHE_SIZE,
+    CONTEXT_TEXT_MAX_CHARS,
+)
+from utils.lru import LRUCache
+from utils.metrics import register_gauge
+
+logger = logging.getLogger(__name__)
+
+# One model instance for the whole process
+model = SentenceTransformer(EMBEDDING_MODEL)
+
+_query_cache = LRUCache(QUERY_EMBEDDING_CACHE_SIZE)
+_context_cache = LRUCache(CONTEXT_EMBEDDING_CACHE_SIZE)
+
+register_gauge("embedding_cache", lambda: {"query": _query_cache.stats(), "context": _context_cache.stats()})
+
+
+def _normalize(vector):
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def encode_query(text):
+    """
+    Embed a search question, served from cache when the same text was seen before.
+
+    Returns:
+        L2-normalized float32 numpy vector (treat as read-only)
+    """
+    vector = _query_cache.get(text)
+    if vector is None:
+        vector = _normalize(np.asarray(model.encode([text])[0], dtype=np.float32))
+        _query_cache.put(text, vector)
+    return vector
+
+
+def encode_queries(texts, batch_size=32):
+    """
+    Embed many questions in one batched forward pass (cache hits are skipped).
+
+    Returns:
+        List of L2-normalized numpy vectors aligned with `texts`
+    """
+    vectors = [_query_cache.get(t) for t in texts]
+    missing = sorted({t for t, v in zip(texts, vectors) if v is None})
+    if missing:
+        encoded = np.asarray(model.encode(missing, batch_size=batch_size), dtype=np.float32)
+        fresh = {}
+        for text, vector in zip(missing, encoded):
+            fresh[text] = _normalize(vector)
+            _query_cache.put(text, fresh[text])
+        vectors = [v if v is not None else fresh[t] for t, v in zip(texts, vectors)]
+    return vectors
+
+
+def context_text(context):
+    """
+    Text that represents the conversation for retrieval.
+
+    Uses the conversation summary when there is one, otherwise the recent
+    user messages, newest last, trimmed to CONTEXT_TEXT_MAX_CHARS.
+    """
+    if not context:
+        return ""
+    if isinstance(context, str):
+        return context[-CONTEXT_TEXT_MAX_CHARS:]
+    parts = []
+    if context.get("summary"):
+        parts.append(context["summary"])
+    else:
+        parts.extend(m.get("message", "") for m in context.get("userMessages") or [])
+    return " ".join(p for p in parts if p)[-CONTEXT_TEXT_MAX_CHARS:]
+
+
+def context_signature(context):
+    """Changes whenever the messages or summary behind `context_text` change."""
+    if isinstance(context, str):
+        return hashlib.sha1(context.encode("utf-8")).hexdigest()
+    ids = [str(m.get("id")) for m in (context.get("userMessages") or []) + (context.get("aiMessages") or [])]
+    summary = context.get("summary") or ""
+    return hashlib.sha1(("|".join(ids) + "\x1f" + summary).encode("utf-8")).hexdigest()
+
+
+def encode_context(context, chat_id=None):
+    """
+    Embed the conversation context, re-encoding only when the chat has new messages.
+
+    Args:
+        context: build_context dict (or a plain string)
+        chat_id: Chat the context belongs to; without it the result is cached by signature only
+
+    Returns:
+        L2-normalized numpy vector, or None when there is no usable context
+    """
+    text = context_text(context)
+    if not text.strip():
+        return None
+
+    signature = context_signature(context)
+    cache_key = chat_id if chat_id is not None else signature
+    cached = _context_cache.get(cache_key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    vector = _normalize(np.asarray(model.encode([text])[0], dtype=np.float32))
+    _context_cache.put(cache_key, (signature, vector))
+    return vector
+
+
+def fuse(query_vector, context_vector):
+    """Weighted sum of question and context embeddings, re-normalized."""
+    if context_vector is None:
+        return query_vector
+    return _normalize(QUERY_EMBEDDING_WEIGHT * query_vector + CONTEXT_EMBEDDING_WEIGHT * context_vector)
+
+
+def encode_search_vector(query_text, context=None, chat_id=None):
+    """Fused retrieval vector for a question in the given conversation, as a plain list."""
+    return fuse(encode_query(query_text), encode_context(context, chat_id)).tolist()
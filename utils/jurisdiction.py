@@ -0,0 +1,44 @@
+"""
+Jurisdiction helpers shared by retrieval, index migration and benchmarks.
+"""
+import unicodedata
+
+FEDERAL = "Federal"
+
+
+def namespace_for(state):
+    """
+    Index namespace holding one jurisdiction's vectors.
+
+    "Maranhão" -> "maranhao", "São Paulo" -> "sao-paulo", "Federal" -> "federal"
+    """
+    ascii_name = unicodedata.normalize("NFKD", str(state)).encode("ascii", "ignore").decode("ascii")
+    return "-".join(ascii_name.lower().split())
+
+
+def partitions_for(state):
+    """Namespaces to query for a request: the Federal partition plus the requested state, if any."""
+    namespaces = [namespace_for(FEDERAL)]
+    if state and namespace_for(state) not in namespaces:
+        namespaces.append(namespace_for(state))
+    return namespaces
+
+
+def merge_matches(result_sets, top_k):
+    """
+    Merge per-partition match lists by score, keeping each id once.
+
+    Args:
+        result_sets: Iterables of match dicts/objects exposing get("id") and get("score")
+        top_k: Number of matches to keep
+
+    Returns:
+        The `top_k` highest-scoring matches across all partitions
+    """
+    best = {}
+    for matches in result_sets:
+        for match in matches:
+            match_id = match.get("id")
+            if match_id not in best or match.get("score", 0) > best[match_id].get("score", 0):
+                best[match_id] = match
+    return sorted(best.values(), key=lambda m: m.get("score", 0), reverse=True)[:top_k]
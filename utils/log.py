@@ -0,0 +1,162 @@
+"""
+Structured, non-blocking logging setup.
+
+Records are pushed onto an in-memory queue by the request path and written
+out by a background listener thread, so a slow stdout never stalls a stream.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import time
+
+from config import (
+    LOG_LEVEL,
+    LOG_MODULE_LEVELS,
+    LOG_FORMAT,
+    LOG_QUEUE_SIZE,
+    LOG_PAYLOAD_SAMPLE_RATE,
+    LOG_PAYLOAD_MAX_CHARS,
+)
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+
+class Lazy:
+    """
+    Defer an expensive log argument until a handler actually formats it.
+
+    Usage:
+        logger.debug("chunk keys: %s", Lazy(lambda: list(chunk.keys())))
+    """
+    __slots__ = ("_fn",)
+
+    def __init__(self, fn):
+        self._fn = fn
+
+    def __str__(self):
+        return str(self._fn())
+
+    __repr__ = __str__
+
+
+def _extra_fields(record):
+    return {k: v for k, v in record.__dict__.items() if k not in _RESERVED_ATTRS and not k.startswith("_")}
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Human-readable line with any `extra=` fields appended as key=value pairs."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += " | " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers."""
+
+    def format(self, record):
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        payload.update(_extra_fields(record))
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks the caller.
+
+    Formatting is left to the listener thread; when the queue is full the
+    record is dropped and counted instead of waiting for space.
+    """
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Keep args/exc_info intact so the listener does the formatting work
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging():
+    """
+    Install the queue-backed root handler and per-module levels.
+
+    Safe to call more than once; only the first call has an effect.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else KeyValueFormatter()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_DroppingQueueHandler(log_queue))
+    root.setLevel(LOG_LEVEL)
+
+    for name, level in LOG_MODULE_LEVELS.items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def should_sample(rate=None):
+    """Return True for roughly `rate` of calls (defaults to LOG_PAYLOAD_SAMPLE_RATE)."""
+    rate = LOG_PAYLOAD_SAMPLE_RATE if rate is None else rate
+    return rate >= 1.0 or (rate > 0 and random.random() < rate)
+
+
+def log_payload(logger, label, payload, **fields):
+    """
+    Dump a large payload (prompt, response, raw chunk) at DEBUG, sampled and truncated.
+
+    Nothing is formatted unless DEBUG is enabled for `logger` and the sample hits.
+    """
+    if not logger.isEnabledFor(logging.DEBUG) or not should_sample():
+        return
+    text = str(payload)
+    if len(text) > LOG_PAYLOAD_MAX_CHARS:
+        text = f"{text[:LOG_PAYLOAD_MAX_CHARS]}... [truncated {len(text) - LOG_PAYLOAD_MAX_CHARS} chars]"
+    logger.debug("%s:\n%s", label, text, extra=fields)
+
+
+class Timer:
+    """Tiny monotonic stopwatch for `elapsed_ms` fields."""
+    __slots__ = ("start",)
+
+    def __init__(self):
+        self.start = time.perf_counter()
+
+    def ms(self):
+        return round((time.perf_counter() - self.start) * 1000, 1)
@@ -0,0 +1,35 @@
+"""
+In-process counters and gauges exposed on GET /metrics (with X-Profile-Token).
+"""
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_gauges = {}
+
+
+def inc(name, amount=1, **labels):
+    """Increment a counter; labels are folded into the key, e.g. abandoned{route=/ask}."""
+    key = name
+    if labels:
+        key += "{" + ",".join(f"{k}={v}" for k, v in sorted(labels.items())) + "}"
+    with _lock:
+        _counters[key] += amount
+
+
+def register_gauge(name, fn):
+    """Register a zero-arg callable whose return value is reported under `name`."""
+    _gauges[name] = fn
+
+
+def snapshot():
+    with _lock:
+        counters = dict(_counters)
+    gauges = {}
+    for name, fn in _gauges.items():
+        try:
+            gauges[name] = fn()
+        except Exception as e:
+            gauges[name] = {"error": str(e)}
+    return {"counters": counters, "gauges": gauges}
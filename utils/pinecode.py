@@ -1,104 +1,266 @@
 import os
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
 from pinecone import Pinecone
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
+from config import (
+    INDEX_LAYOUT,
+    INDEX_QUERY_WORKERS,
+    DOC_STORE_PATH,
+    SEARCH_OVERFETCH,
+    CONTEXT_BOOST_WEIGHTS,
+    RERANK_OVERFETCH,
+    RERANK_KEEP,
+    RERANK_MAX_MS,
+    RETRIEVAL_CACHE_SIZE,
+    RETRIEVAL_CACHE_TTL,
+)
+from utils.encoder import encode_search_vector, context_text as build_context_text
+from utils.jurisdiction import FEDERAL, partitions_for, merge_matches
+from utils.chunk_processing import ChunkRecord, normalize_chunk
+from utils.doc_store import DocStore
+from utils.lru import LRUCache
+from utils.metrics import register_gauge
+from utils import deadline, reranker
 
 # 🧩 Load env vars
 load_dotenv()
 
-model = SentenceTransformer("intfloat/multilingual-e5-large")
+logger = logging.getLogger(__name__)
 
 
 def init_pinecone():
     api_key = os.getenv("PINECONE_API_KEY")
     index_name = os.getenv("PINECONE_INDEX_NAME")
+    # Optional: skips the describe_index lookup and lets benchmarks point at a local stand-in
+    index_host = os.getenv("PINECONE_INDEX_HOST")
 
     pc = Pinecone(api_key=api_key)
+    if index_host:
+        return pc.Index(host=index_host)
     return pc.Index(index_name)
 
 index = init_pinecone()
 
 
+def init_doc_store():
+    """Open the local chunk store if one is configured; queries then skip metadata."""
+    if not DOC_STORE_PATH:
+        return None
+    if not os.path.exists(DOC_STORE_PATH):
+        logger.warning("⚠️  DOC_STORE_PATH %s not found, falling back to index metadata", DOC_STORE_PATH)
+        return None
+    store = DocStore(DOC_STORE_PATH)
+    logger.info("📚 Chunk store opened", extra={"path": DOC_STORE_PATH, "chunks": len(store)})
+    return store
+
+doc_store = init_doc_store()
+
+# Partition queries run concurrently on this pool when INDEX_LAYOUT == "namespaces"
+_query_pool = ThreadPoolExecutor(max_workers=INDEX_QUERY_WORKERS, thread_name_prefix="pinecone-query")
+
+# Searches without conversation context depend only on the question and filters
+_results_cache = LRUCache(RETRIEVAL_CACHE_SIZE, ttl=RETRIEVAL_CACHE_TTL)
+register_gauge("retrieval_cache", _results_cache.stats)
+
+
+def query_filtered(vector, top_k, state=None, filter_dict=None, idx=None, include_metadata=True):
+    """
+    Single query over the whole index with a jurisdiction `$or` metadata filter.
+
+    `idx` overrides the module index (benchmarks and evaluation pass their own).
+    """
+    filters = {}
+    or_filters = []
+    if state:
+        or_filters.append({"state": {"$eq": state}})
+    or_filters.append({"state": {"$eq": FEDERAL}})
+
+    filters["$or"] = or_filters
+
+    # Merge manual filters
+    if filter_dict:
+        filters.update(filter_dict)
+
+    results = (idx or index).query(
+        vector=vector,
+        top_k=top_k,
+        include_metadata=include_metadata,
+        filter=filters or None
+    )
+    return results.get("matches", [])
+
+
+def query_partitioned(vector, top_k, state=None, filter_dict=None, idx=None, include_metadata=True):
+    """
+    Query the Federal and the requested state's namespaces concurrently and merge by score.
+
+    Each partition only holds its own jurisdiction, so no jurisdiction filter
+    is needed and latency does not grow with the number of states indexed.
+    Matches carry the "namespace" they came from, so hydrate_matches can
+    fetch them there.
+    """
+    namespaces = partitions_for(state)
+    futures = [
+        _query_pool.submit(
+            (idx or index).query,
+            vector=vector,
+            top_k=top_k,
+            include_metadata=include_metadata,
+            namespace=namespace,
+            filter=filter_dict or None
+        )
+        for namespace in namespaces
+    ]
+    return merge_matches(
+        (
+            [{"id": m.get("id"), "score": m.get("score"), "metadata": m.get("metadata"), "namespace": namespace}
+             for m in f.result().get("matches", [])]
+            for namespace, f in zip(namespaces, futures)
+        ),
+        top_k,
+    )
+
+
+def query_index(vector, top_k, state=None, filter_dict=None, layout=None, idx=None, include_metadata=True):
+    """Run the vector query using the configured index layout ("filter" or "namespaces")."""
+    if (layout or INDEX_LAYOUT) == "namespaces":
+        return query_partitioned(vector, top_k, state, filter_dict, idx, include_metadata)
+    return query_filtered(vector, top_k, state, filter_dict, idx, include_metadata)
+
+
+def hydrate_matches(matches, store=None, idx=None):
+    """
+    Turn id/score matches into ChunkRecords using the local chunk store.
+
+    Ids the store doesn't know (vectors added after the store was built) are
+    fetched from the index with their metadata instead, from the namespace
+    each match came from.
+    """
+    store = store or doc_store
+    if store is None:
+        return [normalize_chunk(m) for m in matches]
+
+    records, missing = [], []
+    for match in matches:
+        fields = store.get(match.get("id"))
+        if fields is None:
+            missing.append(match)
+            records.append(None)
+        else:
+            records.append(ChunkRecord(id=match.get("id"), score=float(match.get("score") or 0), **fields))
+
+    if missing:
+        by_namespace = {}
+        for m in missing:
+            by_namespace.setdefault(m.get("namespace") or "", []).append(m)
+        by_id = {}
+        for namespace, group in by_namespace.items():
+            kwargs = {"namespace": namespace} if namespace else {}
+            fetched = (idx or index).fetch(ids=[m.get("id") for m in group], **kwargs).vectors
+            for m in group:
+                by_id[m.get("id")] = normalize_chunk({"id": m.get("id"), "score": m.get("score"),
+                                                      "metadata": getattr(fetched.get(m.get("id")), "metadata", None) or {}})
+        records = [r if r is not None else by_id[m.get("id")] for r, m in zip(records, matches)]
+    return records
+
+
+def context_rerank(matches, query_text, context, top_k, weights=None):
+    """
+    Reorder matches by vector score boosted with query/context keyword overlap
+    and character similarity to the question, keeping `top_k`.
+
+    Args:
+        weights: {"query", "context", "similarity"} boost weights (default CONTEXT_BOOST_WEIGHTS)
+    """
+    weights = weights or CONTEXT_BOOST_WEIGHTS
+    query_keywords = set(query_text.lower().split())
+    context_keywords = set(build_context_text(context).lower().split())
+
+    def context_boost(m):
+        base_score = m.score
+        text = m.text.lower()
+        query_overlap = len(query_keywords & set(text.split())) / max(len(query_keywords), 1)
+        context_overlap = len(context_keywords & set(text.split())) / max(len(context_keywords), 1)
+        text_sim = SequenceMatcher(None, query_text.lower(), text[:500]).ratio()
+        return base_score * (1 + query_overlap*weights["query"] + context_overlap*weights["context"]
+                             + text_sim*weights["similarity"])
+
+    return sorted(matches, key=context_boost, reverse=True)[:top_k]
+
+
 def search_legal_docs(
     query_text,
     top_k=8,
     context=None,
     country=None,
     state=None,
-    filter_dict=None
+    filter_dict=None,
+    chat_id=None,
+    query_vector=None,
+    refresh_cache=False
 ):
     """
     🔎 Search legal documents with contextual precision and query enhancement.
+
+    The question and the conversation context are embedded separately (both
+    cached) and fused, instead of embedding the question with a context blob
+    appended. Pass `query_vector` to skip encoding (batch callers encode all
+    their questions in one pass).
+
+    Results of searches without conversation text are cached per question and
+    filters for RETRIEVAL_CACHE_TTL; `refresh_cache` re-runs the search and
+    replaces the entry (the cache warmer uses it).
     """
     try:
-        # --- Build dynamic filters ---
-        filters = {}
-        or_filters = []
-        if state:
-            or_filters.append({"state": {"$eq": state}})
-        or_filters.append({"state": {"$eq": "Federal"}})
-
-        filters["$or"] = or_filters
-
-        # Merge manual filters
-        if filter_dict:
-            filters.update(filter_dict)
-
-        # --- Enhance query with context ---
-        enhanced_query = query_text
-        if context:
-            snippet = context[-500:] if isinstance(context, str) else str(context)[:500]
-            enhanced_query = f"{query_text}\n\nRelated context: {snippet}"
-
-        # --- Embed the query ---
-        query_embedding = model.encode([enhanced_query], convert_to_tensor=True)
-        query_vector = query_embedding.cpu().numpy().tolist()[0]
-
-        # --- Query Pinecone ---
-        search_k = top_k * 2 if context else top_k
-        results = index.query(
-            vector=query_vector,
-            top_k=search_k,
-            include_metadata=True,
-            filter=filters or None
+        # --- Context-free searches (first questions) are served from the results cache ---
+        cache_key = None
+        if not build_context_text(context).strip():
+            filters = json.dumps(filter_dict, sort_keys=True, default=str) if filter_dict else ""
+            cache_key = (query_text, top_k, state, filters, bool(context))
+            cached = None if refresh_cache else _results_cache.get(cache_key)
+            if cached is not None:
+                return list(cached)
+
+        # --- Embed the query, fused with the (cached) conversation context ---
+        if query_vector is None:
+            query_vector = encode_search_vector(query_text, context, chat_id)
+
+        # --- Query Pinecone (overfetch when something will rerank the candidates) ---
+        if reranker.enabled():
+            search_k = top_k * RERANK_OVERFETCH
+        else:
+            search_k = top_k * SEARCH_OVERFETCH if context else top_k
+        results = query_index(
+            query_vector, search_k, state=state, filter_dict=filter_dict, include_metadata=doc_store is None
         )
 
-        matches = []
-        for match in results.get("matches", []):
-            metadata = match.get("metadata", {})
-            matches.append({
-                "id": match.get("id"),
-                "score": float(match.get("score", 0)),
-                "metadata": metadata,
-                "text": metadata.get("text", ""),
-                "title": metadata.get("title", "Unknown"),
-                "chapter": metadata.get("chapter"),
-                "section": metadata.get("section"),
-            })
-
-        # --- Optional context-aware reranking ---
-        if context and len(matches) > top_k:
-            from difflib import SequenceMatcher
-
-            query_keywords = set(query_text.lower().split())
-            context_text = context if isinstance(context, str) else ' '.join(str(v) for v in context.values())
-            context_keywords = set(context_text.lower().split())
-
-            def context_boost(m):
-                base_score = m["score"]
-                text = m.get("text", "").lower()
-                query_overlap = len(query_keywords & set(text.split())) / max(len(query_keywords), 1)
-                context_overlap = len(context_keywords & set(text.split())) / max(len(context_keywords), 1)
-                text_sim = SequenceMatcher(None, query_text.lower(), text[:500]).ratio()
-                return base_score * (1 + query_overlap*0.3 + context_overlap*0.15 + text_sim*0.1)
-
-            matches.sort(key=context_boost, reverse=True)
+        # --- Normalize once into compact records; everything downstream reads these ---
+        matches = hydrate_matches(results)
+
+        # --- Cross-encoder or context-aware reranking (skipped when the request deadline runs short) ---
+        budget = deadline.current()
+        rerank_wanted = len(matches) > top_k and (reranker.enabled() or context)
+        if rerank_wanted and budget and budget.should_degrade("skip_rerank"):
+            # Degraded results aren't cached
+            cache_key = None
             matches = matches[:top_k]
+        elif rerank_wanted and reranker.enabled():
+            # Sharper ranking means fewer chunks in the prompt
+            max_ms = RERANK_MAX_MS
+            allowance = budget.allowance("skip_rerank") if budget else None
+            if allowance is not None:
+                max_ms = min(max_ms, allowance * 1000)
+            matches = reranker.rerank(query_text, matches, min(top_k, RERANK_KEEP), max_ms)
+        elif rerank_wanted:
+            matches = context_rerank(matches, query_text, context, top_k)
 
+        if cache_key is not None and matches:
+            _results_cache.put(cache_key, tuple(matches))
         return matches
 
     except Exception as e:
-        print(f"❌ Search error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error("❌ Search error: %s", e, exc_info=True)
         return []
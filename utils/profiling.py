@@ -0,0 +1,272 @@
+"""
+Opt-in profiling of live traffic.
+
+Three ways in, all disabled unless PROFILE_TOKEN is set:
+
+- Per request: send `X-Profile: sample` or `X-Profile: cprofile` with
+  `X-Profile-Token`. The response carries `X-Profile-File` naming the capture.
+- Admin: POST /admin/profile captures the whole process for N seconds.
+- Rolling: with PROFILE_ROLLING=true a low-rate sampler keeps the last
+  PROFILE_ROLLING_WINDOW_S seconds of stacks; GET /admin/profile/rolling dumps them.
+
+Sampled captures are written as folded stacks (`.folded`, one
+"frame;frame;frame count" line per stack) for flamegraph.pl, speedscope or
+inferno. cProfile captures are pstats files (`.prof`) for snakeviz or
+flameprof. Captures are rate limited to PROFILE_MAX_PER_MINUTE and only one
+explicit capture runs at a time.
+
+cProfile instruments the event-loop thread only, and everything that runs on
+it during the request (including other requests' coroutines) is included;
+work in asyncio.to_thread workers shows up in sampled captures only.
+"""
+import asyncio
+import cProfile
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+
+from config import (
+    PROFILE_TOKEN,
+    PROFILE_DIR,
+    PROFILE_MAX_PER_MINUTE,
+    PROFILE_SAMPLE_INTERVAL_MS,
+    PROFILE_ROLLING_INTERVAL_MS,
+    PROFILE_ROLLING_WINDOW_S,
+)
+
+logger = logging.getLogger(__name__)
+
+MODES = ("sample", "cprofile")
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def enabled():
+    return bool(PROFILE_TOKEN)
+
+
+def token_ok(token):
+    # Compared as bytes: compare_digest raises TypeError on non-ASCII str
+    return enabled() and bool(token) and hmac.compare_digest(token.encode("utf-8"), PROFILE_TOKEN.encode("utf-8"))
+
+
+# --- stack sampling ---
+
+def _short_path(filename):
+    if filename.startswith(_ROOT):
+        return os.path.relpath(filename, _ROOT)
+    marker = "site-packages" + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    return os.path.basename(filename)
+
+
+def _fold(frame, thread_name):
+    """Folded (root-first, ';'-joined) stack of `frame`, rooted at its thread name."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    names.append(thread_name)
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """
+    Background thread that records every other thread's stack at a fixed
+    interval. Counts are kept in time buckets so a rolling window can be
+    retained (`window_s`), or indefinitely when window_s is None.
+    """
+
+    def __init__(self, interval_ms, window_s=None, bucket_s=10):
+        self.interval = interval_ms / 1000
+        self.window_s = window_s
+        self.bucket_s = bucket_s
+        self.samples = 0
+        self._buckets = deque()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.counts()
+
+    def _bucket(self, now):
+        if not self._buckets or now - self._buckets[-1][0] >= self.bucket_s:
+            self._buckets.append((now, Counter()))
+            if self.window_s is not None:
+                while now - self._buckets[0][0] > self.window_s:
+                    self._buckets.popleft()
+        return self._buckets[-1][1]
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks = [
+                _fold(frame, names.get(ident, f"thread-{ident}"))
+                for ident, frame in sys._current_frames().items()
+                if ident != own
+            ]
+            with self._lock:
+                bucket = self._bucket(time.monotonic())
+                bucket.update(stacks)
+                self.samples += 1
+
+    def counts(self):
+        with self._lock:
+            total = Counter()
+            for _, bucket in self._buckets:
+                total.update(bucket)
+            return total
+
+
+def write_folded(counts, path):
+    with open(path, "w", encoding="utf-8") as fh:
+        for stack, count in counts.most_common():
+            fh.write(f"{stack} {count}\n")
+    return path
+
+
+# --- captures ---
+
+class _RateLimit:
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self._times = deque()
+        self._lock = threading.Lock()
+
+    def allow(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._times and now - self._times[0] > 60:
+                self._times.popleft()
+            if len(self._times) >= self.per_minute:
+                return False
+            self._times.append(now)
+            return True
+
+
+_limit = _RateLimit(PROFILE_MAX_PER_MINUTE)
+_capture_lock = threading.Lock()
+_rolling = None
+
+
+def capture_path(label, mode):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = "".join(c if c.isalnum() else "-" for c in label).strip("-") or "process"
+    ext = "prof" if mode == "cprofile" else "folded"
+    return os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{uuid.uuid4().hex[:6]}.{ext}")
+
+
+class Capture:
+    """
+    One explicit capture. Use acquire() to apply the rate limit and the
+    one-at-a-time rule; it returns None when the capture isn't allowed.
+    """
+
+    def __init__(self, mode, label):
+        self.mode = mode
+        self.path = capture_path(label, mode)
+        self._profiler = None
+        self._sampler = None
+
+    @classmethod
+    def acquire(cls, mode, label):
+        if mode not in MODES or not _capture_lock.acquire(blocking=False):
+            return None
+        if not _limit.allow():
+            _capture_lock.release()
+            return None
+        return cls(mode, label)
+
+    def start(self):
+        if self.mode == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = StackSampler(PROFILE_SAMPLE_INTERVAL_MS).start()
+        return self
+
+    async def stop(self):
+        """
+        Stop, write the file and release the capture slot. Returns the file path.
+
+        The profiler is disabled on the event-loop thread it instruments; joining
+        the sampler and writing the file run in a worker thread.
+        """
+        try:
+            if self._profiler is not None:
+                self._profiler.disable()
+                await asyncio.to_thread(self._profiler.dump_stats, self.path)
+            else:
+                await asyncio.to_thread(lambda: write_folded(self._sampler.stop(), self.path))
+            logger.info("🔬 Profile written", extra={"file": self.path, "mode": self.mode})
+            return self.path
+        finally:
+            _capture_lock.release()
+
+
+def start_rolling_sampler():
+    """Start the process-wide rolling sampler (idempotent)."""
+    global _rolling
+    if _rolling is None:
+        _rolling = StackSampler(PROFILE_ROLLING_INTERVAL_MS, window_s=PROFILE_ROLLING_WINDOW_S).start()
+        logger.info("🔬 Rolling profiler started", extra={"interval_ms": PROFILE_ROLLING_INTERVAL_MS})
+    return _rolling
+
+
+def dump_rolling():
+    """Write the rolling window to a .folded file; returns (path, samples) or None if it isn't running."""
+    if _rolling is None:
+        return None
+    return write_folded(_rolling.counts(), capture_path("rolling", "sample")), _rolling.samples
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests that ask for it with X-Profile / X-Profile-Token."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not enabled():
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        mode = headers.get(b"x-profile")
+        if mode is None:
+            return await self.app(scope, receive, send)
+
+        token = headers.get(b"x-profile-token", b"").decode("latin-1")
+        capture = Capture.acquire(mode.decode("latin-1"), scope["path"]) if token_ok(token) else None
+        if capture is None:
+            logger.warning("🔬 Profile request refused (token, mode, rate limit or capture in progress)")
+            return await self.app(scope, receive, send)
+
+        async def send_with_header(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [
+                    *message.get("headers", []),
+                    (b"x-profile-file", os.path.basename(capture.path).encode("latin-1")),
+                ]}
+            await send(message)
+
+        capture.start()
+        try:
+            await self.app(scope, receive, send_with_header)
+        finally:
+            await capture.stop()
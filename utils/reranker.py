@@ -0,0 +1,132 @@
+"""
+Optional cross-encoder rerank of retrieved chunks.
+
+With RERANK_MODEL set, search_legal_docs overfetches top_k * RERANK_OVERFETCH
+candidates and scores every (question, chunk) pair with a cross-encoder in
+one batched CPU forward pass. Only the best RERANK_KEEP go on to the prompt.
+Reading question and chunk together ranks the right article first far more
+often than bi-encoder similarity, so fewer chunks are needed.
+
+Latency is capped at RERANK_MAX_MS, or less when the request deadline is
+short:
+
+- Pair scores are cached, so hot chunks cost nothing on repeat questions.
+- From the measured cost per pair, only as many uncached candidates as fit
+  in the cap are scored, best bi-encoder rank first.
+- Unscored candidates keep their index order after the scored ones.
+
+Passes are serialized so concurrent requests don't oversubscribe the CPU. A
+request that can't get the model within its cap keeps the index order.
+"""
+import hashlib
+import logging
+import threading
+import time
+
+from config import (
+    RERANK_MODEL,
+    RERANK_MAX_MS,
+    RERANK_MAX_LENGTH,
+    RERANK_BATCH_SIZE,
+    RERANK_CACHE_SIZE,
+)
+from utils.lru import LRUCache
+from utils.metrics import inc, register_gauge
+
+logger = logging.getLogger(__name__)
+
+_scores = LRUCache(RERANK_CACHE_SIZE)
+_lock = threading.Lock()
+_ms_per_pair = None
+
+
+def _load():
+    global _ms_per_pair
+    from sentence_transformers import CrossEncoder
+
+    cross_encoder = CrossEncoder(RERANK_MODEL, max_length=RERANK_MAX_LENGTH)
+    # Warm-up pass: first-call overhead out of the way and a starting cost estimate for the cap
+    pairs = [("warm up", "lorem ipsum dolor sit amet " * 40)] * RERANK_BATCH_SIZE
+    cross_encoder.predict(pairs[:1], show_progress_bar=False)
+    start = time.perf_counter()
+    cross_encoder.predict(pairs, batch_size=RERANK_BATCH_SIZE, show_progress_bar=False)
+    _ms_per_pair = (time.perf_counter() - start) * 1000 / len(pairs)
+    logger.info("🎯 Cross-encoder loaded", extra={"model": RERANK_MODEL, "ms_per_pair": round(_ms_per_pair, 2)})
+    return cross_encoder
+
+
+# Loaded once at startup, like the embedding model
+model = _load() if RERANK_MODEL else None
+
+register_gauge("rerank", lambda: {
+    "enabled": model is not None,
+    "ms_per_pair": round(_ms_per_pair, 2) if _ms_per_pair is not None else None,
+    "cache": _scores.stats(),
+})
+
+
+def enabled():
+    return model is not None
+
+
+def _score_pending(query_text, matches, pending, qkey, scores, max_ms):
+    """Score as many `pending` candidates as fit in `max_ms`; returns how many were left unscored."""
+    global _ms_per_pair
+    start = time.perf_counter()
+    if not _lock.acquire(timeout=max_ms / 1000):
+        return len(pending)
+    try:
+        left_ms = max_ms - (time.perf_counter() - start) * 1000
+        batch = pending[:max(0, int(left_ms / _ms_per_pair))]
+        if batch:
+            began = time.perf_counter()
+            predicted = model.predict(
+                [(query_text, matches[i].text) for i in batch], batch_size=RERANK_BATCH_SIZE, show_progress_bar=False
+            )
+            per_pair = (time.perf_counter() - began) * 1000 / len(batch)
+            _ms_per_pair = 0.8 * _ms_per_pair + 0.2 * per_pair
+            for i, score in zip(batch, predicted):
+                scores[i] = float(score)
+                if matches[i].id is not None:
+                    _scores.put((qkey, matches[i].id), scores[i])
+        return len(pending) - len(batch)
+    finally:
+        _lock.release()
+
+
+def rerank(query_text, matches, keep, max_ms=None):
+    """
+    Order `matches` by cross-encoder relevance to the question and keep `keep`.
+
+    Args:
+        query_text: The user's question
+        matches: ChunkRecords in index order
+        keep: Number of chunks to return
+        max_ms: Latency cap for this call (default RERANK_MAX_MS)
+
+    Returns:
+        Up to `keep` ChunkRecords, most relevant first
+    """
+    max_ms = RERANK_MAX_MS if max_ms is None else max_ms
+    qkey = hashlib.sha1(query_text.encode("utf-8")).hexdigest()
+    scores, pending = {}, []
+    for i, match in enumerate(matches):
+        cached = _scores.get((qkey, match.id)) if match.id is not None else None
+        if cached is None:
+            pending.append(i)
+        else:
+            scores[i] = cached
+
+    unscored = 0
+    if pending:
+        try:
+            unscored = _score_pending(query_text, matches, pending, qkey, scores, max_ms)
+        except Exception as e:
+            logger.error("❌ Cross-encoder rerank failed: %s", e, exc_info=True)
+            unscored = len(pending)
+    inc("rerank", outcome="capped" if unscored else "full")
+    if unscored:
+        logger.debug("🎯 Rerank capped", extra={"scored": len(scores), "unscored": unscored, "max_ms": max_ms})
+
+    order = sorted(scores, key=scores.get, reverse=True) + [i for i in range(len(matches)) if i not in scores]
+    return [matches[i] for i in order[:keep]]
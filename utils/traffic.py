@@ -0,0 +1,109 @@
+"""
+Opt-in recorder of anonymized request shapes for load replay (bench/replay.py).
+
+Set TRACE_RECORD_PATH to append one JSON line per /ask or /summarize-file
+request. Lines hold when the request arrived, its shape and how it went:
+
+- /ask: question length, language, jurisdiction, chat history size
+- /summarize-file: file type and size, extracted text size
+
+Both also record time to first token, duration, tokens and outcome.
+
+No text, file names, tenants or addresses are written. Chat ids are replaced
+by a keyed hash that is stable within one process (so the replay can tell
+which requests share a conversation) and can't be reversed. TRACE_SAMPLE_RATE
+keeps a fraction of requests; recording stops once the file reaches
+TRACE_MAX_BYTES. Lines are written by a background thread, off the event loop.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import random
+import secrets
+import threading
+import time
+
+from config import TRACE_RECORD_PATH, TRACE_SAMPLE_RATE, TRACE_MAX_BYTES
+from utils.metrics import inc
+
+logger = logging.getLogger(__name__)
+
+_salt = secrets.token_bytes(16)
+_lines = queue.SimpleQueue()
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def enabled():
+    return bool(TRACE_RECORD_PATH)
+
+
+def anonymize(value):
+    """Keyed hash of an identifier; equal inputs map to equal tokens within this process."""
+    if value is None:
+        return None
+    return hmac.new(_salt, str(value).encode("utf-8"), hashlib.sha256).hexdigest()[:12]
+
+
+def _write_loop():
+    written = os.path.getsize(TRACE_RECORD_PATH) if os.path.exists(TRACE_RECORD_PATH) else 0
+    full = False
+    with open(TRACE_RECORD_PATH, "a", encoding="utf-8") as fh:
+        while True:
+            line = _lines.get()
+            if full or written + len(line) > TRACE_MAX_BYTES:
+                if not full:
+                    full = True
+                    logger.warning("🎞️  Trace file is full, recording stopped", extra={"path": TRACE_RECORD_PATH})
+                inc("traffic_trace_dropped")
+                continue
+            fh.write(line)
+            fh.flush()
+            written += len(line)
+
+
+def _submit(record):
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                os.makedirs(os.path.dirname(os.path.abspath(TRACE_RECORD_PATH)), exist_ok=True)
+                _writer = threading.Thread(target=_write_loop, name="traffic-trace", daemon=True)
+                _writer.start()
+                logger.info("🎞️  Recording traffic trace", extra={"path": TRACE_RECORD_PATH, "sample_rate": TRACE_SAMPLE_RATE})
+    _lines.put(json.dumps(record, ensure_ascii=False) + "\n")
+    inc("traffic_trace_records")
+
+
+class Trace:
+    """
+    Shape and timing of one request. Every method is a no-op when the
+    request isn't recorded, so routes call them unconditionally.
+    """
+
+    __slots__ = ("recording", "fields", "_start", "_finished")
+
+    def __init__(self, route):
+        self.recording = enabled() and random.random() < TRACE_SAMPLE_RATE
+        self.fields = {"ts": round(time.time(), 3), "route": route} if self.recording else None
+        self._start = time.perf_counter()
+        self._finished = False
+
+    def set(self, **fields):
+        if self.recording:
+            self.fields.update(fields)
+
+    def first_token(self):
+        if self.recording and "ttft_ms" not in self.fields:
+            self.fields["ttft_ms"] = round((time.perf_counter() - self._start) * 1000, 1)
+
+    def finish(self, outcome, **fields):
+        """Record the request once, with how it ended (ok, error, cancelled, ...)."""
+        if not self.recording or self._finished:
+            return
+        self._finished = True
+        self.fields.update(fields, outcome=outcome, duration_ms=round((time.perf_counter() - self._start) * 1000, 1))
+        _submit(self.fields)